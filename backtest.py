@@ -2,19 +2,31 @@
 
 import pandas as pd
 import numpy as np
-import yfinance as yf
-from joblib import load
 import os
+from feature_engine import model_feature_names
+from resampler import frame_columns, model_feature_matrix
+from candle_archive import load_period
+from candle_store import epoch_seconds
+from feature_cache import cached_feature_matrix, file_hash, spec_hash
+from model_registry import get_model
+from backtest_engine import (BUY_THRESHOLD, CONFLUENCE_WEIGHTS, SELL_THRESHOLD, align_sentiment, confluence_signals,
+                             run_vectorized_backtest, run_risk_backtest)
+from backtest_store import cached_backtest
 
 # --- PARÁMETROS SINCRONIZADOS ---
 TICKER = 'BTC-USD'
 PERIODO_DATOS = '60d'
 INTERVALO_VELAS = '15m'
 INITIAL_CAPITAL = 1000.0
-FEATURES = [
-    'sma_20', 'sma_50', 'rsi', 'macd', 'macd_signal', 'macd_diff', 
-    'stochrsi', 'obv', 'bb_width', 'atr', 'momentum', 'contexto_estrategia'
-]
+# Comisión y slippage por lado (fracción). A cero reproduce el backtest original.
+FEE_RATE = 0.0
+SLIPPAGE = 0.0
+# Reglas de riesgo de los bots en vivo (paper_trading_bot.py y scripts/real_time_bot.py).
+STOP_LOSS_PERCENT = 1.5
+TAKE_PROFIT_PERCENT = 3.0
+# Sentimiento grabado por vela (columnas ts, twitter, fear_and_greed, news) para la
+# puntuación por confluencia con la que entran los bots; sin archivo se usa 0 (neutral).
+SENTIMENT_FILE = os.path.join("data", "sentiment_history.csv")
 
 def run_backtest():
     """
@@ -27,74 +39,93 @@ def run_backtest():
     if not os.path.exists(model_path):
         print("❌ Error: No se encontró 'models/model.joblib'.")
         return
-    model = load(model_path)
+    model = get_model(model_path)
     print("Modelo cargado exitosamente.")
 
-    # --- 2. Descargar Datos ---
-    print(f"Descargando datos para el backtest ({PERIODO_DATOS}, {INTERVALO_VELAS})...")
-    data = yf.download(TICKER, period=PERIODO_DATOS, interval=INTERVALO_VELAS, auto_adjust=True, progress=False)
+    # --- 2. Cargar Datos (archivo local de velas) ---
+    print(f"Cargando datos para el backtest ({PERIODO_DATOS}, {INTERVALO_VELAS})...")
+    data = load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS)
     if data.empty:
-        print("❌ Error: No se pudieron descargar los datos.")
+        print("❌ Error: No se pudieron obtener los datos.")
         return
 
-    # --- 3. Calcular Features ---
-    print("Calculando features para el backtest...")
-    # (Lógica de cálculo idéntica a los otros scripts)
-    data['sma_20'] = data['Close'].rolling(window=20).mean(); data['sma_50'] = data['Close'].rolling(window=50).mean()
-    delta = data['Close'].diff(1); gain = delta.where(delta > 0, 0); loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.ewm(com=13, min_periods=14).mean(); avg_loss = loss.ewm(com=13, min_periods=14).mean()
-    data['rsi'] = 100 - (100 / (1 + (avg_gain / avg_loss)))
-    ema_fast = data['Close'].ewm(span=12, adjust=False).mean(); ema_slow = data['Close'].ewm(span=26, adjust=False).mean()
-    data['macd'] = ema_fast - ema_slow; data['macd_signal'] = data['macd'].ewm(span=9, adjust=False).mean()
-    data['macd_diff'] = data['macd'] - data['macd_signal']
-    rsi_series = data['rsi']; min_rsi = rsi_series.rolling(window=14).min(); max_rsi = rsi_series.rolling(window=14).max()
-    data['stochrsi'] = (rsi_series - min_rsi) / (max_rsi - min_rsi)
-    data['obv'] = (data['Volume'] * (~data['Close'].diff().le(0) * 2 - 1)).cumsum()
-    sma_bb = data['Close'].rolling(window=20).mean(); std_bb = data['Close'].rolling(window=20).std()
-    upper_bb = sma_bb + (std_bb * 2); lower_bb = sma_bb - (std_bb * 2)
-    data['bb_width'] = (upper_bb - lower_bb) / sma_bb
-    high_low = data['High'] - data['Low']; high_close = (data['High'] - data['Close'].shift()).abs(); low_close = (data['Low'] - data['Close'].shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    data['atr'] = tr.ewm(alpha=1/14, adjust=False).mean()
-    data['momentum'] = data['Close'].diff(14)
-    data["contexto_estrategia"] = 0
-    data.dropna(inplace=True)
-    print("Features calculadas exitosamente.")
+    # --- 3-5. Features, predicciones y simulación (solo si el almacén no tiene ya este backtest) ---
+    # Mismo modelo + mismas velas + mismos parámetros = mismo resultado: se lee de data/backtests.
+    params = {'ticker': TICKER, 'interval': INTERVALO_VELAS, 'feature_spec': spec_hash(),
+              'initial_capital': INITIAL_CAPITAL, 'fee_rate': FEE_RATE, 'slippage': SLIPPAGE}
+    # Los bots entran con la confluencia (modelo + sentimiento), no con la predicción cruda.
+    sentiment, recorded = align_sentiment(epoch_seconds(data.index), SENTIMENT_FILE)
+    risk_params = {**params, 'stop_loss_pct': STOP_LOSS_PERCENT, 'take_profit_pct': TAKE_PROFIT_PERCENT,
+                   'entry': 'confluence', 'weights': CONFLUENCE_WEIGHTS, 'buy_threshold': BUY_THRESHOLD,
+                   'sell_threshold': SELL_THRESHOLD, 'sentiment': file_hash(SENTIMENT_FILE) if recorded else None}
+    prepared = {}
+
+    def predicted_frame():
+        if 'frame' not in prepared:
+            print("Calculando features para el backtest...")
+            ts = epoch_seconds(data.index)
+            # Columnas del modelo en su orden (las conservadas si está podado, con sus temporalidades superiores).
+            names = model_feature_names(model)
+            matrix = cached_feature_matrix(TICKER, INTERVALO_VELAS, ts,
+                                           lambda: model_feature_matrix(frame_columns(data), names, INTERVALO_VELAS),
+                                           columns=names)
+            frame = pd.concat([data, pd.DataFrame(matrix, index=data.index, columns=names)], axis=1)
+            frame.dropna(inplace=True)
+            print("Features calculadas exitosamente.")
+            frame['prediction'] = model.predict(frame[names].to_numpy())
+            print("Simulando operaciones...")
+            prepared['frame'] = frame
+        return prepared['frame']
+
+    def simulate_signals():
+        # Motor vectorizado, sin bucle fila a fila.
+        frame = predicted_frame()
+        return run_vectorized_backtest(frame['Close'].to_numpy(), frame['prediction'].to_numpy(),
+                                       INITIAL_CAPITAL, FEE_RATE, SLIPPAGE, index=frame.index)
+
+    def simulate_risk():
+        # La estrategia de los bots: entrada/salida por la puntuación por confluencia y el SL/TP
+        # que aplican, simulado contra el High/Low de cada vela.
+        frame = predicted_frame()
+        rows = data.index.get_indexer(frame.index)
+        signals = confluence_signals(frame['prediction'].to_numpy(),
+                                     {name: values[rows] for name, values in sentiment.items()})
+        return run_risk_backtest(frame['High'].to_numpy(), frame['Low'].to_numpy(), frame['Close'].to_numpy(),
+                                 signals, STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT,
+                                 INITIAL_CAPITAL, FEE_RATE, SLIPPAGE, open_=frame['Open'].to_numpy(), index=frame.index)
+
+    result, stored = cached_backtest(data, params, model_path, simulate_signals, name='señales')
+    risk, risk_stored = cached_backtest(data, risk_params, model_path, simulate_risk, name='sl_tp')
+    balance = result['final_balance']
+    trades = result['trades']
+    if stored and risk_stored:
+        print("⚡ Modelo, velas y parámetros sin cambios: resultados leídos del almacén de backtests.")
 
-    # --- 4. Generar Predicciones ---
-    X_backtest = data[FEATURES]
-    data['prediction'] = model.predict(X_backtest)
-    
-    # --- 5. Simulación de Trading ---
-    print("Simulando operaciones...")
-    balance = float(INITIAL_CAPITAL) # Aseguramos que el balance inicial es un float
-    position = 0.0
-    in_position = False
-    
-    for i in range(len(data) - 1):
-        # --- SOLUCIÓN AL TYPEERROR ---
-        # Aseguramos que el precio que usamos para el cálculo es un float
-        current_price = float(data['Close'].iloc[i])
-        
-        if data['prediction'].iloc[i] == 1 and not in_position:
-            position = balance / current_price
-            balance = 0.0
-            in_position = True
-        elif data['prediction'].iloc[i] == 0 and in_position:
-            balance = position * current_price
-            position = 0.0
-            in_position = False
-    
-    if in_position:
-        balance = position * float(data['Close'].iloc[-1])
-        
     # --- 6. Resultados ---
     rentabilidad = ((balance - INITIAL_CAPITAL) / INITIAL_CAPITAL) * 100
     print("\n--- RESULTADOS DEL BACKTEST (MODELO IA 15m) ---")
     print(f"Capital Inicial: ${INITIAL_CAPITAL:.2f}")
     print(f"Capital Final:   ${balance:.2f}")
     print(f"Rentabilidad:    {rentabilidad:.2f}%")
+    if len(trades):
+        win_rate = (trades['pnl'] > 0).mean() * 100
+        print(f"Operaciones:     {len(trades)} (acierto {win_rate:.1f}%)")
+    print(f"\n--- ESTRATEGIA DE LOS BOTS: CONFLUENCIA >= {BUY_THRESHOLD} + STOP-LOSS {STOP_LOSS_PERCENT}% / "
+          f"TAKE-PROFIT {TAKE_PROFIT_PERCENT}% ---")
+    if recorded:
+        print(f"Sentimiento:     grabado ('{SENTIMENT_FILE}')")
+    else:
+        print(f"Sentimiento:     neutral (no existe '{SENTIMENT_FILE}')")
+        if CONFLUENCE_WEIGHTS['tech'] < BUY_THRESHOLD:
+            print(f"                 La señal técnica sola (±{CONFLUENCE_WEIGHTS['tech']}) no alcanza el umbral "
+                  f"{BUY_THRESHOLD}: sin sentimiento los bots no abren operaciones.")
+    print(f"Capital Final:   ${risk['final_balance']:.2f}")
+    print(f"Rentabilidad:    {risk['return_pct']:.2f}%")
+    if len(risk['trades']):
+        reasons = risk['trades']['exit_reason'].value_counts()
+        print("Salidas:         " + ", ".join(f"{reason}: {count}" for reason, count in reasons.items()))
     print("Aviso: Este es un backtest sobre datos de entrenamiento y tiende a ser optimista.")
+    print("       Para una evaluación fuera de muestra ejecuta 'python walk_forward.py'.")
     print("--------------------------------------------------")
 
 if __name__ == '__main__':
@@ -0,0 +1,352 @@
+# backtest_engine.py (Motor de Backtest Vectorizado)
+#
+# Sustituye el bucle fila a fila de backtest.py (data['Close'].iloc[i] en cada
+# vela) por operaciones de arrays:
+#   1. La serie de predicciones se convierte en un estado de posición (0/1).
+#   2. Los flancos del estado marcan entradas y salidas.
+#   3. Cada operación tiene un rendimiento (con comisiones y slippage) y el
+#      capital es el producto acumulado de esos rendimientos.
+# Con comisión y slippage a cero reproduce la lógica del bucle original:
+# se compra todo el capital al cierre de la vela con predicción 1, se vende
+# al cierre de la vela con predicción 0, la predicción de la última vela se
+# ignora y una posición abierta se liquida al último cierre.
+#
+# run_risk_backtest añade las reglas de riesgo de los bots en vivo
+# (STOP_LOSS_PERCENT / TAKE_PROFIT_PERCENT) contra el High/Low de cada vela.
+# Los bots no entran con la predicción del modelo sino con la puntuación por
+# confluencia (modelo + sentimiento): confluence_signals la calcula por vela y
+# align_sentiment alinea el sentimiento grabado (o neutral) con las velas.
+# Solo se itera sobre OPERACIONES (no sobre velas): el primer toque de SL/TP
+# se busca con bloques crecientes de comparaciones vectorizadas y la siguiente
+# señal de entrada/salida se obtiene de índices precalculados.
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+INITIAL_CAPITAL = 1000.0
+# Pesos y umbrales de la puntuación por confluencia de run_real_bot_cycle / run_bot.
+CONFLUENCE_WEIGHTS = {'tech': 2.0, 'twitter': 1.5, 'fear_and_greed': 1.0, 'news': 0.5}
+BUY_THRESHOLD = 3.0
+SELL_THRESHOLD = 3.0
+# Tamaño inicial del bloque de búsqueda del primer toque (se duplica en cada intento).
+FIRST_TOUCH_CHUNK = 64
+
+
+def position_state(predictions):
+    """
+    Estado de la posición tras cada vela: 1 si se está comprado, 0 si no.
+    Una predicción 1 abre/mantiene, 0 cierra/mantiene fuera; cualquier otro valor
+    (p. ej. -1 = sin predicción) mantiene el estado anterior. La última vela no
+    genera señal (igual que el bucle original).
+    """
+    predictions = np.asarray(predictions)
+    n = len(predictions)
+    state = np.empty(n, dtype=np.int8)
+    if n == 0:
+        return state
+    np.equal(predictions, 1, out=state, casting='unsafe')
+    valid = (predictions == 0) | (predictions == 1)
+    valid[-1] = False
+    if not valid[:-1].all():
+        # Hay velas sin señal: se propaga la última señal válida (forward-fill por índices).
+        last_signal = np.maximum.accumulate(np.where(valid, np.arange(n), -1))
+        state = np.where(last_signal >= 0, state[np.maximum(last_signal, 0)], 0).astype(np.int8)
+    else:
+        state[-1] = state[-2] if n > 1 else 0
+    return state
+
+
+def trade_edges(state):
+    """
+    Flancos del estado: +1 en cada entrada y -1 en cada salida. Una posición
+    abierta se cierra en la última vela.
+
+    Returns:
+        tuple: (índices de entrada, índices de salida, array de flancos int8).
+    """
+    edges = np.diff(state, prepend=np.int8(0))
+    if len(state) and state[-1] == 1:
+        edges[-1] -= 1
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1), edges
+
+
+def run_vectorized_backtest(close, predictions, initial_capital=INITIAL_CAPITAL, fee_rate=0.0,
+                            slippage=0.0, index=None):
+    """
+    Backtest "todo dentro / todo fuera" a partir de las predicciones del modelo.
+
+    Args:
+        close (array): precios de cierre.
+        predictions (array): 1 = comprar/mantener, 0 = vender/quedarse fuera.
+        initial_capital (float): capital inicial.
+        fee_rate (float): comisión por lado como fracción (0.001 = 0.1%).
+        slippage (float): deslizamiento por lado como fracción del precio.
+        index (array opcional): etiquetas temporales de las velas para la tabla de operaciones.
+
+    Returns:
+        dict: 'final_balance', 'return_pct', 'trades' (DataFrame por operación),
+        'equity' (array con el valor de la cuenta al cierre de cada vela).
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    n = len(close)
+    state = position_state(predictions)
+    entries, exits, edges = trade_edges(state)
+
+    entry_price = close[entries] * (1 + slippage)
+    exit_price = close[exits] * (1 - slippage)
+    keep = 1.0 - fee_rate
+    trade_return = (exit_price / entry_price) * keep * keep
+    cash_after = initial_capital * np.cumprod(trade_return)
+    cash_before = np.concatenate([[initial_capital], cash_after[:-1]])
+
+    equity = _equity_curve(close, entries, exits, cash_before, cash_after, entry_price, keep, initial_capital)
+    return _result(entries, exits, entry_price, exit_price, trade_return, cash_before, cash_after,
+                   equity, initial_capital, index)
+
+
+def _equity_curve(close, entries, exits, cash_before, cash_after, entry_price, keep, initial_capital):
+    """Valor a mercado de la cuenta al cierre de cada vela."""
+    n = len(close)
+    # Contadores acumulados de entradas/salidas: identifican la operación de cada vela.
+    opened = np.zeros(n, dtype=np.int32)
+    opened[entries] = 1
+    np.cumsum(opened, out=opened)
+    completed = np.zeros(n, dtype=np.int32)
+    completed[exits] = 1
+    np.cumsum(completed, out=completed)
+    in_trade = opened > completed
+    units = np.concatenate([[0.0], cash_before * keep / entry_price])
+    cash = np.concatenate([[initial_capital], cash_after])
+    return np.where(in_trade, units[opened] * close, cash[completed])
+
+
+def _result(entries, exits, entry_price, exit_price, trade_return, cash_before, cash_after,
+            equity, initial_capital, index, exit_reason=None):
+    labels = np.asarray(index) if index is not None else None
+    trades = pd.DataFrame({
+        'entry_index': entries,
+        'exit_index': exits,
+        'entry_time': labels[entries] if labels is not None else entries,
+        'exit_time': labels[exits] if labels is not None else exits,
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'bars_held': exits - entries,
+        'return_pct': (trade_return - 1.0) * 100,
+        'pnl': cash_after - cash_before,
+    })
+    if exit_reason is not None:
+        trades['exit_reason'] = exit_reason
+    final_balance = float(cash_after[-1]) if len(cash_after) else float(initial_capital)
+    return {
+        'final_balance': final_balance,
+        'return_pct': (final_balance - initial_capital) / initial_capital * 100,
+        'trades': trades,
+        'equity': equity,
+    }
+
+
+def next_index_where(mask):
+    """Para cada vela i, el primer índice j > i con mask[j] (len(mask) si no existe)."""
+    n = len(mask)
+    first_at_or_after = np.minimum.accumulate(np.where(mask, np.arange(n), n)[::-1])[::-1]
+    return np.append(first_at_or_after[1:], n)
+
+
+def first_touch(high, low, start, stop, stop_price, take_price, chunk=FIRST_TOUCH_CHUNK):
+    """
+    Primera vela en [start, stop) cuyo Low toca el stop o cuyo High toca el take-profit.
+    Compara bloques que se duplican de tamaño, así que una operación larga cuesta
+    O(log) llamadas a NumPy en lugar de una iteración por vela. Devuelve -1 si no hay toque.
+    """
+    while start < stop:
+        end = min(start + chunk, stop)
+        hit = (low[start:end] <= stop_price) | (high[start:end] >= take_price)
+        k = int(hit.argmax())
+        if hit[k]:
+            return start + k
+        start = end
+        chunk *= 2
+    return -1
+
+
+def confluence_signals(predictions, sentiment=None, weights=CONFLUENCE_WEIGHTS,
+                       buy_threshold=BUY_THRESHOLD, sell_threshold=SELL_THRESHOLD):
+    """
+    Puntuación por confluencia de los bots, vectorizada sobre todas las velas.
+
+    La predicción técnica suma +peso si es 1 y -peso si es 0; cada señal de
+    sentimiento (-1, 0, 1) suma señal * peso. Devuelve 1 (comprar) si
+    score >= buy_threshold, 0 (vender) si score <= -sell_threshold y -1 (mantener)
+    en otro caso, listo para run_risk_backtest.
+
+    Args:
+        sentiment (dict opcional): arrays 'twitter', 'fear_and_greed', 'news' por vela.
+    """
+    predictions = np.asarray(predictions)
+    score = np.where(predictions == 1, weights['tech'], np.where(predictions == 0, -weights['tech'], 0.0))
+    for name, values in (sentiment or {}).items():
+        score = score + weights[name] * np.asarray(values, dtype=np.float64)
+    return np.where(score >= buy_threshold, 1, np.where(score <= -sell_threshold, 0, -1)).astype(np.int8)
+
+
+def align_sentiment(ts, path):
+    """
+    Señales de sentimiento por vela (alineación as-of) desde un CSV con columnas
+    ts, twitter, fear_and_greed, news; ceros (neutral) si el archivo no existe,
+    como hace get_all_sentiment_signals cuando falla una fuente.
+
+    Returns:
+        tuple: (dict de arrays por señal, True si se usó un histórico grabado).
+    """
+    sentiment = {name: np.zeros(len(ts)) for name in CONFLUENCE_WEIGHTS if name != 'tech'}
+    if path is None or not os.path.exists(path):
+        return sentiment, False
+    history = pd.read_csv(path).sort_values('ts')
+    rows = np.searchsorted(history['ts'].to_numpy(), ts, side='right') - 1
+    for name in sentiment:
+        values = history[name].to_numpy(dtype=np.float64)
+        sentiment[name] = np.where(rows >= 0, values[np.maximum(rows, 0)], 0.0)
+    return sentiment, True
+
+
+def max_drawdown_pct(equity):
+    """Máxima caída desde un pico de la curva de capital, en %."""
+    if len(equity) == 0:
+        return 0.0
+    return float((equity / np.maximum.accumulate(equity) - 1.0).min() * 100)
+
+
+def run_risk_backtest(high, low, close, predictions, stop_loss_pct=None, take_profit_pct=None,
+                      initial_capital=INITIAL_CAPITAL, fee_rate=0.0, slippage=0.0, open_=None, index=None):
+    """
+    Backtest con las reglas de los bots en vivo: entrada al cierre con señal 1,
+    salida por Stop-Loss / Take-Profit en cuanto el Low/High de una vela posterior
+    toca el nivel, o por señal 0 al cierre. Para medir la estrategia de los bots,
+    `predictions` debe ser la salida de confluence_signals (con predicciones crudas
+    del modelo se mide solo el modelo con SL/TP). Tras un SL/TP el bot no vuelve a
+    comprar en esa misma vela (igual que run_bot, que termina el ciclo).
+
+    Si una vela toca ambos niveles se asume el Stop-Loss (criterio conservador).
+    Con `open_` se simulan los huecos: si la vela abre más allá del nivel, se ejecuta
+    a la apertura. Sin SL/TP (None) equivale a run_vectorized_backtest.
+
+    Returns:
+        dict: igual que run_vectorized_backtest, con la columna 'exit_reason' en 'trades'.
+    """
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    predictions = np.asarray(predictions)
+    n = len(close)
+    buy = predictions == 1
+    sell = predictions == 0
+    if n:
+        buy[-1] = sell[-1] = False  # La última vela no genera señal.
+    next_buy = next_index_where(buy)
+    next_sell = next_index_where(sell)
+    stop_factor = 1 - stop_loss_pct / 100 if stop_loss_pct is not None else 0.0
+    take_factor = 1 + take_profit_pct / 100 if take_profit_pct is not None else np.inf
+    keep = 1.0 - fee_rate
+
+    entries, exits, entry_prices, exit_prices, reasons = [], [], [], [], []
+    i = int(buy.argmax()) if buy.any() else n
+    while i < n - 1:
+        entry_price = close[i] * (1 + slippage)
+        stop_price = entry_price * stop_factor
+        take_price = entry_price * take_factor
+        signal_exit = int(next_sell[i])
+        horizon = min(signal_exit, n - 1)
+        j = first_touch(high, low, i + 1, horizon + 1, stop_price, take_price)
+        if j >= 0:
+            if low[j] <= stop_price:
+                fill, reason = (min(open_[j], stop_price) if open_ is not None else stop_price), 'Stop-Loss'
+            else:
+                fill, reason = (max(open_[j], take_price) if open_ is not None else take_price), 'Take-Profit'
+        elif signal_exit < n:
+            j, fill, reason = signal_exit, close[signal_exit], 'Señal de Venta'
+        else:
+            j, fill, reason = n - 1, close[n - 1], 'Fin de datos'
+        entries.append(i)
+        exits.append(j)
+        entry_prices.append(entry_price)
+        exit_prices.append(fill * (1 - slippage))
+        reasons.append(reason)
+        i = int(next_buy[j])
+
+    entries = np.asarray(entries, dtype=np.int64)
+    exits = np.asarray(exits, dtype=np.int64)
+    entry_price = np.asarray(entry_prices, dtype=np.float64)
+    exit_price = np.asarray(exit_prices, dtype=np.float64)
+    trade_return = (exit_price / entry_price) * keep * keep
+    cash_after = initial_capital * np.cumprod(trade_return)
+    cash_before = np.concatenate([[initial_capital], cash_after[:-1]])
+    equity = _equity_curve(close, entries, exits, cash_before, cash_after, entry_price, keep, initial_capital)
+    return _result(entries, exits, entry_price, exit_price, trade_return, cash_before, cash_after,
+                   equity, initial_capital, index, np.asarray(reasons, dtype=object))
+
+
+def loop_backtest(close, predictions, initial_capital=INITIAL_CAPITAL):
+    """El bucle original de backtest.py (referencia para verificar el motor vectorizado)."""
+    balance = float(initial_capital)
+    position = 0.0
+    in_position = False
+    for i in range(len(close) - 1):
+        current_price = float(close[i])
+        if predictions[i] == 1 and not in_position:
+            position = balance / current_price
+            balance = 0.0
+            in_position = True
+        elif predictions[i] == 0 and in_position:
+            balance = position * current_price
+            position = 0.0
+            in_position = False
+    if in_position:
+        balance = position * float(close[-1])
+    return balance
+
+
+# Este bloque permite ejecutar el script directamente para verificar el motor
+# contra el bucle original y medir el throughput (velas por segundo).
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    for n_rows in (1_000, 100_000):
+        close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n_rows)))
+        predictions = rng.integers(0, 2, n_rows)
+        expected = loop_backtest(close, predictions)
+        result = run_vectorized_backtest(close, predictions)
+        rel_error = abs(result['final_balance'] - expected) / expected
+        print(f"{n_rows:>10,} velas | bucle: {expected:.6f} | vectorizado: {result['final_balance']:.6f} | "
+              f"operaciones: {len(result['trades'])} | error relativo: {rel_error:.1e}")
+
+    # SL/TP desactivados: debe coincidir con el motor sin reglas de riesgo.
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.002, 100_000)))
+    predictions = rng.integers(0, 2, len(close))
+    plain = run_vectorized_backtest(close, predictions)['final_balance']
+    risk = run_risk_backtest(close * 1.001, close * 0.999, close, predictions)['final_balance']
+    print(f"Sin SL/TP: vectorizado {plain:.6f} | con reglas de riesgo {risk:.6f}")
+
+    # SL 1.5% / TP 3% sobre ~3 años de velas de 1m con señales persistentes.
+    n_rows = 1_500_000
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.0008, n_rows)))
+    high = close * (1 + rng.random(n_rows) * 0.002)
+    low = close * (1 - rng.random(n_rows) * 0.002)
+    predictions = (np.sin(np.arange(n_rows) / 700 + rng.normal(0, 0.3, n_rows)) > 0).astype(np.int8)
+    start = time.perf_counter()
+    result = run_risk_backtest(high, low, close, predictions, 1.5, 3.0, fee_rate=0.001)
+    elapsed = time.perf_counter() - start
+    reasons = result['trades']['exit_reason'].value_counts().to_dict()
+    print(f"SL/TP sobre {n_rows:,} velas: {elapsed:.2f} s ({n_rows / elapsed / 1e6:.1f} M velas/s), "
+          f"{len(result['trades']):,} operaciones {reasons}")
+
+    n_rows = 20_000_000
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.0005, n_rows)))
+    for label, predictions in (('señales aleatorias', rng.integers(0, 2, n_rows).astype(np.int8)),
+                               ('señales persistentes', (np.sin(np.arange(n_rows) / 500) > 0).astype(np.int8))):
+        start = time.perf_counter()
+        result = run_vectorized_backtest(close, predictions, fee_rate=0.001, slippage=0.0005)
+        elapsed = time.perf_counter() - start
+        print(f"{n_rows:,} velas ({label}): {elapsed:.2f} s -> {n_rows / elapsed / 1e6:.1f} M velas/s, "
+              f"{len(result['trades']):,} operaciones")
@@ -0,0 +1,186 @@
+# backtest_store.py (Almacén de Resultados de Backtest - Sin Repetir Ejecuciones)
+#
+# run_training_pipeline.py lanza backtest.py en cada ejecución aunque ni el
+# modelo ni el rango de velas hayan cambiado. Cada ejecución se guarda con una
+# clave derivada de:
+#     (hash del modelo, huella de los datos, parámetros del backtest, ENGINE_VERSION)
+# así que repetir el mismo backtest es una lectura de archivo. Un cambio en la
+# simulación sube ENGINE_VERSION y deja atrás los resultados guardados.
+#
+# - Cada ejecución es un .npz columnar (una columna por campo de la tabla de
+#   operaciones + la curva de capital), igual que candle_store y feature_cache.
+# - index.csv guarda una fila de métricas por ejecución (modelo, datos,
+#   parámetros, rentabilidad, drawdown...) para comparar ejecuciones sin abrir
+#   ninguna tabla de operaciones.
+
+import csv
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import max_drawdown_pct
+from feature_cache import file_hash
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(PROJECT_ROOT, 'data', 'backtests')
+INDEX_FILE = 'index.csv'
+INDEX_FIELDS = ['key', 'created', 'name', 'model_hash', 'data_fingerprint', 'first_ts', 'last_ts', 'rows',
+                'params', 'final_balance', 'return_pct', 'n_trades', 'win_rate', 'profit_factor',
+                'max_drawdown_pct']
+# Versión de la simulación (backtest_engine.py y los simuladores de backtest.py): súbela cuando
+# un cambio de código altere los resultados, para que no se reutilicen ejecuciones antiguas.
+ENGINE_VERSION = 1
+# Columnas de fecha de la tabla de operaciones: se guardan como int64 (ns UTC).
+TIME_COLUMNS = ('entry_time', 'exit_time')
+
+
+def data_fingerprint(df, columns=('Open', 'High', 'Low', 'Close', 'Volume')):
+    """Huella de las velas: rango temporal, número de filas y hash del contenido OHLCV."""
+    digest = hashlib.sha1(np.ascontiguousarray(df.index.asi8 if isinstance(df.index, pd.DatetimeIndex)
+                                               else np.asarray(df.index)).tobytes())
+    for name in columns:
+        if name in df:
+            digest.update(np.ascontiguousarray(df[name].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def run_key(model_path, fingerprint, params):
+    """Clave de una ejecución: hash del modelo + huella de los datos + parámetros + versión del motor."""
+    parts = {'model': file_hash(model_path) if model_path else None, 'data': fingerprint,
+             'params': {key: params[key] for key in sorted(params)}, 'engine': ENGINE_VERSION}
+    return f"bt-{hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]}"
+
+
+def _run_path(key, root=None):
+    return os.path.join(root or STORE_DIR, f"{key}.npz")
+
+
+def summary_metrics(result, initial_capital):
+    """Métricas de comparación de un resultado de backtest_engine."""
+    trades = result['trades']
+    pnl = trades['pnl'].to_numpy() if len(trades) else np.zeros(0)
+    loss = -pnl[pnl < 0].sum()
+    return {
+        'final_balance': float(result['final_balance']),
+        'return_pct': float(result['return_pct']),
+        'n_trades': int(len(trades)),
+        'win_rate': float((pnl > 0).mean() * 100) if len(pnl) else 0.0,
+        'profit_factor': float(pnl[pnl > 0].sum() / loss) if loss > 0 else float('inf'),
+        'max_drawdown_pct': max_drawdown_pct(np.asarray(result['equity'], dtype=np.float64)),
+    }
+
+
+def get(key, root=None):
+    """Resultado guardado para `key` (mismo formato que backtest_engine) o None."""
+    try:
+        with np.load(_run_path(key, root)) as data:
+            arrays = {name: data[name] for name in data.files}
+    except (OSError, ValueError):
+        return None
+    trades = pd.DataFrame({name[len('trade_'):]: values for name, values in arrays.items()
+                           if name.startswith('trade_')})
+    for name in TIME_COLUMNS:
+        if name in trades and int(arrays['times_are_dates']):
+            trades[name] = pd.to_datetime(trades[name], utc=True)
+    return {
+        'final_balance': float(arrays['final_balance']),
+        'return_pct': float(arrays['return_pct']),
+        'trades': trades,
+        'equity': arrays['equity'],
+        'metrics': json.loads(str(arrays['metrics'])),
+    }
+
+
+def put(key, result, data, params, model_path=None, name='', root=None, fingerprint=None):
+    """Guarda un resultado (tabla de operaciones + capital) y añade su fila de métricas al índice."""
+    directory = root or STORE_DIR
+    os.makedirs(directory, exist_ok=True)
+    trades = result['trades']
+    times_are_dates = any(pd.api.types.is_datetime64_any_dtype(trades[col]) for col in TIME_COLUMNS if col in trades)
+    columns = {}
+    for col in trades.columns:
+        values = trades[col]
+        if col in TIME_COLUMNS and pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.DatetimeIndex(values).as_unit('ns').asi8
+        elif not pd.api.types.is_numeric_dtype(values):
+            values = values.to_numpy(dtype=str)  # Texto de ancho fijo: se carga sin pickle.
+        columns[f"trade_{col}"] = np.asarray(values)
+    metrics = summary_metrics(result, params.get('initial_capital', 1000.0))
+
+    path = _run_path(key, root)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, final_balance=result['final_balance'], return_pct=result['return_pct'],
+                            equity=np.asarray(result['equity'], dtype=np.float64),
+                            times_are_dates=int(times_are_dates), metrics=json.dumps(metrics), **columns)
+    os.replace(tmp_path, path)
+
+    index_path = os.path.join(directory, INDEX_FILE)
+    is_new = not os.path.exists(index_path)
+    row = {'key': key, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'name': name,
+           'model_hash': file_hash(model_path) if model_path else '',
+           'data_fingerprint': fingerprint or data_fingerprint(data),
+           'first_ts': data.index[0] if len(data) else '', 'last_ts': data.index[-1] if len(data) else '',
+           'rows': len(data), 'params': json.dumps(params, sort_keys=True, default=str), **metrics}
+    with open(index_path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS)
+        if is_new:
+            writer.writeheader()
+        writer.writerow(row)
+    return metrics
+
+
+def cached_backtest(data, params, model_path, compute, name='', root=None):
+    """
+    Resultado del backtest para (modelo, velas, parámetros); solo ejecuta `compute`
+    si esa combinación no se ha ejecutado antes.
+
+    Returns:
+        tuple: (resultado, True si venía del almacén).
+    """
+    fingerprint = data_fingerprint(data)
+    key = run_key(model_path, fingerprint, params)
+    stored = get(key, root)
+    if stored is not None:
+        return stored, True
+    result = compute()
+    result['metrics'] = put(key, result, data, params, model_path, name, root, fingerprint)
+    return result, False
+
+
+def runs(root=None, **filters):
+    """
+    Índice de ejecuciones como DataFrame (una fila por ejecución, última versión por clave),
+    filtrado por igualdad de columnas, p. ej. runs(model_hash='...', name='sl_tp').
+    """
+    index_path = os.path.join(root or STORE_DIR, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return pd.DataFrame(columns=INDEX_FIELDS)
+    table = pd.read_csv(index_path).drop_duplicates('key', keep='last')
+    for column, value in filters.items():
+        table = table[table[column] == value]
+    return table.reset_index(drop=True)
+
+
+def compare(metric='return_pct', by='name', root=None, **filters):
+    """Tabla de comparación: `metric` de cada ejecución, una columna por valor de `by`, una fila por modelo."""
+    table = runs(root, **filters)
+    if table.empty:
+        return table
+    return table.pivot_table(index=['model_hash', 'data_fingerprint'], columns=by, values=metric, aggfunc='last')
+
+
+if __name__ == '__main__':
+    table = runs()
+    if table.empty:
+        print("ℹ️ Aún no hay backtests guardados. Ejecuta 'backtest.py'.")
+    else:
+        print(f"--- {len(table)} backtests guardados en '{STORE_DIR}' ---")
+        print(table[['created', 'name', 'model_hash', 'rows', 'return_pct', 'n_trades', 'win_rate',
+                     'max_drawdown_pct']].tail(20).to_string(index=False))
+        print("\n--- Rentabilidad (%) por modelo y variante ---")
+        print(compare().to_string())
@@ -0,0 +1,153 @@
+# candle_archive.py (Archivo Histórico Multi-Año de Velas con np.memmap)
+#
+# yfinance solo entrega 60 días de velas de 15m (7 días de 1m). Este archivo
+# acumula años de histórico en arrays binarios de ancho fijo, uno por columna
+# (ts int64 + OHLCV float64), que se abren con np.memmap. La columna `ts` está
+# ordenada y funciona como índice: una búsqueda binaria localiza cualquier
+# rango y se devuelven vistas sin copia, sin parsear CSV ni cargar un DataFrame.
+#
+# Estructura en disco:
+#     data/archive/BTC-USD/15m/meta.json   -> {"length": n, ...}
+#     data/archive/BTC-USD/15m/ts.bin, open.bin, high.bin, low.bin, close.bin, volume.bin
+
+import json
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+import candle_store
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(PROJECT_ROOT, 'data', 'archive')
+
+DTYPES = {'ts': np.int64, 'open': np.float64, 'high': np.float64, 'low': np.float64,
+          'close': np.float64, 'volume': np.float64}
+FRAME_COLUMNS = candle_store.FRAME_COLUMNS
+
+
+class CandleArchive:
+    """Archivo de velas de un símbolo/intervalo respaldado por arrays mapeados en memoria."""
+
+    def __init__(self, symbol, interval, root=None):
+        self.symbol = symbol
+        self.interval = interval
+        self.directory = os.path.join(root or ARCHIVE_DIR, symbol, interval)
+        self._views = None
+        self._views_length = -1
+
+    # --- Metadatos ---
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _column_path(self, column):
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def __len__(self):
+        if not os.path.exists(self.meta_path):
+            return 0
+        with open(self.meta_path, 'r') as f:
+            return int(json.load(f)['length'])
+
+    def _write_meta(self, length):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'symbol': self.symbol, 'interval': self.interval, 'length': int(length),
+                       'dtypes': {col: np.dtype(dtype).str for col, dtype in DTYPES.items()}}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    # --- Lectura ---
+    def columns(self):
+        """Devuelve un dict de arrays np.memmap de solo lectura con todas las velas."""
+        length = len(self)
+        if self._views is None or self._views_length != length:
+            if length == 0:
+                self._views = {col: np.empty(0, dtype=dtype) for col, dtype in DTYPES.items()}
+            else:
+                self._views = {col: np.memmap(self._column_path(col), dtype=dtype, mode='r', shape=(length,))
+                               for col, dtype in DTYPES.items()}
+            self._views_length = length
+        return self._views
+
+    def last_timestamp(self):
+        ts = self.columns()['ts']
+        return int(ts[-1]) if len(ts) else None
+
+    def locate(self, start=None, end=None):
+        """Búsqueda binaria sobre el índice de timestamps: posiciones [i, j) del rango [start, end)."""
+        ts = self.columns()['ts']
+        i = int(np.searchsorted(ts, start, side='left')) if start is not None else 0
+        j = int(np.searchsorted(ts, end, side='left')) if end is not None else len(ts)
+        return i, j
+
+    def window(self, start=None, end=None):
+        """Vistas sin copia (memmap) de las velas en [start, end), en segundos UTC."""
+        i, j = self.locate(start, end)
+        return {col: values[i:j] for col, values in self.columns().items()}
+
+    def window_frame(self, start=None, end=None):
+        """El mismo rango como DataFrame OHLCV con índice UTC (aquí sí se copia)."""
+        view = self.window(start, end)
+        index = pd.DatetimeIndex(pd.to_datetime(np.asarray(view['ts']), unit='s', utc=True), name='Datetime')
+        return pd.DataFrame({frame_col: np.asarray(view[col]) for col, frame_col in FRAME_COLUMNS.items()}, index=index)
+
+    # --- Escritura (solo anexar) ---
+    def append(self, columns):
+        """
+        Añade velas posteriores a la última archivada. Los datos se escriben antes
+        que los metadatos, así que un corte a mitad de escritura no deja velas a medias.
+
+        Returns:
+            int: número de velas añadidas.
+        """
+        ts = np.asarray(columns['ts'], dtype=np.int64)
+        last = self.last_timestamp()
+        keep = ts > last if last is not None else np.ones(len(ts), dtype=bool)
+        if not keep.any():
+            return 0
+        order = np.argsort(ts[keep], kind='stable')
+
+        os.makedirs(self.directory, exist_ok=True)
+        length = len(self)
+        for col, dtype in DTYPES.items():
+            values = np.ascontiguousarray(np.asarray(columns[col], dtype=dtype)[keep][order])
+            with open(self._column_path(col), 'ab') as f:
+                # Descarta restos de una escritura interrumpida que no llegó a los metadatos.
+                f.truncate(length * np.dtype(dtype).itemsize)
+                f.write(values.tobytes())
+        added = int(keep.sum())
+        self._write_meta(length + added)
+        self._views = None
+        return added
+
+    def ingest_from_store(self):
+        """Copia al archivo las velas del almacén diario (candle_store) que aún no estén archivadas."""
+        last = self.last_timestamp()
+        columns = candle_store.load_arrays(self.symbol, self.interval, start=None if last is None else last + 1)
+        return self.append(columns)
+
+
+def load_period(symbol, interval, period):
+    """
+    Sincroniza el almacén diario, lo vuelca al archivo y devuelve los últimos
+    `period` (p. ej. '60d' o '730d') como DataFrame, leyendo por memmap.
+    """
+    try:
+        candle_store.sync(symbol, interval)
+    except Exception as e:
+        logging.error(f"❌ [Archivo] Error al sincronizar {symbol} {interval}: {e}")
+    archive = CandleArchive(symbol, interval)
+    archive.ingest_from_store()
+    last = archive.last_timestamp()
+    if last is None:
+        return archive.window_frame()
+    return archive.window_frame(start=last - candle_store.period_seconds(period) + 1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+    archive = CandleArchive('BTC-USD', '15m')
+    added = archive.ingest_from_store()
+    print(f"✅ {added} velas archivadas. Total: {len(archive)} velas en '{archive.directory}'.")
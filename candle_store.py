@@ -0,0 +1,293 @@
+# candle_store.py (Almacén Local de Velas OHLCV - Solo Anexar + Sincronización Delta)
+#
+# Todos los scripts (train_model, backtest, predict, predict_live, scheduler)
+# leen las velas de este almacén en lugar de llamar a yf.download cada uno por
+# su cuenta. `sync` solo descarga las velas posteriores a la última guardada,
+# de modo que en cada ciclo el tráfico de red se reduce a unas pocas velas.
+#
+# Estructura en disco (columnar, particionada por símbolo/intervalo/día UTC):
+#     data/candles/BTC-USD/15m/2025-07-12.npz   -> ts, open, high, low, close, volume
+
+import os
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+CANDLE_DIR = os.path.join(PROJECT_ROOT, 'data', 'candles')
+
+COLUMNS = ['ts', 'open', 'high', 'low', 'close', 'volume']
+FRAME_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+# Historial máximo que yfinance permite descargar para cada intervalo intradía.
+MAX_HISTORY_DAYS = {'1m': 7, '2m': 60, '5m': 60, '15m': 60, '30m': 60, '60m': 730, '1h': 730, '1d': 3650}
+DAY_SECONDS = 24 * 60 * 60
+
+
+def interval_seconds(interval):
+    """'15m' -> 900, '1h' -> 3600, '1d' -> 86400."""
+    units = {'m': 60, 'h': 3600, 'd': DAY_SECONDS}
+    return int(interval[:-1]) * units[interval[-1]]
+
+
+def period_seconds(period):
+    """'60d' -> segundos. Solo se usan periodos en días, como en yfinance."""
+    if not period.endswith('d'):
+        raise ValueError(f"Periodo no soportado: '{period}'. Usa días, p. ej. '60d'.")
+    return int(period[:-1]) * DAY_SECONDS
+
+
+def utc_now():
+    """Hora actual en segundos Unix UTC (el replay de mercado la sustituye por su reloj)."""
+    return int(datetime.now(tz=timezone.utc).timestamp())
+
+
+def epoch_seconds(index):
+    """Convierte un DatetimeIndex (con o sin zona horaria) a segundos Unix UTC."""
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    return np.asarray((index - pd.Timestamp('1970-01-01', tz='UTC')) // pd.Timedelta(seconds=1), dtype=np.int64)
+
+
+def _series_dir(symbol, interval, root=None):
+    return os.path.join(root or CANDLE_DIR, symbol, interval)
+
+
+def _partitions(symbol, interval, root=None):
+    """Lista ordenada de (día, ruta) de las particiones existentes."""
+    directory = _series_dir(symbol, interval, root)
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.npz'))
+    return [(name[:-4], os.path.join(directory, name)) for name in names]
+
+
+def _day_of(ts):
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _read_partition(path):
+    with np.load(path) as data:
+        return {col: data[col] for col in COLUMNS}
+
+
+def _write_partition(path, columns):
+    """Escritura atómica: archivo temporal + os.replace (lectores nunca ven un archivo a medias)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **columns)
+    os.replace(tmp_path, path)
+
+
+def last_timestamp(symbol, interval, root=None):
+    """Timestamp (segundos UTC) de la última vela guardada, o None si el almacén está vacío."""
+    partitions = _partitions(symbol, interval, root)
+    if not partitions:
+        return None
+    ts = _read_partition(partitions[-1][1])['ts']
+    return int(ts[-1]) if len(ts) else None
+
+
+def append_candles(symbol, interval, columns, root=None):
+    """
+    Añade velas al final del almacén. Solo se guardan las posteriores a la última
+    vela existente, así que llamar dos veces con los mismos datos no duplica nada.
+
+    Args:
+        columns (dict): arrays 'ts', 'open', 'high', 'low', 'close', 'volume'.
+
+    Returns:
+        int: número de velas añadidas.
+    """
+    ts = np.asarray(columns['ts'], dtype=np.int64)
+    last = last_timestamp(symbol, interval, root)
+    keep = ts > last if last is not None else np.ones(len(ts), dtype=bool)
+    if not keep.any():
+        return 0
+
+    order = np.argsort(ts[keep], kind='stable')
+    new = {col: np.asarray(columns[col], dtype=np.int64 if col == 'ts' else np.float64)[keep][order] for col in COLUMNS}
+    directory = _series_dir(symbol, interval, root)
+    os.makedirs(directory, exist_ok=True)
+
+    days = new['ts'] // DAY_SECONDS
+    boundaries = np.flatnonzero(np.diff(days)) + 1
+    for chunk in np.split(np.arange(len(days)), boundaries):
+        day = _day_of(new['ts'][chunk[0]])
+        path = os.path.join(directory, f"{day}.npz")
+        part = {col: new[col][chunk] for col in COLUMNS}
+        if os.path.exists(path):
+            existing = _read_partition(path)
+            part = {col: np.concatenate([existing[col], part[col]]) for col in COLUMNS}
+        _write_partition(path, part)
+    return int(keep.sum())
+
+
+def _frame_to_columns(df):
+    """Convierte la salida de yf.download (columnas simples o MultiIndex) a arrays del almacén."""
+    columns = {'ts': epoch_seconds(df.index)}
+    for col, frame_col in FRAME_COLUMNS.items():
+        columns[col] = np.asarray(df[frame_col], dtype=np.float64).reshape(-1)
+    return columns
+
+
+def sync(symbol, interval, root=None):
+    """
+    Descarga solo las velas CERRADAS posteriores a la última guardada y las anexa.
+    Si el almacén está vacío, descarga el máximo histórico que permite yfinance.
+
+    Returns:
+        int: número de velas nuevas guardadas.
+    """
+    now = utc_now()
+    step = interval_seconds(interval)
+    max_days = MAX_HISTORY_DAYS.get(interval, 60)
+    last = last_timestamp(symbol, interval, root)
+
+    if last is None:
+        logging.info(f"📥 [Velas] Almacén vacío para {symbol} {interval}. Descargando {max_days}d de histórico...")
+        df = yf.download(symbol, period=f"{max_days}d", interval=interval, auto_adjust=True, progress=False)
+    else:
+        if last + 2 * step > now:
+            return 0  # Aún no ha cerrado ninguna vela nueva.
+        start = max(last, now - (max_days - 1) * DAY_SECONDS)
+        df = yf.download(symbol, start=datetime.fromtimestamp(start, tz=timezone.utc), interval=interval,
+                         auto_adjust=True, progress=False)
+
+    if df is None or df.empty:
+        logging.warning(f"⚠️ [Velas] yfinance no devolvió velas nuevas para {symbol} {interval}.")
+        return 0
+
+    columns = _frame_to_columns(df)
+    closed = columns['ts'] + step <= now
+    added = append_candles(symbol, interval, {col: values[closed] for col, values in columns.items()}, root)
+    logging.info(f"📥 [Velas] {symbol} {interval}: {added} vela(s) nueva(s) guardada(s).")
+    return added
+
+
+def sync_many(symbols, interval, root=None):
+    """
+    Igual que `sync` pero para varios símbolos con UNA sola descarga de yfinance
+    (desde la vela más antigua pendiente de todos ellos).
+
+    Returns:
+        dict: {símbolo: número de velas nuevas guardadas}.
+    """
+    now = utc_now()
+    step = interval_seconds(interval)
+    max_days = MAX_HISTORY_DAYS.get(interval, 60)
+    lasts = {symbol: last_timestamp(symbol, interval, root) for symbol in symbols}
+    pending = [symbol for symbol, last in lasts.items() if last is None or last + 2 * step <= now]
+    if not pending:
+        return {symbol: 0 for symbol in symbols}
+
+    if any(lasts[symbol] is None for symbol in pending):
+        df = yf.download(pending, period=f"{max_days}d", interval=interval, auto_adjust=True,
+                         progress=False, group_by='ticker')
+    else:
+        start = max(min(lasts[symbol] for symbol in pending), now - (max_days - 1) * DAY_SECONDS)
+        df = yf.download(pending, start=datetime.fromtimestamp(start, tz=timezone.utc), interval=interval,
+                         auto_adjust=True, progress=False, group_by='ticker')
+
+    added = {symbol: 0 for symbol in symbols}
+    if df is None or df.empty:
+        logging.warning(f"⚠️ [Velas] yfinance no devolvió velas nuevas para {len(pending)} símbolo(s) {interval}.")
+        return added
+    tickers = df.columns.get_level_values(0) if isinstance(df.columns, pd.MultiIndex) else []
+    for symbol in pending:
+        if symbol not in tickers:
+            continue
+        columns = _frame_to_columns(df[symbol])
+        # El índice de una descarga múltiple es la unión de todos los símbolos: se quitan los huecos.
+        keep = ~np.isnan(columns['close']) & (columns['ts'] + step <= now)
+        added[symbol] = append_candles(symbol, interval, {col: values[keep] for col, values in columns.items()}, root)
+    logging.info(f"📥 [Velas] {interval}: {sum(added.values())} vela(s) nueva(s) en {len(pending)} símbolo(s).")
+    return added
+
+
+def load_arrays(symbol, interval, start=None, end=None, root=None):
+    """
+    Lectura rápida de un rango [start, end) en segundos UTC. Solo abre las
+    particiones diarias que se solapan con el rango.
+
+    Returns:
+        dict: arrays 'ts', 'open', 'high', 'low', 'close', 'volume'.
+    """
+    first_day = _day_of(start) if start is not None else None
+    last_day = _day_of(end) if end is not None else None
+    parts = [_read_partition(path) for day, path in _partitions(symbol, interval, root)
+             if (first_day is None or day >= first_day) and (last_day is None or day <= last_day)]
+    if not parts:
+        return {col: np.empty(0, dtype=np.int64 if col == 'ts' else np.float64) for col in COLUMNS}
+
+    columns = {col: np.concatenate([part[col] for part in parts]) for col in COLUMNS}
+    mask = np.ones(len(columns['ts']), dtype=bool)
+    if start is not None:
+        mask &= columns['ts'] >= start
+    if end is not None:
+        mask &= columns['ts'] < end
+    return {col: values[mask] for col, values in columns.items()}
+
+
+def load_candles(symbol, interval, start=None, end=None, root=None):
+    """Igual que load_arrays pero devuelve un DataFrame OHLCV con índice UTC (formato yfinance plano)."""
+    columns = load_arrays(symbol, interval, start, end, root)
+    index = pd.DatetimeIndex(pd.to_datetime(columns['ts'], unit='s', utc=True), name='Datetime')
+    return pd.DataFrame({frame_col: columns[col] for col, frame_col in FRAME_COLUMNS.items()}, index=index)
+
+
+def load_panel(symbols, interval, start=None, end=None, root=None):
+    """
+    Carga varios símbolos alineados en una rejilla común de timestamps (panel 2D).
+
+    Los huecos de un símbolo se rellenan con el último precio conocido y volumen 0;
+    antes de su primera vela quedan NaN (sus features saldrán NaN y no se puntúan).
+
+    Returns:
+        tuple: (ts (n_velas,), dict de arrays 'open', 'high', 'low', 'close', 'volume'
+        con forma (n_velas, len(symbols))).
+    """
+    series = [load_arrays(symbol, interval, start, end, root) for symbol in symbols]
+    ts = np.unique(np.concatenate([columns['ts'] for columns in series])) if series else np.empty(0, dtype=np.int64)
+    shape = (len(ts), len(symbols))
+    panel = {col: np.full(shape, np.nan) for col in COLUMNS[1:]}
+    present = np.zeros(shape, dtype=bool)
+    for j, columns in enumerate(series):
+        rows = np.searchsorted(ts, columns['ts'])
+        present[rows, j] = True
+        for col in COLUMNS[1:]:
+            panel[col][rows, j] = columns[col]
+
+    # Forward-fill vectorizado: índice de la última fila presente en cada columna.
+    last_row = np.maximum.accumulate(np.where(present, np.arange(len(ts))[:, None], 0), axis=0)
+    symbol_idx = np.arange(len(symbols))[None, :]
+    close = panel['close'][last_row, symbol_idx]
+    for col in ('open', 'high', 'low'):
+        panel[col] = np.where(present, panel[col], close)
+    panel['close'] = close
+    panel['volume'] = np.where(present, panel['volume'], np.where(np.isnan(close), np.nan, 0.0))
+    return ts, panel
+
+
+def get_candles(symbol, interval, period):
+    """
+    Sincroniza el almacén y devuelve las velas de los últimos `period` (p. ej. '60d').
+    Es el reemplazo directo de yf.download(symbol, period=..., interval=...).
+    """
+    try:
+        sync(symbol, interval)
+    except Exception as e:
+        # Sin red seguimos con lo que ya hay en disco.
+        logging.error(f"❌ [Velas] Error al sincronizar {symbol} {interval}: {e}")
+    start = utc_now() - period_seconds(period)
+    return load_candles(symbol, interval, start=start)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+    added = sync('BTC-USD', '15m')
+    candles = load_candles('BTC-USD', '15m')
+    print(f"✅ {added} velas nuevas. Total en el almacén: {len(candles)} velas ({candles.index.min()} -> {candles.index.max()})")
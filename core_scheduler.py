@@ -0,0 +1,128 @@
+# core_scheduler.py (Reparto de Núcleos entre Ajustes Paralelos y Hilos de XGBoost)
+#
+# Con GridSearchCV(n_jobs=-1) sobre un XGBClassifier que también usa todos los
+# núcleos, una máquina de N núcleos acababa con N x N hilos peleándose. Aquí
+# los núcleos se reparten de forma explícita: `workers` ajustes en paralelo x
+# `nthread` hilos de XGBoost por ajuste = núcleos disponibles.
+#
+# - Los ajustes paralelos son hilos del mismo proceso (XGBoost libera el GIL
+#   mientras entrena), así que comparten las matrices cuantizadas sin copiarlas.
+# - El reparto se elige con una calibración rápida (unos ajustes cortos por
+#   reparto) y se guarda en models/core_split.json por máquina y tamaño de
+#   datos, para no repetirla en cada entrenamiento.
+#
+# Uso (benchmark de ajustes/minuto por reparto): python core_scheduler.py [n_núcleos]
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+SPLIT_CACHE_PATH = os.path.join(PROJECT_ROOT, "models", "core_split.json")
+# Ajustes por trabajador en la calibración de cada reparto.
+CALIBRATION_FITS = 2
+
+
+def available_cores():
+    """Núcleos que este proceso puede usar (respeta la afinidad de CPU / cgroups)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def core_splits(n_cores=None):
+    """Repartos exactos (workers, nthread) con workers x nthread = n_cores: (1, 8), (2, 4), (4, 2), (8, 1)."""
+    n_cores = n_cores or available_cores()
+    return [(workers, n_cores // workers) for workers in range(1, n_cores + 1) if n_cores % workers == 0]
+
+
+def run_parallel(fit, tasks, workers):
+    """Ejecuta fit(task) para cada tarea con `workers` hilos; devuelve los resultados en orden."""
+    if workers <= 1:
+        return [fit(task) for task in tasks]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fit, tasks))
+
+
+def fits_per_minute(make_fit, workers, nthread, fits_per_worker=CALIBRATION_FITS):
+    """Ajustes completados por minuto con `workers` ajustes en paralelo de `nthread` hilos cada uno."""
+    fit = make_fit(nthread)
+    n_fits = workers * fits_per_worker
+    start = time.perf_counter()
+    run_parallel(fit, range(n_fits), workers)
+    return n_fits / (time.perf_counter() - start) * 60
+
+
+def calibrate(make_fit, n_cores=None, fits_per_worker=CALIBRATION_FITS, splits=None):
+    """
+    Mide cada reparto de núcleos.
+
+    Args:
+        make_fit (callable): make_fit(nthread) -> fit(task) que hace UN ajuste de prueba.
+
+    Returns:
+        list: [{'workers', 'nthread', 'fits_per_minute'}], de más a menos rápido.
+    """
+    results = [{'workers': workers, 'nthread': nthread,
+                'fits_per_minute': round(fits_per_minute(make_fit, workers, nthread, fits_per_worker), 1)}
+               for workers, nthread in (splits or core_splits(n_cores))]
+    return sorted(results, key=lambda row: -row['fits_per_minute'])
+
+
+def _split_key(n_cores, n_rows, n_features):
+    # Filas redondeadas a potencia de 2: el mejor reparto cambia con el tamaño, no con cada vela nueva.
+    return f"{n_cores}:{1 << max(int(n_rows), 1).bit_length()}:{n_features}"
+
+
+def choose_split(make_fit, n_rows, n_features, n_cores=None, cache_path=SPLIT_CACHE_PATH, verbose=0):
+    """
+    Reparto (workers, nthread) para esta máquina y este tamaño de datos: el
+    guardado en `cache_path` o, si no hay, el más rápido de una calibración.
+    """
+    n_cores = n_cores or available_cores()
+    if n_cores == 1:
+        return 1, 1
+    key = _split_key(n_cores, n_rows, n_features)
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if key in cache:
+        return cache[key]['workers'], cache[key]['nthread']
+
+    results = calibrate(make_fit, n_cores)
+    if verbose:
+        print(f"  Calibración de núcleos ({n_cores}): " + ", ".join(
+            f"{row['workers']}x{row['nthread']} = {row['fits_per_minute']:.0f} ajustes/min" for row in results))
+    cache[key] = results[0]
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, cache_path)
+    return results[0]['workers'], results[0]['nthread']
+
+
+# Este bloque permite ejecutar el script directamente para medir los ajustes
+# por minuto de cada reparto (y del reparto sin controlar, N x N hilos) sobre
+# los datos de train_model.py.
+if __name__ == '__main__':
+    import sys
+    from candle_archive import load_period
+    from hyperparameter_search import QuantileGridSearch
+    from train_model import INTERVALO_VELAS, N_SPLITS, PARAM_GRID, PERIODO_DATOS, TICKER, prepare_training_data
+
+    n_cores = int(sys.argv[1]) if len(sys.argv) > 1 else available_cores()
+    data, features = prepare_training_data(load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS))
+    search = QuantileGridSearch(PARAM_GRID, N_SPLITS)
+    make_fit = search.calibration_fit(data[features].to_numpy(), data['target'].to_numpy())
+
+    print(f"--- Ajustes por minuto por reparto de núcleos ({n_cores} núcleos, {len(data)} filas) ---")
+    splits = core_splits(n_cores) + [(n_cores, n_cores)] if n_cores > 1 else core_splits(n_cores)
+    for row in sorted(calibrate(make_fit, n_cores, fits_per_worker=3, splits=splits),
+                      key=lambda row: (row['workers'], row['nthread'])):
+        label = " (sin repartir: N x N hilos)" if n_cores > 1 and row['workers'] * row['nthread'] > n_cores else ""
+        print(f"{row['workers']:>3} ajustes x {row['nthread']:>2} hilos: {row['fits_per_minute']:8.1f} ajustes/min{label}")
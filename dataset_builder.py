@@ -0,0 +1,320 @@
+# dataset_builder.py (Dataset de Entrenamiento Fuera de Memoria - Años de Velas por Bloques)
+#
+# train_model.py carga todo el periodo en un DataFrame. Aquí el archivo de
+# velas (candle_archive, np.memmap) se recorre por bloques de `chunk_rows`
+# velas y cada bloque se escribe como un shard de entrenamiento (.npy con las
+# features float32 y el objetivo), así que la memoria no depende de los años
+# de histórico.
+#
+# - Calentamiento de indicadores: cada bloque se calcula con las WARMUP_BARS
+#   velas anteriores delante (los EWM de RSI/MACD/ATR olvidan el pasado a ese
+#   plazo por debajo de la precisión float64; con temporalidades superiores,
+#   TIMEFRAME_WARMUP_BARS velas de la más alta). El OBV es acumulado: se arrastra
+#   su valor de la última vela del bloque anterior, así que coincide con el
+#   cálculo sobre toda la serie.
+# - Objetivo: el de train_model.TARGET (train_model.target_labels). Cada bloque
+#   lee además las velas siguientes que mira la etiqueta (label_gap + 1), así que
+#   las últimas velas de un bloque tienen la misma etiqueta que sobre toda la serie.
+# - El tamaño de bloque sale de un presupuesto de memoria (max_rss_mb) y el
+#   pico de memoria residente de cada fase se mide y se informa. Al entrenar, la
+#   memoria crece con las filas totales (buffers por fila de XGBoost), no con el
+#   tamaño de los shards: se estima antes de empezar y se rechaza si no cabe.
+# - El entrenamiento lee los shards con el iterador de XGBoost
+#   (ExtMemQuantileDMatrix: las páginas cuantizadas se quedan en disco, en
+#   cache-*.page, y se borran al terminar o al reconstruir). Entre el
+#   entrenamiento y los shards de validación se purgan label_gap velas.
+#
+# Estructura en disco:
+#     data/datasets/BTC-USD/15m/manifest.json
+#     data/datasets/BTC-USD/15m/shard_00000_X.npy, shard_00000_y.npy, ...
+#
+# Uso: python dataset_builder.py [símbolo] [intervalo] [max_rss_mb] [entrenar]
+
+import glob
+import json
+import math
+import os
+import time
+
+import numpy as np
+import xgboost as xgb
+
+import candle_store
+from candle_archive import CandleArchive
+from feature_cache import spec_hash
+from feature_engine import FEATURES, compute_feature_matrix
+from hyperparameter_search import MAX_BIN, _peak_rss_bytes, _reset_peak_rss
+from model_registry import _rss_bytes, load_model_meta
+from resampler import EXTRA_TIMEFRAMES, timeframe_feature_matrix, timeframe_feature_names
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(PROJECT_ROOT, 'data', 'datasets')
+MANIFEST_FILE = 'manifest.json'
+# Velas de calentamiento delante de cada bloque: (13/14)^1000 ~ 1e-32, los EWM ya no recuerdan el corte.
+WARMUP_BARS = 1000
+# Lo mismo en velas de la temporalidad superior más alta ((25/27)^400 ~ 4e-14 para el EWM lento del MACD).
+TIMEFRAME_WARMUP_BARS = 400
+# Presupuesto de memoria residente por defecto para construir y entrenar.
+MAX_RSS_MB = 1024
+# Memoria por vela de un bloque (velas leídas + temporales del motor de features), medida con 1 núcleo.
+BYTES_PER_ROW = 1024
+MIN_CHUNK_ROWS = 10_000
+# Memoria por fila al entrenar con memoria externa (gradientes, predicciones y particiones de XGBoost), más
+# un byte por feature de la página cuantizada; medida con 1 núcleo entre 1 y 4 millones de filas.
+TRAIN_BYTES_PER_ROW = 64
+# Prefijo de las páginas cuantizadas de ExtMemQuantileDMatrix dentro del directorio del dataset.
+CACHE_PREFIX = 'cache'
+# Hiperparámetros si aún no hay un modelo con metadatos (los de la rejilla de train_model.py).
+DEFAULT_PARAMS = {'max_depth': 5, 'learning_rate': 0.1, 'subsample': 0.8, 'n_estimators': 200}
+
+
+def _mb(value):
+    return round(value / 2**20, 1) if value is not None else None
+
+
+def dataset_path(symbol, interval, root=None):
+    return os.path.join(root or DATASET_DIR, symbol, interval)
+
+
+def chunk_rows_for_budget(max_rss_mb, n_timeframes=0):
+    """Velas por bloque que caben en el presupuesto, descontando la memoria ya ocupada por el proceso."""
+    available = max_rss_mb * 2**20 - (_rss_bytes() or 0)
+    rows = int(available // (BYTES_PER_ROW * (1 + n_timeframes)))
+    if rows < MIN_CHUNK_ROWS:
+        raise ValueError(f"Presupuesto de {max_rss_mb} MB insuficiente: el proceso ya ocupa "
+                         f"{_mb(_rss_bytes())} MB (mínimo {MIN_CHUNK_ROWS} velas por bloque).")
+    return rows
+
+
+def training_bytes(rows, n_features, batch_rows):
+    """Memoria estimada para entrenar: buffers por fila de todo el dataset + el shard que se está leyendo."""
+    return rows * (TRAIN_BYTES_PER_ROW + n_features) + batch_rows * n_features * 4
+
+
+def remove_cache_pages(directory):
+    """Borra las páginas cuantizadas que deja un entrenamiento interrumpido."""
+    for path in glob.glob(os.path.join(directory, f"{CACHE_PREFIX}*.page")):
+        os.remove(path)
+
+
+def build_dataset(symbol, interval, directory=None, max_rss_mb=MAX_RSS_MB, chunk_rows=None,
+                  timeframes=EXTRA_TIMEFRAMES, start=None, end=None, root=None, target=None):
+    """
+    Recorre el archivo de velas por bloques y escribe los shards de entrenamiento
+    (features y objetivo de train_model.prepare_training_data).
+
+    Args:
+        target (str opcional): 'next' o 'triple_barrier'; por defecto train_model.TARGET.
+
+    Returns:
+        dict: manifiesto (features, shards, filas, tiempo y pico de memoria).
+    """
+    from train_model import TARGET, label_gap, target_labels
+
+    target = target or TARGET
+    lookahead = label_gap(target) + 1  # Velas siguientes que mira la etiqueta de la última vela del bloque.
+    start_time = time.perf_counter()
+    _reset_peak_rss()
+    archive = CandleArchive(symbol, interval, root)
+    first, stop = archive.locate(start, end)
+    features = FEATURES + timeframe_feature_names(timeframes)
+    warmup = WARMUP_BARS
+    if timeframes:
+        slowest = max(candle_store.interval_seconds(tf) for tf in timeframes)
+        warmup = max(warmup, math.ceil(TIMEFRAME_WARMUP_BARS * slowest / candle_store.interval_seconds(interval)))
+    chunk_rows = chunk_rows or chunk_rows_for_budget(max_rss_mb, len(timeframes))
+    # Columnas acumuladas (OBV de cada temporalidad): el bloque solo difiere en una constante.
+    carried = [k for k, name in enumerate(features) if name == 'obv' or name.startswith('obv_')]
+
+    directory = directory or dataset_path(symbol, interval)
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'shard_*.npy')) + glob.glob(os.path.join(directory, MANIFEST_FILE)):
+        os.remove(path)
+    remove_cache_pages(directory)
+
+    columns = archive.columns()
+    shards = []
+    previous_last = None
+    for a in range(first, stop, chunk_rows):
+        b = min(a + chunk_rows, stop)
+        lo, hi = max(first, a - warmup), min(b + lookahead, stop)
+        block = {col: np.asarray(values[lo:hi]) for col, values in columns.items()}
+        matrix = compute_feature_matrix(block['high'], block['low'], block['close'], block['volume'])
+        if timeframes:
+            matrix = np.hstack([matrix, timeframe_feature_matrix(block, timeframes, interval)])
+        if previous_last is not None and carried:
+            matrix[:, carried] += previous_last[carried] - matrix[a - 1 - lo, carried]
+        previous_last = matrix[b - 1 - lo].copy()
+
+        rows = np.arange(a - lo, b - lo)
+        X = matrix[rows]
+        # Las etiquetas solo de [a, hi): el calentamiento no las necesita.
+        y = target_labels(block['high'][a - lo:], block['low'][a - lo:], block['close'][a - lo:], target)[rows - (a - lo)]
+        # Igual que dropna en prepare_training_data (calentamiento y velas finales sin objetivo conocido).
+        keep = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+        if not keep.any():
+            continue
+        name = f"shard_{len(shards):05d}"
+        np.save(os.path.join(directory, f"{name}_X.npy"), np.ascontiguousarray(X[keep], dtype=np.float32))
+        np.save(os.path.join(directory, f"{name}_y.npy"), y[keep].astype(np.float32))
+        shards.append({'name': name, 'rows': int(keep.sum()), 'first_ts': int(block['ts'][rows[keep][0]]),
+                       'last_ts': int(block['ts'][rows[keep][-1]])})
+
+    manifest = {
+        'symbol': symbol, 'interval': interval, 'features': features, 'timeframes': list(timeframes),
+        'target': target, 'label_gap': label_gap(target),
+        'spec': spec_hash(), 'warmup_bars': warmup, 'chunk_rows': chunk_rows, 'max_rss_mb': max_rss_mb,
+        'rows': sum(shard['rows'] for shard in shards), 'shards': shards,
+        'build_seconds': round(time.perf_counter() - start_time, 3), 'peak_rss_mb': _mb(_peak_rss_bytes()),
+    }
+    tmp_path = os.path.join(directory, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+    return manifest
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE), 'r') as f:
+        return json.load(f)
+
+
+class ShardIterator(xgb.DataIter):
+    """Entrega los shards a XGBoost uno a uno (mapeados en memoria, sin cargarlos todos)."""
+
+    def __init__(self, directory, shards, cache_prefix):
+        self.directory = directory
+        self.shards = shards
+        self._position = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def _load(self, shard, part):
+        # shard['rows'] puede ser menor que el archivo (filas purgadas al final, ver purge_tail).
+        return np.load(os.path.join(self.directory, f"{shard['name']}_{part}.npy"), mmap_mode='r')[:shard['rows']]
+
+    def next(self, input_data):
+        if self._position == len(self.shards):
+            return False
+        shard = self.shards[self._position]
+        input_data(data=self._load(shard, 'X'), label=self._load(shard, 'y'))
+        self._position += 1
+        return True
+
+    def reset(self):
+        self._position = 0
+
+
+def purge_tail(shards, rows):
+    """Copia de los shards sin sus últimas `rows` filas (hueco entre entrenamiento y validación)."""
+    shards = [dict(shard) for shard in shards]
+    while rows and shards:
+        cut = min(rows, shards[-1]['rows'])
+        shards[-1]['rows'] -= cut
+        rows -= cut
+        if shards[-1]['rows'] == 0:
+            shards.pop()
+    return shards
+
+
+def train_from_dataset(directory, params=None, holdout_shards=1, max_bin=MAX_BIN, nthread=None,
+                       max_rss_mb=MAX_RSS_MB):
+    """
+    Entrena un booster sobre los shards con memoria externa. Los últimos
+    `holdout_shards` shards (las velas más recientes) quedan fuera para validar y
+    las label_gap últimas filas de entrenamiento se purgan (sus etiquetas miran
+    las velas de validación).
+
+    Args:
+        max_rss_mb (float): presupuesto de memoria residente; si la estimación
+            (training_bytes) no cabe, ValueError antes de entrenar. None no lo comprueba.
+
+    Returns:
+        tuple: (booster, informe con filas, tiempos, precisión de validación y pico de memoria).
+    """
+    manifest = load_manifest(directory)
+    shards = manifest['shards']
+    if holdout_shards and len(shards) > holdout_shards:
+        train_shards, holdout = shards[:-holdout_shards], shards[-holdout_shards:]
+    else:
+        train_shards, holdout = shards, []
+    # Hueco antes de la validación (los manifiestos sin 'label_gap' son del objetivo 'next': sin hueco).
+    purge = manifest.get('label_gap', 0) if holdout else 0
+    train_shards = purge_tail(train_shards, purge)
+    if params is None:
+        meta = load_model_meta()
+        params = dict(meta['params'] if meta and meta['features'] == manifest['features'] else DEFAULT_PARAMS)
+    params = dict(params)
+    rounds = params.pop('n_estimators', DEFAULT_PARAMS['n_estimators'])
+    params.update({'objective': 'binary:logistic', 'eval_metric': 'logloss', 'tree_method': 'hist', 'seed': 42})
+    if nthread is not None:
+        params['nthread'] = nthread
+
+    train_rows = sum(shard['rows'] for shard in train_shards)
+    n_features = len(manifest['features'])
+    estimated = (_rss_bytes() or 0) + training_bytes(train_rows, n_features,
+                                                     max((shard['rows'] for shard in train_shards), default=0))
+    if max_rss_mb is not None and estimated > max_rss_mb * 2**20:
+        raise ValueError(f"Presupuesto de {max_rss_mb} MB insuficiente para entrenar {train_rows:,} filas "
+                         f"(estimado {_mb(estimated)} MB): acota el periodo del dataset (start).")
+
+    _reset_peak_rss()
+    remove_cache_pages(directory)
+    start = time.perf_counter()
+    iterator = ShardIterator(directory, train_shards, cache_prefix=os.path.join(directory, CACHE_PREFIX))
+    dtrain = xgb.ExtMemQuantileDMatrix(iterator, max_bin=max_bin)
+    setup_seconds = time.perf_counter() - start
+    booster = xgb.train(params, dtrain, num_boost_round=rounds)
+    train_seconds = time.perf_counter() - start - setup_seconds
+    del dtrain  # XGBoost borra sus páginas al liberar la matriz.
+    remove_cache_pages(directory)
+
+    correct = total = 0
+    for shard in holdout:
+        X, y = iterator._load(shard, 'X'), iterator._load(shard, 'y')
+        correct += int(((booster.inplace_predict(X) > 0.5) == (y > 0.5)).sum())
+        total += len(y)
+    return booster, {
+        'train_rows': train_rows,
+        'holdout_rows': total,
+        'purged_rows': purge,
+        'holdout_accuracy': round(correct / total, 4) if total else None,
+        'params': params,
+        'rounds': rounds,
+        'setup_seconds': round(setup_seconds, 3),
+        'train_seconds': round(train_seconds, 3),
+        'estimated_rss_mb': _mb(estimated),
+        'max_rss_mb': max_rss_mb,
+        'peak_rss_mb': _mb(_peak_rss_bytes()),
+    }
+
+
+# Este bloque permite ejecutar el script directamente para construir el dataset
+# desde el archivo local de velas (y opcionalmente entrenar sobre él).
+if __name__ == '__main__':
+    import sys
+
+    symbol = sys.argv[1] if len(sys.argv) > 1 else 'BTC-USD'
+    interval = sys.argv[2] if len(sys.argv) > 2 else '15m'
+    max_rss_mb = float(sys.argv[3]) if len(sys.argv) > 3 else MAX_RSS_MB
+    archive = CandleArchive(symbol, interval)
+    if len(archive) == 0:
+        print(f"❌ Error: No hay velas archivadas de {symbol} {interval}. Ejecuta 'candle_archive.py' primero.")
+        sys.exit(1)
+
+    print(f"--- Dataset fuera de memoria: {symbol} {interval} ({len(archive):,} velas, "
+          f"presupuesto {max_rss_mb:.0f} MB) ---")
+    manifest = build_dataset(symbol, interval, max_rss_mb=max_rss_mb)
+    print(f"✅ {manifest['rows']:,} filas en {len(manifest['shards'])} shards de hasta {manifest['chunk_rows']:,} velas "
+          f"| {manifest['build_seconds']:.1f} s | pico RSS {manifest['peak_rss_mb']} MB")
+
+    if 'entrenar' in sys.argv[4:]:
+        booster, report = train_from_dataset(dataset_path(symbol, interval), max_rss_mb=max_rss_mb)
+        model_path = os.path.join(dataset_path(symbol, interval), 'model.ubj')
+        booster.save_model(model_path)
+        print(f"✅ Entrenado con {report['train_rows']:,} filas ({report['rounds']} árboles) en "
+              f"{report['setup_seconds'] + report['train_seconds']:.1f} s "
+              f"(cuantización {report['setup_seconds']:.1f} s) | pico RSS {report['peak_rss_mb']} MB "
+              f"(estimado {report['estimated_rss_mb']} MB)")
+        if report['holdout_accuracy'] is not None:
+            print(f"🎯 Precisión en las {report['holdout_rows']:,} velas más recientes: {report['holdout_accuracy']:.4f}")
+        print(f"💾 Booster guardado en '{model_path}'.")
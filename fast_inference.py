@@ -0,0 +1,166 @@
+# fast_inference.py (Inferencia de Baja Latencia para una Sola Fila - Booster Nativo)
+#
+# El camino original (model.predict(df[FEATURES].tail(1))) pasaba por el
+# wrapper de sklearn: copia desde el DataFrame, valida nombres de columnas y
+# construye una DMatrix para UNA fila. Aquí se usa directamente el booster
+# nativo de XGBoost exportado por train_model.py (models/model.ubj, formato
+# UBJSON) con `inplace_predict` sobre una fila float32 contigua, sin pandas.
+#
+# Si aún no existe el artefacto nativo (o no se exportó desde el model.joblib
+# actual) se usa el modelo sklearn residente del registro, así que nunca se
+# predice con un booster desactualizado. La comprobación es por contenido:
+# al exportar se guarda junto al booster (models/model.ubj.source) el hash del
+# model.joblib de origen, así que un checkout, copia o rsync que deje un
+# model.ubj viejo con fecha más nueva no lo cuela.
+#
+# Modelos podados (feature_selection.py): RowPredictor.feature_names() devuelve
+# las features que usa el modelo residente, en el orden en que las espera.
+
+import logging
+import os
+import time
+
+import numpy as np
+
+from feature_engine import FEATURES, model_feature_names
+from feature_cache import file_hash
+from model_registry import MODEL_PATH, get_registry
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+BOOSTER_PATH = os.path.join(PROJECT_ROOT, "models", "model.ubj")
+# Sufijo del archivo con el hash del model.joblib del que se exportó el booster.
+SOURCE_SUFFIX = '.source'
+# Umbral de probabilidad para la clase 1 (el mismo que usa XGBClassifier.predict).
+THRESHOLD = 0.5
+
+
+def export_booster(model, path=BOOSTER_PATH, source_path=MODEL_PATH):
+    """
+    Guarda el booster nativo del modelo en UBJSON de forma atómica, junto con el
+    hash de `source_path` (el model.joblib ya guardado del mismo modelo).
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # XGBoost elige el formato por la extensión, así que el temporal también acaba en .ubj.
+    tmp_path = f"{path[:-4]}.{os.getpid()}.tmp.ubj"
+    model.get_booster().save_model(tmp_path)
+    os.replace(tmp_path, path)
+    # El hash se escribe DESPUÉS del booster: si algo falla entre medias, el hash
+    # antiguo no coincide y se usa el modelo sklearn, nunca un booster a medias.
+    source_file = path + SOURCE_SUFFIX
+    tmp_path = f"{source_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(f"{file_hash(source_path) or ''}\n")
+    os.replace(tmp_path, source_file)
+    return path
+
+
+def load_booster(path=BOOSTER_PATH):
+    """Carga un booster nativo configurado para predicciones de una fila (un solo hilo)."""
+    from xgboost import Booster
+    booster = Booster()
+    booster.load_model(path)
+    booster.set_param({'nthread': 1})
+    return booster
+
+
+def as_row(features):
+    """Convierte una fila de features (en el orden del modelo) a un array float32 (1, n) contiguo."""
+    return np.ascontiguousarray(np.asarray(features, dtype=np.float32).reshape(1, -1))
+
+
+class RowPredictor:
+    """Predictor de una fila: booster nativo si está al día; si no, el modelo sklearn residente."""
+
+    def __init__(self, booster_path=BOOSTER_PATH, model_path=MODEL_PATH):
+        self.booster_path = booster_path
+        self.model_path = model_path
+
+    def _booster_is_current(self):
+        """El booster se exportó desde el model.joblib actual (mismo hash de contenido)."""
+        try:
+            with open(self.booster_path + SOURCE_SUFFIX, 'r') as f:
+                source_hash = f.read().strip()
+        except OSError:
+            return False
+        if not os.path.exists(self.booster_path):
+            return False
+        model_hash = file_hash(self.model_path)
+        return model_hash is None or source_hash == model_hash
+
+    def _resident(self):
+        """Booster nativo residente si está al día; si no, el modelo sklearn residente."""
+        if self._booster_is_current():
+            return get_registry(self.booster_path, loader=load_booster).get()
+        return get_registry(self.model_path).get()
+
+    def feature_names(self, default=FEATURES):
+        """Features que espera el modelo residente, en su orden (las conservadas si está podado)."""
+        return model_feature_names(self._resident(), default)
+
+    def predict_proba(self, features):
+        """Probabilidad de la clase 1 (sube) para una fila de features."""
+        row = as_row(features)
+        model = self._resident()
+        if not hasattr(model, 'predict_proba'):
+            return float(model.inplace_predict(row, validate_features=False)[0])
+        return float(model.predict_proba(row.astype(np.float64))[0, 1])
+
+    def predict(self, features):
+        """Clase predicha (1 = sube, 0 = baja) y su probabilidad."""
+        probability = self.predict_proba(features)
+        return int(probability > THRESHOLD), probability
+
+
+_predictor = None
+
+
+def get_predictor():
+    global _predictor
+    if _predictor is None:
+        _predictor = RowPredictor()
+    return _predictor
+
+
+def _latencies(func, n_calls):
+    func()
+    out = np.empty(n_calls)
+    for i in range(n_calls):
+        start = time.perf_counter()
+        func()
+        out[i] = time.perf_counter() - start
+    return out * 1e6
+
+
+# Este bloque permite ejecutar el script directamente para comparar latencias
+# (p50/p99 en microsegundos) del camino original contra el booster nativo.
+if __name__ == '__main__':
+    import pandas as pd
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+    n_calls = 2000
+    model = get_registry(MODEL_PATH).get()
+    if not os.path.exists(BOOSTER_PATH) or not RowPredictor()._booster_is_current():
+        export_booster(model)
+        print(f"Booster nativo exportado a '{BOOSTER_PATH}'.")
+
+    rng = np.random.default_rng(0)
+    history = pd.DataFrame(rng.normal(size=(50, model.get_booster().num_features())),
+                           columns=model.get_booster().feature_names)
+    row = history.to_numpy()[-1]
+    predictor = get_predictor()
+    booster = load_booster()
+
+    paths = {
+        'sklearn + DataFrame.tail(1) (original)': lambda: model.predict(history.tail(1)),
+        'sklearn + array float64': lambda: model.predict(row.reshape(1, -1)),
+        'booster.inplace_predict float32': lambda: booster.inplace_predict(as_row(row), validate_features=False),
+        'RowPredictor.predict (con chequeo)': lambda: predictor.predict(row),
+    }
+    print(f"--- Latencia de inferencia de una fila ({n_calls} llamadas, µs) ---")
+    print(f"{'camino':>40} | {'p50':>8} | {'p99':>8}")
+    for name, func in paths.items():
+        latencies = _latencies(func, n_calls)
+        print(f"{name:>40} | {np.percentile(latencies, 50):8.1f} | {np.percentile(latencies, 99):8.1f}")
+
+    same = model.predict(row.reshape(1, -1))[0] == predictor.predict(row)[0]
+    print(f"Misma clase que el modelo sklearn: {'OK' if same else 'ERROR'}")
@@ -0,0 +1,157 @@
+# feature_cache.py (Caché en Disco de Features y Predicciones - Direccionada por Contenido)
+#
+# predict.py, predict_live.py y backtest.py recalculaban las mismas features para
+# ventanas solapadas, y el bot de papel y el bot real pedían la misma predicción
+# en el mismo hueco de 15 minutos. Esta caché guarda matrices de features y
+# predicciones en disco con una clave derivada de:
+#     (tipo, símbolo, intervalo, última vela, hash de FEATURE_SPEC, hash del modelo, extras)
+# de modo que procesos cron distintos reutilizan el resultado: una segunda llamada
+# dentro de la misma vela cuesta una lectura de archivo.
+#
+# El tamaño total está acotado (MAX_CACHE_BYTES) con desalojo LRU: cada lectura
+# actualiza el mtime del archivo y se eliminan primero los más antiguos.
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from feature_engine import FEATURE_SPEC
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', 'cache')
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Hash de archivos de modelo memorizado por (ruta, mtime, tamaño) para no releerlos en cada llamada.
+_file_hashes = {}
+
+
+def spec_hash(spec=FEATURE_SPEC):
+    """Hash estable de la especificación de indicadores."""
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def file_hash(path):
+    """Hash del contenido de un archivo (p. ej. el modelo). None si no existe."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    marker = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if marker not in _file_hashes:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_hashes[marker] = digest.hexdigest()[:16]
+    return _file_hashes[marker]
+
+
+def cache_key(kind, symbol, interval, last_ts, spec=FEATURE_SPEC, model_path=None, **extra):
+    """Clave de la caché: hash de todos los elementos que determinan el resultado."""
+    parts = {
+        'kind': kind, 'symbol': symbol, 'interval': interval, 'last_ts': int(last_ts),
+        'spec': spec_hash(spec), 'model': file_hash(model_path) if model_path else None,
+        'extra': {key: value for key, value in sorted(extra.items())},
+    }
+    return f"{kind}-{hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]}"
+
+
+def _entry_path(key, root=None):
+    return os.path.join(root or CACHE_DIR, f"{key}.npz")
+
+
+def get(key, root=None):
+    """Devuelve el dict de arrays guardado para `key`, o None si no está en la caché."""
+    path = _entry_path(key, root)
+    try:
+        with np.load(path) as data:
+            payload = {name: data[name] for name in data.files}
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)  # Marca de uso reciente para el LRU.
+    except OSError:
+        pass
+    return payload
+
+
+def put(key, arrays, root=None, max_bytes=MAX_CACHE_BYTES):
+    """Guarda un dict de arrays de forma atómica y aplica el límite de tamaño."""
+    directory = root or CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = _entry_path(key, root)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    evict(directory, max_bytes)
+
+
+def evict(directory=None, max_bytes=MAX_CACHE_BYTES):
+    """Elimina las entradas usadas hace más tiempo hasta quedar por debajo de `max_bytes`."""
+    directory = directory or CACHE_DIR
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        logging.info(f"🧹 [Caché] {removed} entrada(s) desalojada(s) (LRU).")
+    return removed
+
+
+def cached_feature_matrix(symbol, interval, ts, compute, spec=FEATURE_SPEC, root=None, columns=None):
+    """
+    Matriz de features de la ventana de velas `ts` (primera y última vela forman parte de la clave).
+
+    Args:
+        compute (callable): función sin argumentos que calcula la matriz si no está en caché.
+        columns (list opcional): columnas que devuelve `compute` (las del modelo); None = FEATURES.
+    """
+    if len(ts) == 0:
+        return compute()
+    extra = {'columns': list(columns)} if columns is not None else {}
+    key = cache_key('features', symbol, interval, ts[-1], spec, first_ts=int(ts[0]), rows=len(ts), **extra)
+    hit = get(key, root)
+    if hit is not None:
+        logging.info(f"⚡ [Caché] Features de {symbol} {interval} reutilizadas.")
+        return hit['matrix']
+    matrix = compute()
+    put(key, {'matrix': matrix}, root)
+    return matrix
+
+
+def cached_prediction(symbol, interval, last_ts, model_path, compute, spec=FEATURE_SPEC, root=None):
+    """
+    Predicción del modelo para la vela `last_ts`. Si otro proceso ya la calculó
+    para la misma vela, spec y modelo, se devuelve sin recalcular nada.
+
+    Args:
+        compute (callable): función sin argumentos que devuelve (predicción, fila de features).
+    """
+    key = cache_key('prediction', symbol, interval, last_ts, spec, model_path)
+    hit = get(key, root)
+    if hit is not None:
+        logging.info(f"⚡ [Caché] Predicción de {symbol} {interval} reutilizada.")
+        return int(hit['prediction'])
+    prediction, features = compute()
+    put(key, {'prediction': np.asarray(prediction), 'features': np.asarray(features)}, root)
+    return int(prediction)
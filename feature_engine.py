@@ -0,0 +1,310 @@
+# feature_engine.py (Motor de Features Vectorizado - Compartido por todo el proyecto)
+#
+# Única fuente de verdad para los indicadores técnicos del modelo de 15m.
+# train_model.py, predict.py, predict_live.py, backtest.py y scripts/scheduler.py
+# llaman a este módulo en lugar de repetir su propio código de pandas.
+# Todos los indicadores se calculan en una sola pasada de NumPy sobre arrays
+# float64 contiguos, sin cadenas de Series intermedias.
+#
+# Modo panel: si las entradas son 2D (tiempo × símbolo) todas las operaciones
+# trabajan a lo largo del eje 0, así que 50-200 pares se calculan en la misma
+# pasada y la última fila se puntúa con una sola llamada a model.predict.
+# Los símbolos que empiezan tarde en el panel (NaN antes de su primera vela) se
+# calculan desde su primera vela: sus filas son las mismas que calculados solos.
+#
+# Modelos podados: compute_feature_matrix(columns=...) calcula solo las features
+# que usa el modelo (model_feature_names), en su orden.
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+# --- ESPECIFICACIÓN DE INDICADORES (se define UNA sola vez) ---
+FEATURE_SPEC = {
+    'sma_short': 20,
+    'sma_long': 50,
+    'rsi_window': 14,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'stoch_rsi_window': 14,
+    'bb_window': 20,
+    'bb_std': 2.0,
+    'atr_window': 14,
+    'momentum_window': 14,
+}
+
+# El orden de las columnas es el que espera el modelo entrenado.
+FEATURES = [
+    'sma_20', 'sma_50', 'rsi', 'macd', 'macd_signal', 'macd_diff',
+    'stochrsi', 'obv', 'bb_width', 'atr', 'momentum', 'contexto_estrategia'
+]
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Tamaño de bloque para las sumas acumuladas de las ventanas móviles.
+_BLOCK_ROWS = 256
+
+
+def _column(df, name):
+    """Devuelve una columna como array float64 1D, aunque yfinance entregue columnas MultiIndex."""
+    return np.ascontiguousarray(np.asarray(df[name], dtype=np.float64).reshape(-1))
+
+
+def ohlcv_arrays(df):
+    """Extrae (high, low, close, volume) de un DataFrame de velas como arrays contiguos."""
+    return _column(df, 'High'), _column(df, 'Low'), _column(df, 'Close'), _column(df, 'Volume')
+
+
+def _shift(x, periods):
+    """Equivalente a Series.shift(periods) con NaN al inicio."""
+    out = np.empty_like(x)
+    out[:periods] = np.nan
+    out[periods:] = x[:-periods]
+    return out
+
+
+def _rolling_moments(x, window, block=_BLOCK_ROWS):
+    """
+    Media y desviación estándar móviles (ddof=1) en O(n).
+
+    Las sumas acumuladas se calculan por bloques, restando a cada bloque su propio
+    nivel de referencia, para que los precios de varios años (de cientos a cientos
+    de miles de dólares) no pierdan precisión en la resta de sumas.
+    """
+    n = len(x)
+    mean = np.full_like(x, np.nan)
+    std = np.full_like(x, np.nan)
+    if n < window:
+        return mean, std
+
+    # El tiempo va en el último eje (contiguo) también en modo panel.
+    xt = np.moveaxis(x, 0, -1)
+    n_blocks = -(-n // block)
+    padded = np.empty(xt.shape[:-1] + (n_blocks * block + window - 1,), dtype=np.float64)
+    padded[..., :window - 1] = xt[..., :1]
+    padded[..., window - 1:window - 1 + n] = xt
+    padded[..., window - 1 + n:] = xt[..., -1:]
+
+    segments = sliding_window_view(padded, block + window - 1, axis=-1)[..., ::block, :]
+    reference = segments[..., -1:]
+    deviations = segments - reference
+    csum = np.cumsum(deviations, axis=-1)
+    csum_sq = np.cumsum(deviations * deviations, axis=-1)
+    sums = csum[..., window - 1:].copy()
+    sums[..., 1:] -= csum[..., :-window]
+    sums_sq = csum_sq[..., window - 1:].copy()
+    sums_sq[..., 1:] -= csum_sq[..., :-window]
+
+    variance = np.maximum(sums_sq - sums * sums / window, 0.0) / (window - 1)
+    block_mean = sums / window + reference
+
+    def _unblock(values):
+        return np.moveaxis(values.reshape(xt.shape[:-1] + (n_blocks * block,))[..., :n], -1, 0)
+
+    mean[window - 1:] = _unblock(block_mean)[window - 1:]
+    std[window - 1:] = np.sqrt(_unblock(variance)[window - 1:])
+    return mean, std
+
+
+def _rolling_extreme(x, window, ufunc):
+    """
+    Mínimo/máximo móvil por duplicación de ventanas (log2(window) pasadas contiguas).
+    Propaga NaN igual que pandas con min_periods=window.
+    """
+    out = np.full_like(x, np.nan)
+    n = len(x)
+    if n < window:
+        return out
+    span = 1
+    acc = x
+    while span * 2 <= window:
+        acc = ufunc(acc[:-span], acc[span:])
+        span *= 2
+    # `acc[i]` cubre x[i : i + span]; combinamos dos ventanas solapadas para cubrir `window`.
+    rest = window - span
+    out[window - 1:] = ufunc(acc[:n - window + 1], acc[rest:rest + n - window + 1])
+    return out
+
+
+def _ewm(x, alpha):
+    """EWM con adjust=False (recursión y_t = a*x_t + (1-a)*y_{t-1}, y_0 = x_0)."""
+    decay = 1.0 - alpha
+    zi = decay * x[:1]
+    y, _ = lfilter([alpha], [1.0, -decay], x, axis=0, zi=zi)
+    return y
+
+
+def _ewm_adjusted(x, alpha, min_periods):
+    """EWM con adjust=True (promedio ponderado sobre toda la historia) y min_periods."""
+    decay = 1.0 - alpha
+    numerator = lfilter([1.0], [1.0, -decay], x, axis=0)
+    weights = lfilter([1.0], [1.0, -decay], np.ones(len(x)))
+    out = numerator / weights.reshape((-1,) + (1,) * (x.ndim - 1))
+    out[:min_periods - 1] = np.nan
+    return out
+
+
+def compute_feature_matrix(high, low, close, volume, spec=FEATURE_SPEC, columns=None):
+    """
+    Calcula todas las features de FEATURES en una sola pasada vectorizada.
+
+    Args:
+        high, low, close, volume: arrays float de igual forma (orden temporal ascendente).
+            1D (n_velas,) para un símbolo o 2D (n_velas, n_simbolos) para un panel.
+        spec (dict): parámetros de los indicadores (por defecto FEATURE_SPEC).
+        columns (list opcional): subconjunto de FEATURES a calcular, en el orden de
+            salida (p. ej. las features que conserva un modelo podado); los
+            indicadores que no se piden no se calculan.
+
+    Returns:
+        np.ndarray: matriz (n_velas, len(columns)) float64, o (n_velas, n_simbolos,
+        len(columns)) en modo panel (columns = FEATURES por defecto). Internamente
+        cada feature ocupa un bloque contiguo (la matriz es la traspuesta de un
+        buffer feature-major).
+        Las primeras filas contienen NaN mientras los indicadores se "calientan".
+    """
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    volume = np.ascontiguousarray(volume, dtype=np.float64)
+
+    columns = FEATURES if columns is None else list(columns)
+    unknown = [name for name in columns if name not in FEATURES]
+    if unknown:
+        raise ValueError(f"Features desconocidas para el motor: {unknown}")
+    slot = {name: i for i, name in enumerate(columns)}
+
+    def wanted(*names):
+        return any(name in slot for name in names)
+
+    if close.ndim == 2 and len(close):
+        # Panel con símbolos que empiezan tarde (NaN antes de su primera vela, candle_store.load_panel):
+        # las EWM y el OBV arrastrarían ese NaN para siempre, así que cada grupo de símbolos con la
+        # misma primera vela se calcula desde esa vela, igual que si se calculara solo.
+        valid = ~np.isnan(close)
+        first = np.where(valid.any(axis=0), np.argmax(valid, axis=0), len(close))
+        if first.any():
+            out = np.full(close.shape + (len(columns),), np.nan)
+            for start in np.unique(first[first < len(close)]):
+                group = np.flatnonzero(first == start)
+                out[start:, group] = compute_feature_matrix(high[start:, group], low[start:, group],
+                                                            close[start:, group], volume[start:, group],
+                                                            spec, columns)
+            return out
+
+    out = np.empty((len(columns),) + close.shape, dtype=np.float64)
+    if len(close) == 0:
+        return np.moveaxis(out, 0, -1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prev_close = _shift(close, 1)
+        delta = close - prev_close
+
+        # --- SMAs ---
+        if wanted('sma_20', 'bb_width'):
+            sma_short, std_short = _rolling_moments(close, spec['sma_short'])
+        if wanted('sma_20'):
+            out[slot['sma_20']] = sma_short
+        if wanted('sma_50'):
+            out[slot['sma_50']] = _rolling_moments(close, spec['sma_long'])[0]
+
+        # --- RSI (ewm com=window-1, adjust=True, min_periods=window) ---
+        if wanted('rsi', 'stochrsi'):
+            rsi_window = spec['rsi_window']
+            gain = np.fmax(delta, 0.0)
+            loss = np.fmax(-delta, 0.0)
+            avg_gain = _ewm_adjusted(gain, 1.0 / rsi_window, rsi_window)
+            avg_loss = _ewm_adjusted(loss, 1.0 / rsi_window, rsi_window)
+            rsi = 100 - (100 / (1 + (avg_gain / avg_loss)))
+            if wanted('rsi'):
+                out[slot['rsi']] = rsi
+
+        # --- MACD ---
+        if wanted('macd', 'macd_signal', 'macd_diff'):
+            ema_fast = _ewm(close, 2.0 / (spec['macd_fast'] + 1))
+            ema_slow = _ewm(close, 2.0 / (spec['macd_slow'] + 1))
+            macd = ema_fast - ema_slow
+            macd_signal = _ewm(macd, 2.0 / (spec['macd_signal'] + 1))
+            for name, values in (('macd', macd), ('macd_signal', macd_signal)):
+                if wanted(name):
+                    out[slot[name]] = values
+            if wanted('macd_diff'):
+                out[slot['macd_diff']] = macd - macd_signal
+
+        # --- Stochastic RSI ---
+        if wanted('stochrsi'):
+            stoch_window = spec['stoch_rsi_window']
+            min_rsi = _rolling_extreme(rsi, stoch_window, np.minimum)
+            max_rsi = _rolling_extreme(rsi, stoch_window, np.maximum)
+            out[slot['stochrsi']] = (rsi - min_rsi) / (max_rsi - min_rsi)
+
+        # --- On-Balance Volume (la primera vela cuenta como alcista, igual que pandas) ---
+        if wanted('obv'):
+            direction = np.where(delta <= 0, -1.0, 1.0)
+            out[slot['obv']] = np.cumsum(volume * direction, axis=0)
+
+        # --- Bollinger Bands Width ---
+        if wanted('bb_width'):
+            bb_window = spec['bb_window']
+            if bb_window == spec['sma_short']:
+                sma_bb, std_bb = sma_short, std_short
+            else:
+                sma_bb, std_bb = _rolling_moments(close, bb_window)
+            out[slot['bb_width']] = (2 * spec['bb_std'] * std_bb) / sma_bb
+
+        # --- Average True Range (ATR) ---
+        if wanted('atr'):
+            true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+            out[slot['atr']] = _ewm(true_range, 1.0 / spec['atr_window'])
+
+        # --- Momentum ---
+        if wanted('momentum'):
+            out[slot['momentum']] = close - _shift(close, spec['momentum_window'])
+
+        # --- Contexto Estrategia (placeholder constante) ---
+        if wanted('contexto_estrategia'):
+            out[slot['contexto_estrategia']] = 0.0
+
+    return np.moveaxis(out, 0, -1)
+
+
+def latest_feature_rows(high, low, close, volume, spec=FEATURE_SPEC, columns=None):
+    """
+    Features de la última vela de cada símbolo de un panel (n_velas, n_simbolos).
+
+    Returns:
+        tuple: (matriz (n_simbolos, len(columns)) lista para model.predict,
+        máscara booleana de los símbolos sin NaN).
+    """
+    rows = np.ascontiguousarray(compute_feature_matrix(high, low, close, volume, spec, columns)[-1])
+    return rows, ~np.isnan(rows).any(axis=-1)
+
+
+def build_feature_frame(df, spec=FEATURE_SPEC):
+    """
+    Devuelve un DataFrame plano (OHLCV + FEATURES) con el mismo índice que `df`.
+    Acepta tanto columnas simples como el MultiIndex que devuelve yfinance.
+    """
+    base = {col: _column(df, col) for col in OHLCV_COLUMNS if col in df.columns.get_level_values(0)}
+    matrix = compute_feature_matrix(base['High'], base['Low'], base['Close'], base['Volume'], spec)
+    frame = pd.DataFrame(base, index=df.index)
+    features = pd.DataFrame(matrix, index=df.index, columns=FEATURES)
+    return pd.concat([frame, features], axis=1)
+
+
+def model_feature_names(model, default=FEATURES):
+    """
+    Features que usa un modelo (XGBClassifier o Booster), en su orden de entrada.
+
+    Los modelos podados (feature_selection.py) guardan su lista de features en
+    el propio booster; los modelos sin nombres usan las primeras columnas de
+    `default`. Los modelos entrenados con el MultiIndex de yfinance guardaron
+    nombres con espacio final ('sma_20 '), que aquí se normalizan.
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    names = booster.feature_names
+    if names:
+        return [name.strip() for name in names]
+    return list(default)[:booster.num_features()]
@@ -0,0 +1,213 @@
+# feature_selection.py (Poda de Features por Importancia de Permutación)
+#
+# El modelo recibe todas las features de FEATURES (+ temporalidades superiores)
+# aunque algunas no aporten nada (contexto_estrategia es una constante 0), y
+# cada una se calcula en cada ciclo en vivo. Aquí se mide qué aporta cada
+# feature y se quitan las que no ayudan:
+#
+#   1. Con los hiperparámetros elegidos se entrena un booster por fold de
+#      TimeSeriesSplit (matrices cuantizadas compartidas de quantized_folds).
+#   2. Importancia de permutación: en la validación de cada fold se baraja UNA
+#      columna y se mide cuánto cae la precisión (N_REPEATS barajados). Las
+#      tareas (fold, feature) se reparten entre hilos con core_scheduler.
+#   3. Se quitan las features con caída media <= MIN_IMPORTANCE y se vuelve a
+#      validar con las restantes; la poda solo se acepta si la precisión de
+#      validación cruzada no cae más de MAX_ACCURACY_LOSS. Las features
+#      constantes se quitan siempre: ningún árbol puede usarlas.
+#
+# La lista de features conservadas viaja DENTRO del modelo (nombres del
+# booster en model.joblib / model.ubj / la versión del almacén), así que el
+# camino en vivo calcula solo esas columnas (feature_engine.model_feature_names).
+#
+# Uso (informe de importancias sobre los datos de train_model.py): python feature_selection.py [umbral]
+
+import time
+
+import numpy as np
+from sklearn.model_selection import TimeSeriesSplit
+
+from core_scheduler import choose_split, run_parallel
+from hyperparameter_search import QuantileGridSearch, quantized_folds
+
+# Caída media de precisión (accuracy) que debe provocar una feature al barajarla para conservarla.
+MIN_IMPORTANCE = 0.0005
+# Barajados por feature y fold.
+N_REPEATS = 3
+# Pérdida máxima de precisión de validación cruzada que se tolera al podar (ruido de los folds).
+MAX_ACCURACY_LOSS = 0.002
+RANDOM_STATE = 42
+
+
+def _train_params(params, nthread, random_state):
+    train_params = {key: value for key, value in params.items() if key != 'n_estimators'}
+    train_params.update({'objective': 'binary:logistic', 'eval_metric': 'logloss', 'tree_method': 'hist',
+                         'seed': random_state})
+    if nthread is not None:
+        train_params['nthread'] = nthread
+    return train_params
+
+
+def permutation_importance(X, y, params, n_splits=5, n_repeats=N_REPEATS, random_state=RANDOM_STATE,
+                           workers=None, nthread=None, gap=0):
+    """
+    Importancia de permutación de cada columna de X en la validación de cada fold temporal.
+
+    Args:
+        params (dict): hiperparámetros del modelo (best_params_ de la búsqueda).
+        workers, nthread: reparto de núcleos; None = el calibrado de core_scheduler.
+        gap (int): velas entre entrenamiento y validación de cada fold (quantized_folds).
+
+    Returns:
+        dict: 'importance' (caída media de precisión por columna), 'std' (entre folds),
+        'per_fold' (n_folds, n_columnas), 'fold_accuracy' (precisión sin barajar),
+        'workers', 'nthread' y 'seconds'.
+    """
+    import xgboost as xgb
+
+    start = time.perf_counter()
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    _, folds = quantized_folds(X, y, n_splits, gap=gap)
+    valid_rows = [valid for _, valid in TimeSeriesSplit(n_splits=n_splits, gap=gap).split(X)]
+    if workers is None and nthread is None:
+        search = QuantileGridSearch({key: [value] for key, value in params.items()}, n_splits, random_state, gap=gap)
+        workers, nthread = choose_split(search.calibration_fit(X, y, folds), len(X), X.shape[1])
+    workers = workers or 1
+
+    def fit(j):
+        return xgb.train(_train_params(params, nthread, random_state), folds[j]['train'],
+                         num_boost_round=params.get('n_estimators', 100))
+
+    boosters = run_parallel(fit, range(len(folds)), workers)
+    X_valid = [X[rows] for rows in valid_rows]
+
+    def accuracy(j, data):
+        return np.mean((boosters[j].inplace_predict(data) > 0.5) == folds[j]['y_valid'])
+
+    baseline = [accuracy(j, X_valid[j]) for j in range(len(folds))]
+
+    def score(task):
+        j, k = task
+        # Semilla por (fold, feature): el resultado no depende del orden de los hilos.
+        rng = np.random.default_rng([random_state, j, k])
+        shuffled = X_valid[j].copy()
+        drops = []
+        for _ in range(n_repeats):
+            shuffled[:, k] = X_valid[j][rng.permutation(len(shuffled)), k]
+            drops.append(baseline[j] - accuracy(j, shuffled))
+        return np.mean(drops)
+
+    tasks = [(j, k) for j in range(len(folds)) for k in range(X.shape[1])]
+    per_fold = np.array(run_parallel(score, tasks, workers)).reshape(len(folds), X.shape[1])
+    return {'importance': per_fold.mean(axis=0), 'std': per_fold.std(axis=0), 'per_fold': per_fold,
+            'fold_accuracy': np.array(baseline), 'workers': workers, 'nthread': nthread,
+            'seconds': time.perf_counter() - start}
+
+
+def select_features(features, importance, threshold=MIN_IMPORTANCE):
+    """Features con importancia > threshold, en su orden original (al menos la más importante)."""
+    kept = [name for name, value in zip(features, importance) if value > threshold]
+    return kept or [features[int(np.argmax(importance))]]
+
+
+def constant_features(X, features):
+    """Features sin ninguna variación en X (p. ej. contexto_estrategia): ningún árbol puede usarlas."""
+    X = np.asarray(X)
+    return [name for name, low, high in zip(features, np.nanmin(X, axis=0), np.nanmax(X, axis=0)) if low == high]
+
+
+def prune_features(X, y, features, params, threshold=MIN_IMPORTANCE, max_accuracy_loss=MAX_ACCURACY_LOSS,
+                   n_splits=5, random_state=RANDOM_STATE, workers=None, nthread=None, verbose=1, gap=0):
+    """
+    Mide la importancia de cada feature, quita las que no superan `threshold` y
+    valida el modelo reducido con los mismos folds e hiperparámetros. Las
+    features constantes se quitan siempre (no cambian el modelo).
+
+    Returns:
+        tuple: (modelo reducido reentrenado sobre todos los datos, o None si no se
+        quita nada; informe JSON con 'features' (las que usa el modelo final),
+        'dropped', 'constant', 'importance', 'cv_full', 'cv_pruned', 'accepted'
+        (si se aplicó la poda por importancia) y 'seconds').
+    """
+    start = time.perf_counter()
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    features = list(features)
+    result = permutation_importance(X, y, params, n_splits, random_state=random_state,
+                                    workers=workers, nthread=nthread, gap=gap)
+    constant = constant_features(X, features)
+    candidates = [name for name in features if name not in constant]
+    kept = select_features(candidates, [result['importance'][features.index(name)] for name in candidates],
+                           threshold)
+    report = {
+        'threshold': threshold,
+        'importance': {name: round(float(value), 5) for name, value in zip(features, result['importance'])},
+        'constant': constant,
+        'cv_full': round(float(result['fold_accuracy'].mean()), 4),
+        'cv_pruned': None,
+        'accepted': False,
+    }
+    if verbose:
+        ranked = sorted(report['importance'].items(), key=lambda item: -item[1])
+        print(f"  Importancia de permutación ({len(features)} features x {n_splits} folds, "
+              f"{result['workers']} en paralelo, {result['seconds']:.1f} s): "
+              + ", ".join(f"{name}={value:+.4f}" for name, value in ranked))
+
+    def refit(names):
+        search = QuantileGridSearch({key: [value] for key, value in params.items()}, n_splits, random_state,
+                                    nthread=result['nthread'], n_workers=result['workers'], verbose=0, gap=gap)
+        return search.fit(X[:, [features.index(name) for name in names]], y)
+
+    search, final = None, features
+    if kept != candidates:
+        search = refit(kept)
+        report['accepted'] = search.best_score_ >= result['fold_accuracy'].mean() - max_accuracy_loss
+        if verbose:
+            dropped = [name for name in candidates if name not in kept]
+            verdict = "✅ se aplica" if report['accepted'] else "⚠️ se descarta (empeora la validación)"
+            print(f"  Poda por importancia de {len(dropped)} features ({', '.join(dropped)}): "
+                  f"CV {report['cv_full']:.4f} -> {search.best_score_:.4f} | {verdict}")
+        final = kept if report['accepted'] else features
+    if final is features and constant:
+        search, final = refit(candidates), candidates
+        if verbose:
+            print(f"  Features constantes quitadas: {', '.join(constant)}.")
+    elif final is features and verbose:
+        print("  Ninguna feature por debajo del umbral: no se poda nada.")
+
+    report['features'] = final
+    report['dropped'] = [name for name in features if name not in final]
+    report['cv_pruned'] = round(search.best_score_, 4) if final is not features else None
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    return (search.best_estimator_ if final is not features else None), report
+
+
+# Este bloque permite ejecutar el script directamente para ver la importancia
+# de cada feature con los mejores parámetros guardados, y el coste de calcular
+# en vivo la matriz completa frente a solo las features conservadas.
+if __name__ == '__main__':
+    import sys
+    from candle_archive import load_period
+    from feature_engine import FEATURES, compute_feature_matrix, ohlcv_arrays
+    from train_model import (INTERVALO_VELAS, N_SPLITS, PARAM_GRID, PERIODO_DATOS, TARGET, TICKER, label_gap,
+                             prepare_training_data)
+
+    threshold = float(sys.argv[1]) if len(sys.argv) > 1 else MIN_IMPORTANCE
+    raw = load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS)
+    data, features = prepare_training_data(raw)
+    params = {key: values[0] for key, values in PARAM_GRID.items()}
+    print(f"--- Poda de features ({len(data)} filas, umbral {threshold}, parámetros {params}) ---")
+    model, report = prune_features(data[features].to_numpy(), data['target'].to_numpy(), features, params,
+                                   threshold, n_splits=N_SPLITS, gap=label_gap(TARGET))
+    print(f"Features del modelo: {len(report['features'])}/{len(features)} -> {report['features']}")
+
+    arrays = ohlcv_arrays(raw)
+    base = [name for name in report['features'] if name in FEATURES]
+    for label, columns in (('todas', None), (f'conservadas ({len(base)})', base)):
+        samples = []
+        for _ in range(20):
+            start = time.perf_counter()
+            compute_feature_matrix(*arrays, columns=columns)
+            samples.append(time.perf_counter() - start)
+        best = min(samples)
+        print(f"compute_feature_matrix {label:>16}: {best * 1e3:7.2f} ms")
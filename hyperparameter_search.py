@@ -0,0 +1,411 @@
+# hyperparameter_search.py (Búsqueda de Hiperparámetros: Successive Halving + Early Stopping)
+#
+# train_model.py ejecutaba un GridSearchCV completo (16 configuraciones x 5 folds
+# de TimeSeriesSplit) sin parar nunca antes. HalvingSearch reparte un
+# presupuesto de rondas de boosting entre muchas más configuraciones:
+#
+#   1. Todas las configuraciones entrenan MIN_ROUNDS rondas en cada fold, con
+#      early stopping sobre la parte de validación del fold.
+#   2. Solo el mejor 1/ETA (precisión media de validación) pasa a la siguiente
+#      ronda, con ETA veces más rondas; cada superviviente CONTINÚA su booster
+#      (xgb_model=...) en lugar de volver a empezar.
+#   3. Se repite hasta MAX_ROUNDS o hasta agotar el presupuesto de tiempo
+#      (time_budget, en segundos); gana la mejor configuración de la ronda más alta.
+#
+# El modelo final se reentrena sobre todos los datos con el número de árboles
+# que eligió el early stopping (como el refit de GridSearchCV).
+#
+# Datos cuantizados compartidos: GridSearchCV reconstruía la DMatrix y los
+# cortes de los histogramas en cada configuración x fold. quantized_folds calcula
+# los cortes UNA vez sobre la matriz completa (QuantileDMatrix) y construye una
+# vez la matriz de entrenamiento y validación de cada fold con esos cortes
+# (ref=...); todas las configuraciones reutilizan las mismas matrices.
+# QuantileGridSearch es la rejilla de train_model.py sobre esas matrices.
+#
+# Uso (comparación con la rejilla actual): python hyperparameter_search.py [presupuesto_s] [completo]
+
+import itertools
+import logging
+import math
+import time
+
+import numpy as np
+from sklearn.model_selection import TimeSeriesSplit
+
+from core_scheduler import choose_split, run_parallel
+from model_registry import _rss_bytes
+
+# Espacio de búsqueda ~16x mayor que PARAM_GRID de train_model.py; n_estimators lo decide el early stopping.
+SEARCH_SPACE = {
+    'max_depth': [3, 4, 5, 6],
+    'learning_rate': [0.03, 0.05, 0.1, 0.2],
+    'subsample': [0.7, 0.8, 0.9, 1.0],
+    'colsample_bytree': [0.7, 1.0],
+    'min_child_weight': [1, 5],
+}
+MIN_ROUNDS = 25
+MAX_ROUNDS = 400
+ETA = 3
+EARLY_STOPPING_ROUNDS = 20
+TIME_BUDGET_SECONDS = 300.0
+MAX_BIN = 256
+# Rondas de los ajustes cortos con los que se calibra el reparto de núcleos.
+CALIBRATION_ROUNDS = 20
+
+
+def param_combinations(space):
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*space.values())]
+
+
+def _reset_peak_rss():
+    """Reinicia el pico de memoria del proceso (Linux) para medir cada fase por separado."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_bytes():
+    """Pico de memoria residente del proceso desde el último _reset_peak_rss (Linux: ru_maxrss en KB)."""
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def _children_peak_rss_bytes():
+    """Mayor pico de memoria entre los procesos hijos ya terminados (p. ej. los workers de joblib)."""
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def measure_fit(fit):
+    """
+    Ejecuta `fit()` con el mismo criterio de tiempo y memoria que resource_report
+    (pico reiniciado antes de empezar). Devuelve (resultado, informe).
+    """
+    _reset_peak_rss()
+    start = time.perf_counter()
+    rss_before = _rss_bytes()
+    result = fit()
+    return result, resource_report(start, rss_before, 0.0)
+
+
+def resource_report(start, rss_before, setup_seconds):
+    """Tiempos y memoria de una búsqueda (para el registro de entrenamiento)."""
+    rss_after = _rss_bytes()
+    peak = _peak_rss_bytes()
+    to_mb = lambda value: round(value / 2**20, 1) if value is not None else None
+    return {
+        'setup_seconds': round(setup_seconds, 3),
+        'search_seconds': round(time.perf_counter() - start, 3),
+        'rss_before_mb': to_mb(rss_before),
+        'rss_after_mb': to_mb(rss_after),
+        'peak_rss_mb': to_mb(peak),
+    }
+
+
+def quantized_folds(X, y, n_splits=5, max_bin=MAX_BIN, gap=0):
+    """
+    Cuantiza los datos una sola vez para toda la búsqueda.
+
+    Args:
+        gap (int): velas que se dejan fuera entre el entrenamiento y la validación de
+            cada fold (las que mira adelante la variable objetivo; ver labeling.py).
+
+    Returns:
+        tuple: (QuantileDMatrix completa, lista de folds {'train', 'valid', 'y_valid'})
+        con los cortes de histograma de la matriz completa.
+    """
+    import xgboost as xgb
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    full = xgb.QuantileDMatrix(X, label=y, max_bin=max_bin)
+    folds = []
+    for train, valid in TimeSeriesSplit(n_splits=n_splits, gap=gap).split(X):
+        # XGBoost exige que la validación referencie a SU matriz de entrenamiento;
+        # esta ya lleva los cortes de la completa, así que todos comparten cortes.
+        train_matrix = xgb.QuantileDMatrix(X[train], label=y[train], ref=full, max_bin=max_bin)
+        folds.append({'train': train_matrix,
+                      'valid': xgb.QuantileDMatrix(X[valid], label=y[valid], ref=train_matrix, max_bin=max_bin),
+                      'y_valid': y[valid]})
+    return full, folds
+
+
+def round_schedule(min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, eta=ETA):
+    """Rondas de boosting acumuladas de cada escalón: 25, 75, 225, 400..."""
+    schedule = [min_rounds]
+    while schedule[-1] < max_rounds:
+        schedule.append(min(schedule[-1] * eta, max_rounds))
+    return schedule
+
+
+class HalvingSearch:
+    """
+    Búsqueda por successive halving con la misma interfaz que usa train_model de
+    GridSearchCV: fit(X, y) y los atributos best_estimator_, best_params_ y best_score_.
+    """
+
+    def __init__(self, param_space=SEARCH_SPACE, n_splits=5, time_budget=TIME_BUDGET_SECONDS,
+                 min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, eta=ETA,
+                 early_stopping_rounds=EARLY_STOPPING_ROUNDS, random_state=42, nthread=None, verbose=1, gap=0):
+        self.param_space = param_space
+        self.n_splits = n_splits
+        self.gap = gap
+        self.time_budget = time_budget
+        self.schedule = round_schedule(min_rounds, max_rounds, eta)
+        self.eta = eta
+        self.early_stopping_rounds = early_stopping_rounds
+        self.random_state = random_state
+        self.nthread = nthread
+        self.verbose = verbose
+
+    def _native_params(self, config):
+        params = {'objective': 'binary:logistic', 'eval_metric': ['error', 'logloss'],
+                  'tree_method': 'hist', 'seed': self.random_state, **config}
+        if self.nthread is not None:
+            params['nthread'] = self.nthread
+        return params
+
+    def _advance(self, state, config, fold, target_rounds):
+        """Continúa el booster de (config, fold) hasta `target_rounds` rondas o hasta el early stopping."""
+        import xgboost as xgb
+        if state['stopped'] or state['rounds'] >= target_rounds:
+            return
+        history = {}
+        state['booster'] = xgb.train(
+            self._native_params(config), fold['train'], num_boost_round=target_rounds - state['rounds'],
+            evals=[(fold['valid'], 'valid')], early_stopping_rounds=self.early_stopping_rounds,
+            evals_result=history, verbose_eval=False, xgb_model=state['booster'])
+        state['error'].extend(history['valid']['error'])
+        state['logloss'].extend(history['valid']['logloss'])
+        state['rounds'] = len(state['logloss'])
+        best = int(np.argmin(state['logloss']))
+        state['best_iteration'] = best
+        state['stopped'] = state['rounds'] - 1 - best >= self.early_stopping_rounds
+
+    def _score(self, states):
+        """Precisión media de validación en la mejor iteración de cada fold (desempate: logloss)."""
+        accuracy = np.mean([1.0 - s['error'][s['best_iteration']] for s in states])
+        logloss = np.mean([s['logloss'][s['best_iteration']] for s in states])
+        return accuracy, -logloss
+
+    def fit(self, X, y):
+        from xgboost import XGBClassifier
+
+        # El pico del informe es el de la búsqueda, no el de la carga de datos previa.
+        _reset_peak_rss()
+        start = time.perf_counter()
+        rss_before = _rss_bytes()
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y)
+        _, folds = quantized_folds(X, y, self.n_splits, gap=self.gap)
+        setup_seconds = time.perf_counter() - start
+        # El presupuesto cuenta desde aquí: la cuantización no debe consumir la búsqueda.
+        search_start = time.perf_counter()
+        configs = param_combinations(self.param_space)
+        states = {i: [{'booster': None, 'rounds': 0, 'error': [], 'logloss': [], 'best_iteration': 0,
+                       'stopped': False} for _ in folds] for i in range(len(configs))}
+        alive = list(range(len(configs)))
+        scores = {}
+        self.history_ = []
+        timed_out = False
+
+        for rung, target_rounds in enumerate(self.schedule):
+            rung_scores = {}
+            for i in alive:
+                # Siempre se puntúa al menos una configuración antes de mirar el reloj.
+                if (rung_scores or scores) and time.perf_counter() - search_start > self.time_budget:
+                    timed_out = True
+                    break
+                for fold, state in zip(folds, states[i]):
+                    self._advance(state, configs[i], fold, target_rounds)
+                rung_scores[i] = self._score(states[i])
+            if rung_scores:
+                scores = rung_scores
+            if not scores:
+                raise ValueError("La búsqueda no puntuó ninguna configuración: revisa el espacio de parámetros.")
+            ranked = sorted(scores, key=scores.get, reverse=True)
+            best_accuracy = scores[ranked[0]][0]
+            self.history_.append({'rung': rung, 'rounds': target_rounds, 'evaluated': len(rung_scores),
+                                  'best_accuracy': best_accuracy, 'elapsed': time.perf_counter() - start})
+            if self.verbose:
+                print(f"  Escalón {rung}: {len(rung_scores)} configuraciones x {target_rounds} rondas | "
+                      f"mejor precisión {best_accuracy:.4f} | {time.perf_counter() - start:.1f} s")
+            if timed_out:
+                logging.warning(f"⏱️ Presupuesto de {self.time_budget:.0f} s agotado en el escalón {rung}.")
+                break
+            alive = ranked[:max(1, math.ceil(len(ranked) / self.eta))]
+
+        best = max(scores, key=scores.get)
+        n_estimators = max(1, int(round(np.mean([s['best_iteration'] + 1 for s in states[best]]))))
+        self.best_params_ = {**configs[best], 'n_estimators': n_estimators}
+        self.best_score_ = float(scores[best][0])
+        self.best_estimator_ = XGBClassifier(objective='binary:logistic', eval_metric='logloss', tree_method='hist',
+                                             random_state=self.random_state, n_jobs=self.nthread,
+                                             **self.best_params_)
+        self.best_estimator_.fit(X, y)
+        self.search_seconds_ = time.perf_counter() - start
+        self.timings_ = resource_report(start, rss_before, setup_seconds)
+        return self
+
+
+class QuantileGridSearch:
+    """
+    Rejilla completa (como GridSearchCV con TimeSeriesSplit y scoring='accuracy')
+    sobre las matrices cuantizadas compartidas de quantized_folds.
+
+    Los núcleos se reparten entre `n_workers` ajustes en paralelo (hilos que
+    comparten las matrices) y `nthread` hilos de XGBoost por ajuste. Si no se
+    indica ninguno, el reparto lo elige core_scheduler.choose_split; con solo
+    `nthread`, los ajustes van de uno en uno.
+    """
+
+    def __init__(self, param_grid, n_splits=5, random_state=42, nthread=None, n_workers=None, verbose=1, gap=0):
+        self.param_grid = param_grid
+        self.n_splits = n_splits
+        self.gap = gap
+        self.random_state = random_state
+        self.nthread = nthread
+        self.n_workers = n_workers
+        self.verbose = verbose
+
+    def _params(self, config, nthread):
+        params = {key: value for key, value in config.items() if key != 'n_estimators'}
+        params.update({'objective': 'binary:logistic', 'eval_metric': 'logloss', 'tree_method': 'hist',
+                       'seed': self.random_state})
+        if nthread is not None:
+            params['nthread'] = nthread
+        return params
+
+    def _fold_fit(self, configs, folds, nthread):
+        """Función de un ajuste (configuración i, fold j) -> precisión en la validación del fold."""
+        import xgboost as xgb
+
+        def fit(task):
+            i, j = task
+            booster = xgb.train(self._params(configs[i], nthread), folds[j]['train'],
+                                num_boost_round=configs[i].get('n_estimators', 100))
+            return np.mean((booster.predict(folds[j]['valid']) > 0.5) == folds[j]['y_valid'])
+        return fit
+
+    def calibration_fit(self, X, y, folds=None):
+        """make_fit para core_scheduler: ajustes cortos de la primera configuración sobre el fold más grande."""
+        if folds is None:
+            _, folds = quantized_folds(np.asarray(X, dtype=np.float32), np.asarray(y), self.n_splits, gap=self.gap)
+        config = dict(param_combinations(self.param_grid)[0], n_estimators=CALIBRATION_ROUNDS)
+
+        def make_fit(nthread):
+            fit = self._fold_fit([config], folds[-1:], nthread)
+            return lambda task: fit((0, 0))
+        return make_fit
+
+    def fit(self, X, y):
+        from xgboost import XGBClassifier
+
+        # El pico del informe es el de la búsqueda, no el de la carga de datos previa.
+        _reset_peak_rss()
+        start = time.perf_counter()
+        rss_before = _rss_bytes()
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y)
+        _, folds = quantized_folds(X, y, self.n_splits, gap=self.gap)
+        setup_seconds = time.perf_counter() - start
+
+        workers, nthread = self.n_workers, self.nthread
+        if workers is None and nthread is None:
+            workers, nthread = choose_split(self.calibration_fit(X, y, folds), len(X), X.shape[1],
+                                            verbose=self.verbose)
+        workers = workers or 1
+        configs = param_combinations(self.param_grid)
+        tasks = [(i, j) for i in range(len(configs)) for j in range(len(folds))]
+        scores = np.array(run_parallel(self._fold_fit(configs, folds, nthread), tasks, workers))
+        scores = scores.reshape(len(configs), len(folds))
+        if self.verbose:
+            print(f"  {len(configs)} configuraciones x {len(folds)} folds = {scores.size} ajustes, "
+                  f"{workers} en paralelo x {nthread or 'todos los'} hilos "
+                  f"(cuantización compartida: {setup_seconds * 1e3:.0f} ms)")
+
+        mean_scores = scores.mean(axis=1)
+        best = int(np.argmax(mean_scores))  # Empates: la primera, como GridSearchCV.
+        self.cv_results_ = {'params': configs, 'mean_test_score': mean_scores, 'split_scores': scores}
+        self.best_params_ = configs[best]
+        self.best_score_ = float(mean_scores[best])
+        # El reajuste final es un solo modelo: usa todos los núcleos del reparto.
+        self.best_estimator_ = XGBClassifier(objective='binary:logistic', eval_metric='logloss',
+                                             random_state=self.random_state,
+                                             n_jobs=workers * nthread if nthread else None, **self.best_params_)
+        self.best_estimator_.fit(X, y)
+        self.timings_ = dict(resource_report(start, rss_before, setup_seconds), workers=workers, nthread=nthread)
+        return self
+
+
+# Este bloque permite ejecutar el script directamente para comparar con la
+# rejilla actual de train_model.py: GridSearchCV de sklearn frente a la rejilla
+# cuantizada, y successive halving sobre el espacio nuevo (tiempo, memoria
+# residente antes/después/pico y precisión de validación cruzada con
+# n_estimators fijo, la misma medida para todas).
+if __name__ == '__main__':
+    import sys
+    from joblib.externals.loky import get_reusable_executor
+    from sklearn.model_selection import GridSearchCV, cross_val_score
+    from xgboost import XGBClassifier
+    from candle_archive import load_period
+    from train_model import (INTERVALO_VELAS, N_SPLITS, PARAM_GRID, PERIODO_DATOS, TARGET, TICKER, fit_model,
+                             label_gap, prepare_training_data)
+
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else TIME_BUDGET_SECONDS
+    data, features = prepare_training_data(load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS))
+    X, y = data[features].to_numpy(), data['target'].to_numpy()
+    gap = label_gap(TARGET)
+    tscv = TimeSeriesSplit(n_splits=N_SPLITS, gap=gap)
+
+    def cv_accuracy(params):
+        model = XGBClassifier(objective='binary:logistic', eval_metric='logloss', random_state=42, **params)
+        return cross_val_score(model, X, y, cv=tscv, scoring='accuracy').mean()
+
+    def sklearn_search(param_grid):
+        """GridSearchCV como el train_model.py original, medido igual que las búsquedas nuevas."""
+        def fit():
+            search = GridSearchCV(XGBClassifier(objective='binary:logistic', eval_metric='logloss', random_state=42),
+                                  param_grid, cv=tscv, scoring='accuracy', n_jobs=-1).fit(X, y)
+            # Se cierran los workers de joblib (procesos loky) para que su pico cuente en RUSAGE_CHILDREN.
+            get_reusable_executor().shutdown(wait=True)
+            return search
+        children_before = _children_peak_rss_bytes() or 0
+        search, report = measure_fit(fit)
+        # Solo si algún worker superó el pico de los hijos anteriores (con un núcleo joblib no lanza ninguno).
+        peak = _children_peak_rss_bytes() or 0
+        report['workers_peak_rss_mb'] = round(peak / 2**20, 1) if peak > children_before else None
+        return search, report
+
+    def print_row(name, report, score, params):
+        mb = [report.get(key) for key in ('rss_before_mb', 'rss_after_mb', 'peak_rss_mb', 'workers_peak_rss_mb')]
+        mb = ['-' if value is None else f"{value:.1f}" for value in mb]
+        print(f"{name:<40} {report['search_seconds']:7.1f} {mb[0]:>10} {mb[1]:>9} {mb[2]:>9} {mb[3]:>13} | "
+              f"CV {score:.4f} | {params}")
+
+    print(f"--- {len(X)} filas | rejilla actual: {len(param_combinations(PARAM_GRID))} configuraciones | "
+          f"espacio nuevo: {len(param_combinations(SEARCH_SPACE))} configuraciones x hasta {MAX_ROUNDS} árboles ---")
+    sklearn_grid, sklearn_report = sklearn_search(PARAM_GRID)
+    grid = fit_model(X, y, verbose=0, gap=gap)
+    search = HalvingSearch(time_budget=budget, verbose=1, gap=gap).fit(X, y)
+
+    print(f"{'Búsqueda':<40} {'s':>7} {'RSS antes':>10} {'después':>9} {'pico':>9} {'pico workers':>13} | (MB)")
+    print_row("GridSearchCV sklearn (rejilla actual)", sklearn_report, sklearn_grid.best_score_,
+              sklearn_grid.best_params_)
+    print_row("Rejilla cuantizada (rejilla actual)", grid.timings_, grid.best_score_, grid.best_params_)
+    # HalvingSearch: CV con n_estimators fijo, la misma medida que las rejillas.
+    print_row("HalvingSearch (espacio nuevo)", search.timings_, cv_accuracy(search.best_params_), search.best_params_)
+
+    if 'completo' in sys.argv[2:]:
+        exhaustive_grid = {**{key: values for key, values in SEARCH_SPACE.items()}, 'n_estimators': [100, 200, 400]}
+        exhaustive, exhaustive_report = sklearn_search(exhaustive_grid)
+        print_row("GridSearchCV (espacio nuevo completo)", exhaustive_report, exhaustive.best_score_,
+                  exhaustive.best_params_)
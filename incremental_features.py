@@ -0,0 +1,283 @@
+# incremental_features.py (Estado Incremental de Indicadores - O(1) por vela)
+#
+# Modo con estado del motor de features: en lugar de recalcular 7 días de
+# indicadores en cada ciclo de 15 minutos, se guarda el estado mínimo de cada
+# indicador (sumas móviles, estados EWM, OBV acumulado, deques monótonos del
+# stochRSI) y cada vela cerrada nueva lo actualiza en tiempo constante.
+# El resultado coincide con feature_engine.compute_feature_matrix dentro de
+# una tolerancia numérica.
+#
+# El OBV es una suma acumulada desde la primera vela del estado: quien conozca
+# la ventana de entrenamiento debe re-anclarlo con anchor_obv (predict_live.py lo
+# hace en cada ciclo con la suma sobre PERIODO_DATOS).
+
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+
+from feature_engine import FEATURE_SPEC, FEATURES
+
+STATE_VERSION = 1
+# Cada cuántas velas se recalculan las sumas móviles desde la ventana para
+# eliminar la deriva de punto flotante (coste amortizado O(1)).
+RESYNC_EVERY = 512
+
+
+class IncrementalFeatures:
+    """
+    Mantiene el estado de todos los indicadores de FEATURES y lo actualiza
+    vela a vela. Se puede persistir en JSON entre ejecuciones del bot.
+    """
+
+    def __init__(self, spec=FEATURE_SPEC):
+        self.spec = dict(spec)
+        self.count = 0
+        self.last_timestamp = None
+        self.prev_close = None
+        # Se guarda una vela extra para conocer el valor que sale de cada ventana.
+        window = max(spec['sma_long'], spec['bb_window'], spec['momentum_window']) + 1
+        self.closes = deque(maxlen=window)
+        # Sumas móviles (SMA corta/larga) y media/M2 de Welford para Bollinger.
+        self.sum_short = 0.0
+        self.sum_long = 0.0
+        self.bb_mean = 0.0
+        self.bb_m2 = 0.0
+        # Estados EWM.
+        self.gain_num = 0.0
+        self.loss_num = 0.0
+        self.ewm_weight = 0.0
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_signal = None
+        self.atr = None
+        self.obv = 0.0
+        # Deques monótonos (índice, rsi) para el mínimo/máximo del stochRSI.
+        self.rsi_min = deque()
+        self.rsi_max = deque()
+        self.last_nan_rsi = -1
+        self.features = np.full(len(FEATURES), np.nan)
+
+    # --- Actualización ---
+    def update(self, high, low, close, volume, timestamp=None):
+        """Incorpora una vela CERRADA y devuelve la fila de features actualizada."""
+        spec = self.spec
+        high, low, close, volume = float(high), float(low), float(close), float(volume)
+        idx = self.count
+        prev_close = self.prev_close
+
+        # --- Ventana de cierres y sumas móviles ---
+        short_w, long_w, bb_w = spec['sma_short'], spec['sma_long'], spec['bb_window']
+        closes = self.closes
+        closes.append(close)
+        n = len(closes)
+        self.sum_short += close - (closes[-short_w - 1] if n > short_w else 0.0)
+        self.sum_long += close - (closes[-long_w - 1] if n > long_w else 0.0)
+        self._update_bollinger(close, closes[-bb_w - 1] if n > bb_w else None, min(n, bb_w))
+        if (idx + 1) % RESYNC_EVERY == 0:
+            self._resync()
+
+        # --- RSI (ewm adjust=True) ---
+        alpha = 1.0 / spec['rsi_window']
+        decay = 1.0 - alpha
+        delta = close - prev_close if prev_close is not None else math.nan
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self.gain_num = gain + decay * self.gain_num
+        self.loss_num = loss + decay * self.loss_num
+        self.ewm_weight = 1.0 + decay * self.ewm_weight
+        rsi = math.nan
+        if idx + 1 >= spec['rsi_window']:
+            avg_gain = self.gain_num / self.ewm_weight
+            avg_loss = self.loss_num / self.ewm_weight
+            rsi = _safe_rsi(avg_gain, avg_loss)
+
+        # --- MACD (ewm adjust=False) ---
+        self.ema_fast = _ewm_step(self.ema_fast, close, 2.0 / (spec['macd_fast'] + 1))
+        self.ema_slow = _ewm_step(self.ema_slow, close, 2.0 / (spec['macd_slow'] + 1))
+        macd = self.ema_fast - self.ema_slow
+        self.macd_signal = _ewm_step(self.macd_signal, macd, 2.0 / (spec['macd_signal'] + 1))
+
+        # --- Stochastic RSI ---
+        stochrsi = self._update_stochrsi(idx, rsi)
+
+        # --- OBV (la primera vela cuenta como alcista, igual que en batch) ---
+        self.obv += -volume if delta <= 0 else volume
+
+        # --- ATR ---
+        if prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        self.atr = _ewm_step(self.atr, true_range, 1.0 / spec['atr_window'])
+
+        # --- Fila de features ---
+        sma_short = self.sum_short / short_w if n >= short_w else math.nan
+        sma_long = self.sum_long / long_w if n >= long_w else math.nan
+        if n >= bb_w:
+            std_bb = math.sqrt(max(self.bb_m2, 0.0) / (bb_w - 1))
+            bb_width = _safe_div(2 * spec['bb_std'] * std_bb, self.bb_mean)
+        else:
+            bb_width = math.nan
+        momentum_w = spec['momentum_window']
+        momentum = close - closes[-momentum_w - 1] if n > momentum_w else math.nan
+
+        self.features = np.array([
+            sma_short, sma_long, rsi, macd, self.macd_signal, macd - self.macd_signal,
+            stochrsi, self.obv, bb_width, self.atr, momentum, 0.0,
+        ])
+        self.prev_close = close
+        self.count = idx + 1
+        if timestamp is not None:
+            self.last_timestamp = int(timestamp)
+        return self.features
+
+    def _update_bollinger(self, new, old, size):
+        """Media y M2 de Welford sobre una ventana deslizante (añade `new`, retira `old`)."""
+        if old is None:
+            delta = new - self.bb_mean
+            self.bb_mean += delta / size
+            self.bb_m2 += delta * (new - self.bb_mean)
+            return
+        old_mean = self.bb_mean
+        self.bb_mean = old_mean + (new - old) / size
+        self.bb_m2 += (new - old) * (new - self.bb_mean + old - old_mean)
+
+    def _resync(self):
+        """Recalcula las sumas desde la ventana de cierres para evitar deriva acumulada."""
+        closes = list(self.closes)
+        short_w, long_w, bb_w = self.spec['sma_short'], self.spec['sma_long'], self.spec['bb_window']
+        self.sum_short = math.fsum(closes[-short_w:])
+        self.sum_long = math.fsum(closes[-long_w:])
+        window = closes[-bb_w:]
+        self.bb_mean = math.fsum(window) / len(window)
+        self.bb_m2 = math.fsum((value - self.bb_mean) ** 2 for value in window)
+
+    def _update_stochrsi(self, idx, rsi):
+        window = self.spec['stoch_rsi_window']
+        if math.isnan(rsi):
+            self.last_nan_rsi = idx
+            self.rsi_min.clear()
+            self.rsi_max.clear()
+            return math.nan
+        for dq, worse in ((self.rsi_min, lambda last: last >= rsi), (self.rsi_max, lambda last: last <= rsi)):
+            while dq and worse(dq[-1][1]):
+                dq.pop()
+            dq.append((idx, rsi))
+            while dq[0][0] <= idx - window:
+                dq.popleft()
+        if self.last_nan_rsi > idx - window:
+            return math.nan
+        return _safe_div(rsi - self.rsi_min[0][1], self.rsi_max[0][1] - self.rsi_min[0][1])
+
+    # --- Carga inicial y persistencia ---
+    def anchor_obv(self, obv):
+        """Sustituye el OBV acumulado por `obv` (p. ej. la suma sobre la ventana de entrenamiento)."""
+        self.obv = float(obv)
+        self.features[FEATURES.index('obv')] = self.obv
+
+    @classmethod
+    def from_history(cls, high, low, close, volume, timestamps=None, spec=FEATURE_SPEC):
+        """Construye el estado recorriendo un histórico (solo se hace una vez)."""
+        state = cls(spec)
+        for i in range(len(close)):
+            ts = timestamps[i] if timestamps is not None else None
+            state.update(high[i], low[i], close[i], volume[i], ts)
+        return state
+
+    def to_dict(self):
+        return {
+            'version': STATE_VERSION,
+            'spec': self.spec,
+            'count': self.count,
+            'last_timestamp': self.last_timestamp,
+            'prev_close': self.prev_close,
+            'closes': list(self.closes),
+            'sum_short': self.sum_short, 'sum_long': self.sum_long,
+            'bb_mean': self.bb_mean, 'bb_m2': self.bb_m2,
+            'gain_num': self.gain_num, 'loss_num': self.loss_num, 'ewm_weight': self.ewm_weight,
+            'ema_fast': self.ema_fast, 'ema_slow': self.ema_slow,
+            'macd_signal': self.macd_signal, 'atr': self.atr, 'obv': self.obv,
+            'rsi_min': [list(item) for item in self.rsi_min],
+            'rsi_max': [list(item) for item in self.rsi_max],
+            'last_nan_rsi': self.last_nan_rsi,
+            'features': [None if math.isnan(v) else v for v in self.features.tolist()],
+        }
+
+    @classmethod
+    def from_dict(cls, payload):
+        state = cls(payload['spec'])
+        for key in ('count', 'last_timestamp', 'prev_close', 'sum_short', 'sum_long', 'bb_mean', 'bb_m2',
+                    'gain_num', 'loss_num', 'ewm_weight', 'ema_fast', 'ema_slow', 'macd_signal', 'atr',
+                    'obv', 'last_nan_rsi'):
+            setattr(state, key, payload[key])
+        state.closes.extend(payload['closes'])
+        state.rsi_min.extend(tuple(item) for item in payload['rsi_min'])
+        state.rsi_max.extend(tuple(item) for item in payload['rsi_max'])
+        state.features = np.array([math.nan if v is None else v for v in payload['features']])
+        return state
+
+    def save(self, path):
+        """Guarda el estado de forma atómica (archivo temporal + os.replace)."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, spec=FEATURE_SPEC):
+        """Carga un estado guardado; devuelve None si no existe, es antiguo o usa otra spec."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get('version') != STATE_VERSION or payload.get('spec') != dict(spec):
+            return None
+        return cls.from_dict(payload)
+
+
+def _ewm_step(previous, value, alpha):
+    return value if previous is None else alpha * value + (1.0 - alpha) * previous
+
+
+def _safe_div(numerator, denominator):
+    """División con la semántica de NumPy (inf/NaN en lugar de excepción)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(numerator) / np.float64(denominator))
+
+
+def _safe_rsi(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(100 - (100 / (1 + (np.float64(avg_gain) / np.float64(avg_loss)))))
+
+
+# Este bloque permite ejecutar el script directamente para verificar que el
+# modo incremental coincide con el cálculo batch del motor de features.
+if __name__ == '__main__':
+    import time
+    from feature_engine import compute_feature_matrix
+
+    rng = np.random.default_rng(7)
+    n_rows = 5000
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n_rows)))
+    high = close * (1 + rng.random(n_rows) * 0.002)
+    low = close * (1 - rng.random(n_rows) * 0.002)
+    volume = rng.integers(1_000_000, 1_000_000_000, n_rows).astype(float)
+
+    batch = compute_feature_matrix(high, low, close, volume)
+    state = IncrementalFeatures()
+    start = time.perf_counter()
+    rows = np.array([state.update(high[i], low[i], close[i], volume[i]) for i in range(n_rows)])
+    elapsed = time.perf_counter() - start
+
+    same_nan = np.array_equal(np.isnan(batch), np.isnan(rows))
+    valid = ~np.isnan(batch)
+    max_rel = np.max(np.abs(batch[valid] - rows[valid]) / np.maximum(np.abs(batch[valid]), 1e-12))
+    print(f"NaN idénticos: {same_nan} | error relativo máx.: {max_rel:.2e} | "
+          f"{elapsed / n_rows * 1e6:.1f} µs por vela")
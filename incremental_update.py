@@ -0,0 +1,168 @@
+# incremental_update.py (Actualización Incremental del Modelo con las Velas Nuevas)
+#
+# train_model.py reentrena desde cero (búsqueda de hiperparámetros incluida)
+# sobre 60 días de velas. Aquí se carga el booster actual y se le añaden
+# UPDATE_ROUNDS árboles entrenados SOLO con las velas llegadas desde el último
+# ajuste (continuación con `xgb_model`), con los mismos hiperparámetros. Tarda
+# segundos, así que puede ejecutarse cada pocas horas en lugar de cada noche.
+#
+# models/model_meta.json guarda la última vela entrenada, las features, los
+# parámetros y la precisión de validación del último entrenamiento completo.
+#
+# Salvaguarda: antes de entrenar con las velas nuevas, el modelo actual las
+# predice (aún no las ha visto). Los aciertos se acumulan desde el último
+# entrenamiento completo; si esa precisión fuera de muestra cae más de
+# MAX_ACCURACY_DROP por debajo de la validación de referencia, o el modelo ya
+# ha crecido MAX_ROUNDS_RATIO veces, se hace un reentrenamiento completo.
+#
+# Uso: python incremental_update.py [rondas]
+
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from joblib import load
+
+from backtest_store import data_fingerprint
+from candle_archive import load_period
+from fast_inference import BOOSTER_PATH
+from model_registry import META_PATH, MODEL_PATH, load_model_meta
+from model_store import append_training_log, save_version, set_current
+from train_model import INTERVALO_VELAS, PERIODO_DATOS, TICKER, prepare_training_data, train_ia_model
+
+# Árboles añadidos en cada actualización.
+UPDATE_ROUNDS = 20
+# Velas nuevas (con objetivo conocido) necesarias para actualizar: 8 = 2 horas de 15m.
+MIN_NEW_BARS = 8
+# Velas fuera de muestra acumuladas antes de que la salvaguarda pueda decidir.
+MIN_GUARD_BARS = 96
+# Caída máxima tolerada de la precisión fuera de muestra frente a la validación de referencia.
+MAX_ACCURACY_DROP = 0.03
+# Tamaño máximo del modelo respecto al del último entrenamiento completo.
+MAX_ROUNDS_RATIO = 2.0
+
+
+def full_retrain_reason(meta, features, rounds):
+    """Motivo para no actualizar de forma incremental (None si la actualización es válida)."""
+    if meta is None:
+        return "no hay metadatos del modelo (entrenado antes de las actualizaciones incrementales)"
+    # Modelo podado: se comparan las features candidatas (antes de la poda) con las actuales.
+    if meta.get('candidates', meta['features']) != list(features):
+        return "las features del modelo no coinciden con las actuales"
+    if meta['total_rounds'] + rounds > MAX_ROUNDS_RATIO * meta['base_rounds']:
+        return f"el modelo ya tiene {meta['total_rounds']} árboles (máximo {MAX_ROUNDS_RATIO:g}x {meta['base_rounds']})"
+    if meta['oos_rows'] >= MIN_GUARD_BARS:
+        oos_accuracy = meta['oos_correct'] / meta['oos_rows']
+        if oos_accuracy < meta['validation_accuracy'] - MAX_ACCURACY_DROP:
+            return (f"precisión fuera de muestra {oos_accuracy:.4f} por debajo de la validación "
+                    f"{meta['validation_accuracy']:.4f} - {MAX_ACCURACY_DROP}")
+    return None
+
+
+def update_model(data=None, rounds=UPDATE_ROUNDS, model_path=MODEL_PATH, meta_path=META_PATH,
+                 booster_path=BOOSTER_PATH, retrain=train_ia_model):
+    """
+    Añade `rounds` árboles al modelo actual con las velas posteriores a la última
+    entrenada o, si la salvaguarda lo pide, lanza `retrain` (entrenamiento completo).
+
+    Returns:
+        dict: 'action' ('incremental', 'full' o 'skip'), 'reason', 'new_rows', 'seconds'
+        y la precisión fuera de muestra de las velas nuevas.
+    """
+    start = time.perf_counter()
+    meta = load_model_meta(meta_path)
+    if data is None:
+        data = load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS)
+    data, model_features = prepare_training_data(data)
+    new = data[data.index > pd.Timestamp(meta['last_ts'])] if meta is not None else data.iloc[:0]
+    result = {'action': 'skip', 'reason': None, 'new_rows': len(new), 'new_accuracy': None, 'oos_accuracy': None}
+
+    reason = full_retrain_reason(meta, model_features, rounds)
+    if reason is None:
+        if len(new) < MIN_NEW_BARS:
+            result['reason'] = f"solo {len(new)} velas nuevas (mínimo {MIN_NEW_BARS})"
+            result['seconds'] = time.perf_counter() - start
+            return result
+        X_new = np.ascontiguousarray(new[meta['features']].to_numpy(), dtype=np.float32)
+        y_new = new['target'].to_numpy()
+        model = load(model_path)
+        # Velas que el modelo aún no ha visto: se evalúan ANTES de entrenar con ellas.
+        correct = int((model.predict(X_new) == y_new).sum())
+        meta['oos_rows'] += len(new)
+        meta['oos_correct'] += correct
+        result['new_accuracy'] = correct / len(new)
+        result['oos_accuracy'] = meta['oos_correct'] / meta['oos_rows']
+        reason = full_retrain_reason(meta, model_features, rounds)
+        if reason is None and len(np.unique(y_new)) < 2:
+            reason = "las velas nuevas solo tienen una clase"
+
+    if reason is not None:
+        result.update(action='full', reason=reason)
+        retrain()
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    booster = model.get_booster()
+    # La continuación usa arrays en el orden de meta['features']; los nombres se restauran después
+    # porque son la lista de features que lee la inferencia (feature_engine.model_feature_names).
+    booster.feature_names = None
+    model.set_params(n_estimators=rounds)
+    model.fit(X_new, y_new, xgb_model=booster)
+    model.get_booster().feature_names = list(meta['features'])
+
+    # Versión de la que se partió: la publicada en model.joblib junto con estos metadatos
+    # (tras volver a una versión anterior, CURRENT y la última versión guardada no lo son).
+    parent = meta.get('version')
+    meta.update(mode='incremental', trained_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                last_ts=new.index[-1].isoformat(), total_rounds=model.get_booster().num_boosted_rounds(),
+                rows=meta['rows'] + len(new), updates=meta['updates'] + 1)
+    version = save_version(model, {
+        'mode': 'incremental',
+        'parent': parent,
+        'params': meta['params'],
+        'cv_score': meta['validation_accuracy'],
+        'features': meta['features'],
+        'rows': len(new),
+        'first_ts': new.index[0].isoformat(),
+        'last_ts': new.index[-1].isoformat(),
+        'data_fingerprint': data_fingerprint(new),
+        'total_rounds': model.get_booster().num_boosted_rounds(),
+        'timings': {'total_seconds': round(time.perf_counter() - start, 3)},
+        'meta': {key: value for key, value in meta.items() if key != 'version'},
+    }, make_current=False)
+    # Publica model.joblib, model.ubj y model_meta.json de la versión nueva y mueve CURRENT.
+    set_current(version['version'], model_path=model_path, booster_path=booster_path, meta_path=meta_path)
+    result.update(action='incremental', seconds=time.perf_counter() - start)
+
+    log_entry = {
+        'timestamp': meta['trained_at'],
+        'model_type': f'High-Frequency ({INTERVALO_VELAS})',
+        'search': 'incremental',
+        'new_rows': len(new),
+        'rounds_added': rounds,
+        'total_rounds': meta['total_rounds'],
+        'new_rows_accuracy': round(result['new_accuracy'], 4),
+        'oos_accuracy_since_full': round(result['oos_accuracy'], 4),
+        'update_seconds': round(result['seconds'], 3),
+        'model_version': version['version'],
+    }
+    append_training_log(log_entry)
+    return result
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else UPDATE_ROUNDS
+    print(f"--- Actualización incremental del modelo ({TICKER} {INTERVALO_VELAS}, +{rounds} árboles) ---")
+    result = update_model(rounds=rounds)
+    if result['action'] == 'skip':
+        print(f"ℹ️ Nada que actualizar: {result['reason']}.")
+    elif result['action'] == 'full':
+        print(f"⚠️ Se hizo un reentrenamiento completo: {result['reason']}.")
+    else:
+        print(f"✅ Modelo actualizado con {result['new_rows']} velas nuevas en {result['seconds']:.2f} s "
+              f"(precisión sobre ellas antes de entrenar: {result['new_accuracy']:.4f}; "
+              f"fuera de muestra desde el último entrenamiento completo: {result['oos_accuracy']:.4f}).")
+    if result['action'] != 'skip':
+        print(f"⏱️ Tiempo total: {result['seconds']:.2f} s")
@@ -0,0 +1,207 @@
+# labeling.py (Etiquetas de Entrenamiento: Próximas N Velas y Triple Barrera)
+#
+# El único objetivo era "¿sube la próxima vela?", pero los bots salen por
+# Stop-Loss / Take-Profit (STOP_LOSS_PERCENT / TAKE_PROFIT_PERCENT). Aquí se
+# generan, sin bucles por vela:
+#
+# - next_n_labels: ¿el cierre dentro de N velas es mayor que el actual? (varios N).
+# - triple_barrier: se abre una operación al cierre de cada vela y se mira qué
+#   barrera toca primero: +1 Take-Profit, -1 Stop-Loss, 0 límite de tiempo
+#   (max_bars velas). Si una vela toca ambas se asume el Stop-Loss, igual que
+#   backtest_engine.run_risk_backtest. NaN = aún no se sabe (final de los datos).
+#
+# El primer toque se busca con una tabla dispersa de máximos de High / mínimos
+# de Low sobre bloques de 2^k velas: todas las velas avanzan a la vez saltando
+# los bloques que no llegan a su barrera (O(n log H) en lugar de O(n·H)), y las
+# tablas se calculan una vez para el horizonte más largo y sirven para todos.
+#
+# Nota: con etiquetas que miran H velas adelante, la validación temporal debe
+# dejar H velas de separación entre entrenamiento y prueba.
+#
+# Uso (verificación y benchmark): python labeling.py [n_velas]
+
+import time
+
+import numpy as np
+import pandas as pd
+
+# Reglas de riesgo de los bots en vivo (paper_trading_bot.py / backtest.py).
+STOP_LOSS_PERCENT = 1.5
+TAKE_PROFIT_PERCENT = 3.0
+# Límite de tiempo de la triple barrera: 96 velas de 15m = 1 día.
+MAX_HOLDING_BARS = 96
+HORIZONS = (1, 4, 16, 96)
+LABEL_TAKE_PROFIT = 1
+LABEL_STOP_LOSS = -1
+LABEL_TIME_LIMIT = 0
+# Velas por bloque de la búsqueda del primer toque (acota la memoria de las tablas).
+CHUNK_ROWS = 1 << 20
+
+
+def next_n_labels(close, horizons=HORIZONS):
+    """
+    {N: array float} con 1.0 si close[t + N] > close[t], 0.0 si no, y NaN en las
+    últimas N velas (objetivo desconocido). N=1 es el objetivo de train_model.py.
+    """
+    close = np.asarray(close, dtype=np.float64).reshape(-1)
+    labels = {}
+    for horizon in horizons:
+        out = np.full(len(close), np.nan)
+        out[:-horizon] = close[horizon:] > close[:-horizon]
+        labels[horizon] = out
+    return labels
+
+
+def first_touch_index(values, thresholds, max_bars, above=True, chunk_rows=CHUNK_ROWS):
+    """
+    Para cada vela t, la primera vela j en [t+1, t+max_bars] con values[j] >= thresholds[t]
+    (above=True) o values[j] <= thresholds[t] (above=False); len(values) si no hay toque.
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64).reshape(-1)
+    thresholds = np.asarray(thresholds, dtype=np.float64).reshape(-1)
+    n = len(values)
+    out = np.full(n, n, dtype=np.int64)
+    levels = max(int(max_bars).bit_length(), 1)  # 2^(levels-1) <= max_bars < 2^levels
+    combine = np.maximum if above else np.minimum
+    for a in range(0, max(n - 1, 0), chunk_rows):
+        b = min(a + chunk_rows, n)
+        lo = a + 1
+        window = values[lo:min(b + max_bars, n)]
+        # tables[k][i] = máximo (o mínimo) de window[i : i + 2^k].
+        tables = [window]
+        for k in range(1, levels):
+            span = 1 << (k - 1)
+            tables.append(combine(tables[-1][:-span], tables[-1][span:]))
+
+        rows = np.arange(a, b)
+        position = rows + 1 - lo
+        last = np.minimum(rows + max_bars, n - 1) - lo
+        threshold = thresholds[a:b]
+        for k in range(levels - 1, -1, -1):
+            size = 1 << k
+            table = tables[k]
+            if len(table) == 0:
+                continue
+            fits = position + size - 1 <= last
+            block = table[np.where(fits, position, 0)]
+            # El bloque entero queda por debajo (o por encima) de la barrera: se salta.
+            position += np.where(fits & ((block < threshold) if above else (block > threshold)), size, 0)
+        out[a:b] = np.where(position <= last, position + lo, n)
+    return out
+
+
+def _barrier_outcome(close, take, stop, max_bars, stop_loss_pct, take_profit_pct):
+    n = len(close)
+    rows = np.arange(n)
+    limit = rows + max_bars
+    reach = np.minimum(limit, n - 1)  # Sin toque, first_touch_index devuelve n.
+    hit_stop = (stop <= reach) & (stop <= take)  # Misma vela: Stop-Loss (criterio conservador).
+    hit_take = (take <= reach) & (take < stop)
+    complete = limit <= n - 1
+    timeout = ~hit_stop & ~hit_take & complete
+    label = np.full(n, np.nan)
+    label[hit_take] = LABEL_TAKE_PROFIT
+    label[hit_stop] = LABEL_STOP_LOSS
+    label[timeout] = LABEL_TIME_LIMIT
+    exit_index = np.full(n, -1, dtype=np.int64)
+    exit_index[hit_take] = take[hit_take]
+    exit_index[hit_stop] = stop[hit_stop]
+    exit_index[timeout] = limit[timeout]
+    returns = np.full(n, np.nan)
+    returns[hit_take] = take_profit_pct / 100
+    returns[hit_stop] = -stop_loss_pct / 100
+    returns[timeout] = close[limit[timeout]] / close[timeout] - 1
+    return {'label': label, 'exit_index': exit_index, 'return': returns}
+
+
+def triple_barrier(high, low, close, stop_loss_pct=STOP_LOSS_PERCENT, take_profit_pct=TAKE_PROFIT_PERCENT,
+                   max_bars=MAX_HOLDING_BARS, horizons=None):
+    """
+    Etiquetas de triple barrera para una compra al cierre de cada vela.
+
+    Args:
+        horizons (tuple opcional): varios límites de tiempo; las búsquedas de primer
+            toque se hacen una sola vez con el mayor.
+
+    Returns:
+        dict: 'label' (+1 TP, -1 SL, 0 tiempo, NaN desconocido), 'exit_index' (vela de
+        salida, -1 si se desconoce) y 'return' (rentabilidad de la operación). Con
+        `horizons`, un dict así por horizonte.
+    """
+    high = np.asarray(high, dtype=np.float64).reshape(-1)
+    low = np.asarray(low, dtype=np.float64).reshape(-1)
+    close = np.asarray(close, dtype=np.float64).reshape(-1)
+    longest = max(horizons) if horizons else max_bars
+    take = first_touch_index(high, close * (1 + take_profit_pct / 100), longest, above=True)
+    stop = first_touch_index(low, close * (1 - stop_loss_pct / 100), longest, above=False)
+    if horizons:
+        return {h: _barrier_outcome(close, take, stop, h, stop_loss_pct, take_profit_pct) for h in horizons}
+    return _barrier_outcome(close, take, stop, max_bars, stop_loss_pct, take_profit_pct)
+
+
+def add_labels(df, horizons=HORIZONS, stop_loss_pct=STOP_LOSS_PERCENT, take_profit_pct=TAKE_PROFIT_PERCENT):
+    """Añade a un DataFrame de velas las columnas 'target_next_{N}' y 'target_tb_{N}' para cada horizonte."""
+    close = df['Close'].to_numpy(dtype=np.float64).reshape(-1)
+    columns = {f"target_next_{h}": values for h, values in next_n_labels(close, horizons).items()}
+    barriers = triple_barrier(df['High'], df['Low'], close, stop_loss_pct, take_profit_pct, horizons=horizons)
+    columns.update({f"target_tb_{h}": outcome['label'] for h, outcome in barriers.items()})
+    return pd.concat([df, pd.DataFrame(columns, index=df.index)], axis=1)
+
+
+def loop_triple_barrier(high, low, close, stop_loss_pct=STOP_LOSS_PERCENT, take_profit_pct=TAKE_PROFIT_PERCENT,
+                        max_bars=MAX_HOLDING_BARS):
+    """Bucle ingenuo O(n·H) (referencia para verificar triple_barrier)."""
+    n = len(close)
+    label = np.full(n, np.nan)
+    for t in range(n):
+        stop_price = close[t] * (1 - stop_loss_pct / 100)
+        take_price = close[t] * (1 + take_profit_pct / 100)
+        for j in range(t + 1, min(t + max_bars, n - 1) + 1):
+            if low[j] <= stop_price:
+                label[t] = LABEL_STOP_LOSS
+                break
+            if high[j] >= take_price:
+                label[t] = LABEL_TAKE_PROFIT
+                break
+        else:
+            if t + max_bars <= n - 1:
+                label[t] = LABEL_TIME_LIMIT
+    return label
+
+
+# Este bloque permite ejecutar el script directamente para verificar las
+# etiquetas contra el bucle ingenuo y medir el tiempo sobre millones de velas.
+if __name__ == '__main__':
+    import sys
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    rng = np.random.default_rng(7)
+    close = 30000.0 * np.exp(np.cumsum(rng.normal(0, 0.004, n_rows)))
+    high = close * (1 + rng.random(n_rows) * 0.004)
+    low = close * (1 - rng.random(n_rows) * 0.004)
+
+    check = 20_000
+    start = time.perf_counter()
+    reference = loop_triple_barrier(high[:check], low[:check], close[:check])
+    loop_seconds = time.perf_counter() - start
+    fast = triple_barrier(high[:check], low[:check], close[:check])['label']
+    print(f"Verificación ({check:,} velas): idénticas al bucle = "
+          f"{np.array_equal(np.isnan(reference), np.isnan(fast)) and np.array_equal(reference[~np.isnan(reference)], fast[~np.isnan(fast)])} "
+          f"| bucle {loop_seconds:.2f} s")
+
+    start = time.perf_counter()
+    barriers = triple_barrier(high, low, close, horizons=HORIZONS)
+    barrier_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    next_n_labels(close, HORIZONS)
+    next_seconds = time.perf_counter() - start
+    print(f"--- {n_rows:,} velas, horizontes {HORIZONS} ---")
+    print(f"Triple barrera (SL {STOP_LOSS_PERCENT}% / TP {TAKE_PROFIT_PERCENT}%): {barrier_seconds:.2f} s | "
+          f"próximas N velas: {next_seconds:.2f} s | bucle estimado (H={MAX_HOLDING_BARS}): "
+          f"{loop_seconds * n_rows / check:,.0f} s")
+    for horizon, outcome in barriers.items():
+        label = outcome['label']
+        known = ~np.isnan(label)
+        print(f"  H={horizon:>3}: TP {np.mean(label[known] == LABEL_TAKE_PROFIT) * 100:5.1f}% | "
+              f"SL {np.mean(label[known] == LABEL_STOP_LOSS) * 100:5.1f}% | "
+              f"tiempo {np.mean(label[known] == LABEL_TIME_LIMIT) * 100:5.1f}%")
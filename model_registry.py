@@ -0,0 +1,179 @@
+# model_registry.py (Registro de Modelos Residente con Recarga en Caliente)
+#
+# En lugar de hacer joblib.load(MODEL_PATH) en cada ciclo, el modelo
+# deserializado se mantiene en memoria. En cada petición solo se hace un
+# os.stat del archivo: si train_model.py escribió un modelo nuevo (cambia
+# mtime/tamaño y el hash del contenido), se carga el nuevo y se sustituye de
+# forma atómica; los que ya tenían la referencia anterior terminan con ella.
+#
+# Se registra la latencia de carga y la huella de memoria del modelo para
+# poder comparar con la carga en cada ciclo.
+
+import json
+import logging
+import os
+import threading
+import time
+
+from joblib import load
+
+from feature_cache import file_hash
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(PROJECT_ROOT, "models", "model.joblib")
+# Metadatos del modelo actual (los escribe train_model.py y los actualiza incremental_update.py).
+META_PATH = os.path.join(PROJECT_ROOT, "models", "model_meta.json")
+
+
+def _rss_bytes():
+    """Memoria residente actual del proceso (Linux); None si no se puede leer."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def model_footprint_bytes(model):
+    """Tamaño del booster serializado en memoria (aprox. lo que ocupan los árboles)."""
+    try:
+        return len(model.get_booster().save_raw())
+    except Exception:
+        return None
+
+
+class ModelRegistry:
+    """Mantiene un modelo cargado y lo recarga solo cuando su archivo cambia."""
+
+    def __init__(self, path=MODEL_PATH, loader=load):
+        self.path = path
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._model = None
+        self._marker = None
+        self._hash = None
+        self.stats = {'loads': 0, 'hits': 0, 'last_load_seconds': None, 'file_bytes': None,
+                      'rss_delta_bytes': None, 'booster_bytes': None, 'model_hash': None}
+
+    def get(self):
+        """Devuelve el modelo residente, recargándolo si el archivo ha cambiado."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            if self._model is not None:
+                # El archivo se está reemplazando o se borró: seguimos con el modelo residente.
+                return self._model
+            raise FileNotFoundError(f"No se encontró el modelo en '{self.path}'. Ejecuta 'train_model.py' primero.")
+
+        marker = (stat.st_mtime_ns, stat.st_size)
+        if self._model is not None and marker == self._marker:
+            self.stats['hits'] += 1
+            return self._model
+
+        with self._lock:
+            if self._model is not None and marker == self._marker:
+                return self._model
+            new_hash = file_hash(self.path)
+            if self._model is not None and new_hash == self._hash:
+                # Mismo contenido con otra fecha (p. ej. un `touch`): no hace falta recargar.
+                self._marker = marker
+                return self._model
+            self._load(marker, new_hash, stat.st_size)
+        return self._model
+
+    def _load(self, marker, new_hash, file_bytes):
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        model = self.loader(self.path)
+        elapsed = time.perf_counter() - start
+        rss_after = _rss_bytes()
+
+        # Sustitución atómica: una sola asignación de referencia.
+        self._model, self._marker, self._hash = model, marker, new_hash
+        self.stats.update({
+            'loads': self.stats['loads'] + 1,
+            'last_load_seconds': elapsed,
+            'file_bytes': file_bytes,
+            'rss_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'booster_bytes': model_footprint_bytes(model),
+            'model_hash': new_hash,
+        })
+        action = "recargado" if self.stats['loads'] > 1 else "cargado"
+        logging.info(f"🧠 [Modelos] Modelo {action} en {elapsed * 1e3:.1f} ms "
+                     f"({file_bytes / 1024:.0f} KB en disco, hash {new_hash}).")
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path=MODEL_PATH, loader=load):
+    """Registro compartido (uno por ruta) dentro del proceso."""
+    path = os.path.abspath(path)
+    with _registries_lock:
+        if path not in _registries:
+            _registries[path] = ModelRegistry(path, loader)
+        return _registries[path]
+
+
+def get_model(path=MODEL_PATH):
+    """Atajo: modelo residente para `path`."""
+    return get_registry(path).get()
+
+
+def save_model_atomic(model, path=MODEL_PATH, dumper=None):
+    """
+    Guarda un modelo con archivo temporal + os.replace, de modo que un proceso que
+    lo esté leyendo nunca vea un archivo a medias y el registro detecte el cambio.
+    """
+    if dumper is None:
+        from joblib import dump as dumper
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    dumper(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_model_meta(meta, path=META_PATH):
+    """Guarda los metadatos del modelo (última vela entrenada, parámetros...) de forma atómica."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def load_model_meta(path=META_PATH):
+    """Metadatos del modelo actual, o None si no existen (modelo anterior a los metadatos)."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Este bloque permite ejecutar el script directamente para medir el ahorro
+# frente a cargar el modelo en cada ciclo.
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+    n_cycles = 200
+
+    # Primero el registro, para que la diferencia de RSS refleje una carga en frío.
+    registry = ModelRegistry(MODEL_PATH)
+    registry.get()
+    start = time.perf_counter()
+    for _ in range(n_cycles):
+        registry.get()
+    per_cycle_registry = (time.perf_counter() - start) / n_cycles
+
+    start = time.perf_counter()
+    for _ in range(20):
+        load(MODEL_PATH)
+    per_cycle_load = (time.perf_counter() - start) / 20
+
+    stats = registry.stats
+    print(f"joblib.load en cada ciclo:  {per_cycle_load * 1e3:8.3f} ms")
+    print(f"Registro residente:         {per_cycle_registry * 1e3:8.3f} ms ({per_cycle_load / per_cycle_registry:,.0f}x)")
+    print(f"Carga inicial: {stats['last_load_seconds'] * 1e3:.1f} ms | archivo: {stats['file_bytes'] / 1024:.0f} KB | "
+          f"booster: {(stats['booster_bytes'] or 0) / 1024:.0f} KB | "
+          f"RSS +{(stats['rss_delta_bytes'] or 0) / 1024:.0f} KB")
@@ -0,0 +1,259 @@
+# model_store.py (Almacén Versionado de Modelos - Artefactos UBJSON y Puntero CURRENT)
+#
+# Hasta ahora había un único models/model.joblib que cada entrenamiento
+# sobrescribía. Aquí cada modelo entrenado es una versión inmutable:
+#
+#     models/store/<versión>/model.ubj       booster en formato nativo de XGBoost (UBJSON)
+#     models/store/<versión>/manifest.json   parámetros, CV, features, huella de datos, tiempos
+#     models/store/index.jsonl               una línea por versión (solo se anexa)
+#     models/store/CURRENT                   versión en producción
+#
+# - La versión se escribe en un directorio temporal y se renombra entero, así
+#   que nunca aparece a medias.
+# - Cada línea del índice se anexa con UNA escritura O_APPEND: dos procesos que
+#   registran versiones a la vez no intercalan líneas.
+# - CURRENT se cambia con archivo temporal + os.replace (cambio atómico).
+# - set_current PUBLICA la versión antes de mover el puntero: la copia en
+#   models/model.joblib, models/model.ubj (+ hash de origen) y
+#   models/model_meta.json, cada uno con escritura atómica. Son las rutas que
+#   leen los bots (registro de modelos, inferencia rápida, actualización
+#   incremental), así que cambiar de versión o volver a una anterior cambia el
+#   modelo en producción en su próximo ciclo.
+#
+# Uso: python model_store.py                (versiones + carga en frío UBJSON vs joblib)
+#      python model_store.py usar <versión> (cambia CURRENT)
+
+import json
+import os
+import shutil
+import time
+
+from fast_inference import BOOSTER_PATH, export_booster
+from feature_cache import file_hash
+from model_registry import META_PATH, MODEL_PATH, save_model_atomic, save_model_meta
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(PROJECT_ROOT, "models", "store")
+INDEX_FILE = 'index.jsonl'
+CURRENT_FILE = 'CURRENT'
+MODEL_FILE = 'model.ubj'
+MANIFEST_FILE = 'manifest.json'
+TRAINING_LOG_PATH = os.path.join(PROJECT_ROOT, "training_log.json")
+
+
+def _append_line(path, record):
+    """Anexa un registro JSON como una sola escritura O_APPEND (no se intercala con otros procesos)."""
+    line = (json.dumps(record, default=str) + "\n").encode('utf-8')
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def save_version(model, fields, root=None, make_current=True):
+    """
+    Guarda `model` (XGBClassifier) como versión nueva con su manifiesto.
+
+    Args:
+        fields (dict): datos del manifiesto (params, cv_score, features, data_fingerprint, timings...
+            y 'meta': los metadatos de model_meta.json que se publican con la versión).
+
+    Returns:
+        dict: manifiesto guardado (incluye 'version').
+    """
+    root = root or STORE_DIR
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".tmp-{os.getpid()}-{time.time_ns()}")
+    os.makedirs(tmp_dir)
+    try:
+        model_path = os.path.join(tmp_dir, MODEL_FILE)
+        model.save_model(model_path)
+        digest = file_hash(model_path)
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:8]}"
+        manifest = {'version': version, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'format': 'ubj',
+                    'sha1': digest, 'size_bytes': os.path.getsize(model_path), **fields}
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.rename(tmp_dir, os.path.join(root, version))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _append_line(os.path.join(root, INDEX_FILE), manifest)
+    if make_current:
+        set_current(version, root)
+    return manifest
+
+
+def read_manifest(version, root=None):
+    with open(os.path.join(root or STORE_DIR, version, MANIFEST_FILE), 'r') as f:
+        return json.load(f)
+
+
+def publish_version(version, root=None, model_path=MODEL_PATH, booster_path=BOOSTER_PATH, meta_path=META_PATH):
+    """
+    Copia una versión a las rutas que leen los bots: model.joblib, model.ubj (con
+    el hash de su model.joblib) y model_meta.json (con 'version' = la publicada).
+    """
+    model = load_version(version, root)
+    save_model_atomic(model, model_path)
+    export_booster(model, booster_path, source_path=model_path)
+    meta = read_manifest(version, root).get('meta')
+    if meta is not None:
+        save_model_meta(dict(meta, version=version), meta_path)
+    elif os.path.exists(meta_path):
+        # Versión sin metadatos (anterior a este formato): sin ellos, la próxima
+        # actualización incremental hará un entrenamiento completo en lugar de
+        # continuar este modelo con los metadatos de otro.
+        os.remove(meta_path)
+
+
+def set_current(version, root=None, publish=True, model_path=MODEL_PATH, booster_path=BOOSTER_PATH,
+                meta_path=META_PATH):
+    """Publica `version` en las rutas de producción (publish=True) y apunta CURRENT a ella (cambio atómico)."""
+    root = root or STORE_DIR
+    if not os.path.exists(os.path.join(root, version, MODEL_FILE)):
+        raise FileNotFoundError(f"No existe la versión '{version}' en '{root}'.")
+    if publish:
+        publish_version(version, root, model_path, booster_path, meta_path)
+    _write_atomic(os.path.join(root, CURRENT_FILE), version + "\n")
+
+
+def current_version(root=None):
+    """Versión en producción, o None si el almacén está vacío."""
+    try:
+        with open(os.path.join(root or STORE_DIR, CURRENT_FILE), 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def load_version(version=None, root=None):
+    """Carga una versión (por defecto CURRENT) como XGBClassifier listo para predict."""
+    from xgboost import XGBClassifier
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError("El almacén de modelos está vacío. Ejecuta 'train_model.py' primero.")
+    model = XGBClassifier()
+    model.load_model(os.path.join(root or STORE_DIR, version, MODEL_FILE))
+    return model
+
+
+def versions(root=None):
+    """Manifiestos de todas las versiones, en orden de registro (se ignoran líneas ilegibles)."""
+    path = os.path.join(root or STORE_DIR, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def _parse_training_log(path):
+    """(entradas legibles, posición del primer error o None si el archivo se lee entero)."""
+    try:
+        with open(path, 'r') as f:
+            text = f.read()
+    except OSError:
+        return [], None
+    decoder = json.JSONDecoder()
+    entries, position = [], 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position >= len(text):
+            return entries, None
+        try:
+            value, position = decoder.raw_decode(text, position)
+        except ValueError:
+            return entries, position
+        entries.extend(value if isinstance(value, list) else [value])
+
+
+def read_training_log(path=TRAINING_LOG_PATH):
+    """
+    Entradas del registro de entrenamiento. Tolera el formato antiguo (un array
+    JSON seguido de líneas JSON anexadas) para poder repararlo; si el archivo
+    está dañado, devuelve las entradas anteriores al error.
+    """
+    entries, error = _parse_training_log(path)
+    if error is not None:
+        print(f"⚠️ Advertencia: '{path}' está dañado a partir del carácter {error}; se ignora el resto.")
+    return entries
+
+
+def append_training_log(entry, path=TRAINING_LOG_PATH):
+    """
+    Añade una entrada al registro de entrenamiento, que siempre queda como un
+    array JSON válido. Un registro dañado no hace fallar el entrenamiento que ya
+    se guardó: se copia a '<ruta>.corrupt' y se reescribe con lo legible.
+    """
+    entries, error = _parse_training_log(path)
+    if error is not None:
+        shutil.copyfile(path, path + '.corrupt')
+        print(f"⚠️ Advertencia: '{path}' estaba dañado; copia en '{path}.corrupt'.")
+    entries.append(entry)
+    _write_atomic(path, json.dumps(entries, indent=4, default=str) + "\n")
+
+
+def _cold_load_seconds(statement, path, repeats=5):
+    """Mediana del tiempo de carga en procesos nuevos (imports fuera de la medida)."""
+    import statistics
+    import subprocess
+    import sys
+    code = ("import sys, time\n"
+            "sys.path.insert(0, sys.argv[2])\n"
+            "import joblib, xgboost, model_store\n"
+            "path = sys.argv[1]\n"
+            "start = time.perf_counter()\n"
+            f"{statement}\n"
+            "print(time.perf_counter() - start)")
+    samples = [float(subprocess.run([sys.executable, '-c', code, path, PROJECT_ROOT], check=True,
+                                    capture_output=True, text=True).stdout.split()[-1])
+               for _ in range(repeats)]
+    return statistics.median(samples)
+
+
+# Este bloque permite ejecutar el script directamente para listar las versiones
+# y comparar el artefacto UBJSON con el pickle de joblib (tamaño y carga en frío).
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'usar':
+        set_current(sys.argv[2])
+        print(f"✅ CURRENT -> {sys.argv[2]} (publicada en '{MODEL_PATH}')")
+        sys.exit(0)
+
+    current = current_version()
+    records = versions()
+    if not records:
+        print("ℹ️ Aún no hay versiones guardadas. Ejecuta 'train_model.py'.")
+        sys.exit(0)
+    print(f"--- {len(records)} versiones en '{STORE_DIR}' ---")
+    for record in records[-10:]:
+        marker = "➡️" if record['version'] == current else "  "
+        print(f"{marker} {record['version']} | {record.get('mode', 'full'):<11} | CV {record.get('cv_score')} | "
+              f"{record['size_bytes'] / 1024:.0f} KB | {record.get('rows')} filas")
+    if current is None:
+        print("ℹ️ Ninguna versión está en producción (falta CURRENT). Usa 'python model_store.py usar <versión>'.")
+        sys.exit(0)
+
+    ubj_path = os.path.join(STORE_DIR, current, MODEL_FILE)
+    print("\n--- Carga en frío (proceso nuevo, mediana de 5) ---")
+    if os.path.exists(MODEL_PATH):
+        joblib_seconds = _cold_load_seconds("joblib.load(path)", MODEL_PATH)
+        print(f"joblib (model.joblib): {os.path.getsize(MODEL_PATH) / 1024:8.0f} KB | {joblib_seconds * 1e3:6.1f} ms")
+    ubj_seconds = _cold_load_seconds("model_store.load_version(path.split('/')[-2])", ubj_path)
+    print(f"UBJSON (versión):      {os.path.getsize(ubj_path) / 1024:8.0f} KB | {ubj_seconds * 1e3:6.1f} ms")
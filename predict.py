@@ -1,32 +1,21 @@
 # predict.py (Versión Final Sincronizada con el modelo de 15m)
 
-import yfinance as yf
-import pandas as pd
-from joblib import load
 import logging
 import os
+import numpy as np
+from feature_engine import model_feature_names
+from resampler import frame_columns, history_period, model_feature_matrix
+from candle_store import get_candles, sync_many, load_panel, utc_now, period_seconds, epoch_seconds
+from feature_cache import cached_feature_matrix, cached_prediction
+from model_registry import get_model
 
 # --- PARÁMETROS SINCRONIZADOS CON EL MODELO DE ALTA FRECUENCIA ---
-# Estos parámetros deben ser idénticos a los usados en train_model.py y predict_live.py
+# Los parámetros de los indicadores viven en feature_engine.FEATURE_SPEC.
 SYMBOL = "BTC-USD"
 PERIOD = "7d"
 INTERVAL = "15m"
-
-SMA_SHORT = 20
-SMA_LONG = 50
-RSI_WINDOW = 14
-MACD_FAST = 12
-MACD_SLOW = 26
-MACD_SIGNAL = 9
-STOCH_RSI_WINDOW = 14
-BB_WINDOW = 20
-ATR_WINDOW = 14
-MOMENTUM_WINDOW = 14
-
-FEATURES = [
-    'sma_20', 'sma_50', 'rsi', 'macd', 'macd_signal', 'macd_diff', 
-    'stochrsi', 'obv', 'bb_width', 'atr', 'momentum', 'contexto_estrategia'
-]
+# Pares que se puntúan juntos en modo panel (get_panel_predictions).
+SYMBOLS = ["BTC-USD", "ETH-USD", "SOL-USD", "BNB-USD", "XRP-USD"]
 
 MODEL_PATH = os.path.join("models", "model.joblib")
 
@@ -37,55 +26,33 @@ def main_predict():
     try:
         # --- 1. Cargar el Modelo ---
         print(f"Cargando modelo desde: {MODEL_PATH}")
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"No se encontró el modelo en '{MODEL_PATH}'. Ejecuta 'train_model.py' primero.")
-        model = load(MODEL_PATH)
+        model = get_model(MODEL_PATH)
         print("Modelo cargado exitosamente.")
 
-        # --- 2. Descargar Datos Recientes ---
-        print(f"Descargando datos recientes para {SYMBOL} (Intervalo: {INTERVAL})...")
-        df = yf.download(SYMBOL, period=PERIOD, interval=INTERVAL, auto_adjust=True, progress=False)
+        # --- 2. Cargar Datos Recientes (almacén local de velas) ---
+        print(f"Cargando datos recientes para {SYMBOL} (Intervalo: {INTERVAL})...")
+        # Columnas del modelo (las conservadas si está podado, con sus temporalidades superiores).
+        names = model_feature_names(model)
+        df = get_candles(SYMBOL, INTERVAL, history_period(names, PERIOD))
         if df.empty:
-            raise ValueError("No se pudieron descargar datos.")
-        print("Datos descargados correctamente.")
+            raise ValueError("No se pudieron obtener datos.")
+        print("Datos cargados correctamente.")
+
+        # --- 3 y 4. Calcular Features y Generar Predicción (caché compartida por vela) ---
+        print("Calculando features y generando predicción...")
+        ts = epoch_seconds(df.index)
 
-        # --- 3. Calcular Features ---
-        print("Calculando features para la predicción...")
-        # (Lógica de cálculo idéntica a train_model.py y predict_live.py)
-        df['sma_20'] = df['Close'].rolling(window=SMA_SHORT).mean()
-        df['sma_50'] = df['Close'].rolling(window=SMA_LONG).mean()
-        delta = df['Close'].diff(1)
-        gain = delta.where(delta > 0, 0); loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.ewm(com=RSI_WINDOW - 1, min_periods=RSI_WINDOW).mean()
-        avg_loss = loss.ewm(com=RSI_WINDOW - 1, min_periods=RSI_WINDOW).mean()
-        df['rsi'] = 100 - (100 / (1 + (avg_gain / avg_loss)))
-        ema_fast = df['Close'].ewm(span=MACD_FAST, adjust=False).mean()
-        ema_slow = df['Close'].ewm(span=MACD_SLOW, adjust=False).mean()
-        df['macd'] = ema_fast - ema_slow
-        df['macd_signal'] = df['macd'].ewm(span=MACD_SIGNAL, adjust=False).mean()
-        df['macd_diff'] = df['macd'] - df['macd_signal']
-        rsi_series = df['rsi']
-        min_rsi = rsi_series.rolling(window=STOCH_RSI_WINDOW).min()
-        max_rsi = rsi_series.rolling(window=STOCH_RSI_WINDOW).max()
-        df['stochrsi'] = (rsi_series - min_rsi) / (max_rsi - min_rsi)
-        df['obv'] = (df['Volume'] * (~df['Close'].diff().le(0) * 2 - 1)).cumsum()
-        sma_bb = df['Close'].rolling(window=BB_WINDOW).mean()
-        std_bb = df['Close'].rolling(window=BB_WINDOW).std()
-        upper_bb = sma_bb + (std_bb * 2); lower_bb = sma_bb - (std_bb * 2)
-        df['bb_width'] = (upper_bb - lower_bb) / sma_bb
-        high_low = df['High'] - df['Low']
-        high_close = (df['High'] - df['Close'].shift()).abs()
-        low_close = (df['Low'] - df['Close'].shift()).abs()
-        tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        df['atr'] = tr.ewm(alpha=1/ATR_WINDOW, adjust=False).mean()
-        df['momentum'] = df['Close'].diff(MOMENTUM_WINDOW)
-        df['contexto_estrategia'] = 0.0
-        df.dropna(inplace=True)
+        def _predict():
+            # Se pasa un array con las columnas del modelo en su orden: los modelos entrenados
+            # con el MultiIndex de yfinance guardaron nombres como 'sma_20 '.
+            matrix = cached_feature_matrix(SYMBOL, INTERVAL, ts,
+                                           lambda: model_feature_matrix(frame_columns(df), names, INTERVAL),
+                                           columns=names)
+            matrix = matrix[~np.isnan(matrix).any(axis=1)]
+            X_predict = matrix[-1:]
+            return model.predict(X_predict)[0], X_predict[0]
 
-        # --- 4. Generar Predicción ---
-        print("Generando predicción...")
-        X_predict = df[FEATURES].tail(1)
-        prediction = model.predict(X_predict)[0]
+        prediction = cached_prediction(SYMBOL, INTERVAL, ts[-1], MODEL_PATH, _predict)
         
         # --- 5. Mostrar Resultado ---
         print("\n--- PREDICCIÓN PARA LA PRÓXIMA VELA DE 15 MINUTOS ---")
@@ -98,5 +65,38 @@ def main_predict():
     except Exception as e:
         print(f"Ocurrió un error durante la predicción: {e}")
 
+def get_panel_predictions(symbols=SYMBOLS, model=None):
+    """
+    Puntúa varios pares a la vez: una descarga, una pasada del motor de features
+    sobre el panel (tiempo × símbolo) y UNA llamada a model.predict.
+
+    Returns:
+        dict: {símbolo: clase predicha}. Los símbolos sin histórico suficiente se omiten.
+    """
+    if model is None:
+        model = get_model(MODEL_PATH)
+    try:
+        sync_many(symbols, INTERVAL)
+    except Exception as e:
+        logging.error(f"❌ [Panel] Error al sincronizar velas: {e}")
+
+    names = model_feature_names(model)
+    ts, panel = load_panel(symbols, INTERVAL, start=utc_now() - period_seconds(history_period(names, PERIOD)))
+    if len(panel['close']) == 0:
+        raise ValueError("No hay velas en el almacén para ningún símbolo del panel.")
+    # Solo se calculan las features que usa el modelo (con sus temporalidades superiores).
+    rows = np.ascontiguousarray(model_feature_matrix({'ts': ts, **panel}, names, INTERVAL)[-1])
+    valid = ~np.isnan(rows).any(axis=-1)
+    skipped = [symbol for symbol, ok in zip(symbols, valid) if not ok]
+    if skipped:
+        logging.warning(f"⚠️ [Panel] Sin histórico suficiente, se omiten: {', '.join(skipped)}")
+    if not valid.any():
+        return {}
+
+    predictions = model.predict(rows[valid])
+    scored = [symbol for symbol, ok in zip(symbols, valid) if ok]
+    return {symbol: int(prediction) for symbol, prediction in zip(scored, np.asarray(predictions))}
+
+
 if __name__ == '__main__':
     main_predict()
\ No newline at end of file
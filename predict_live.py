@@ -1,108 +1,136 @@
 # predict_live.py (Versión Sincronizada con el Modelo de Alta Frecuencia)
 
-import yfinance as yf
 import pandas as pd
-from joblib import load
+import numpy as np
 import logging
 import os
+from feature_engine import FEATURES, compute_feature_matrix
+from incremental_features import IncrementalFeatures
+from resampler import EXTRA_TIMEFRAMES, latest_timeframe_features, timeframe_feature_names
+from feature_cache import cached_prediction
+from fast_inference import get_predictor
+import candle_store
 
 # --- PARÁMETROS SINCRONIZADOS CON EL NUEVO MODELO DE 15 MINUTOS ---
 SYMBOL = "BTC-USD"
 # Usamos '7d' para tener suficientes datos para los indicadores (SMA de 50, etc.)
-# pero sin descargar datos innecesarios en cada ejecución.
+# cuando hay que reconstruir el estado de los indicadores desde cero.
 PERIOD = "7d" 
 # ¡CRÍTICO! El intervalo debe ser el mismo que en el entrenamiento.
 INTERVAL = "15m" 
+# Histórico de entrenamiento (train_model.PERIODO_DATOS): el OBV y las features de
+# temporalidades superiores se calculan sobre la misma ventana para que coincidan con
+# las del entrenamiento (el OBV es una suma acumulada desde la primera vela).
+PERIODO_DATOS = '60d'
 
-# Los parámetros de los indicadores son los mismos que en el entrenamiento.
-SMA_SHORT = 20
-SMA_LONG = 50
-RSI_WINDOW = 14
-MACD_FAST = 12
-MACD_SLOW = 26
-MACD_SIGNAL = 9
-STOCH_RSI_WINDOW = 14
-BB_WINDOW = 20
-ATR_WINDOW = 14
-MOMENTUM_WINDOW = 14
-
-# La lista de features debe ser idéntica.
-FEATURES = [
-    'sma_20', 'sma_50', 'rsi', 'macd', 'macd_signal', 'macd_diff', 
-    'stochrsi', 'obv', 'bb_width', 'atr', 'momentum', 'contexto_estrategia'
-]
+# Los parámetros de los indicadores y la lista de features viven en feature_engine.py.
 
 # La ruta del modelo no cambia.
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(PROJECT_ROOT, "models", "model.joblib")
+# Estado incremental de los indicadores, persistido entre ciclos.
+STATE_PATH = os.path.join(PROJECT_ROOT, "data", "feature_state_15m.json")
+
+
+def sync_candles():
+    """Sincroniza el almacén de velas (solo se descargan las velas nuevas)."""
+    try:
+        candle_store.sync(SYMBOL, INTERVAL)
+    except Exception as e:
+        logging.error(f"❌ [Predicción AF] Error al sincronizar velas: {e}")
+
+
+def update_feature_state(sync=True):
+    """
+    Carga el estado incremental de los indicadores y le aplica las velas cerradas
+    desde el último ciclo. Si no hay estado guardado (o hay un hueco de velas, p. ej.
+    tras una caída más larga de lo que el almacén pudo recuperar) se reconstruye
+    con PERIOD de histórico. El OBV se re-ancla en cada ciclo a la suma sobre
+    PERIODO_DATOS (window_obv).
+    """
+    if sync:
+        sync_candles()
+
+    state = IncrementalFeatures.load(STATE_PATH)
+    if state is not None and state.last_timestamp is not None:
+        candles = candle_store.load_arrays(SYMBOL, INTERVAL, start=state.last_timestamp + 1)
+        # Las ventanas de SMA, Bollinger y stochRSI no pueden saltar un hueco: se reconstruye el estado.
+        steps = np.diff(np.concatenate([[state.last_timestamp], candles['ts']]))
+        if (steps > candle_store.interval_seconds(INTERVAL)).any():
+            logging.warning("⚠️ [Predicción AF] Hueco de velas desde el último ciclo. Reconstruyendo estado...")
+            state = None
+        else:
+            for i in range(len(candles['ts'])):
+                state.update(candles['high'][i], candles['low'][i], candles['close'][i], candles['volume'][i],
+                             candles['ts'][i])
+            logging.info(f"⚙️ [Predicción AF] Estado de indicadores actualizado con {len(candles['ts'])} vela(s) nueva(s).")
+
+    if state is None or state.last_timestamp is None:
+        logging.info(f"⚙️ [Predicción AF] Construyendo estado de indicadores con {PERIOD} de histórico...")
+        latest = candle_store.last_timestamp(SYMBOL, INTERVAL)
+        if latest is None:
+            raise ConnectionError("No hay velas en el almacén local ni se pudieron descargar desde yfinance.")
+        start = latest - candle_store.period_seconds(PERIOD)
+        candles = candle_store.load_arrays(SYMBOL, INTERVAL, start=start)
+        state = IncrementalFeatures.from_history(candles['high'], candles['low'], candles['close'],
+                                                 candles['volume'], candles['ts'])
+
+    state.anchor_obv(window_obv(state.last_timestamp))
+    state.save(STATE_PATH)
+    return state
+
+
+def window_obv(last_ts, period=PERIODO_DATOS):
+    """
+    OBV de la vela `last_ts` calculado como en el entrenamiento: suma acumulada
+    desde la primera vela de los últimos `period` (anclado como candle_archive.load_period).
+    Sin re-anclar, el OBV del estado crecería desde su construcción y se alejaría
+    de la distribución de entrenamiento cada semana que el bot sigue en marcha.
+    """
+    candles = candle_store.load_arrays(SYMBOL, INTERVAL, start=last_ts - candle_store.period_seconds(period) + 1,
+                                       end=last_ts + 1)
+    return compute_feature_matrix(candles['high'], candles['low'], candles['close'], candles['volume'],
+                                  columns=['obv'])[-1, 0]
 
 
 def get_prediction():
     """
-    Obtiene la predicción del modelo de ALTA FRECUENCIA para la vela más reciente.
+    Obtiene la predicción del modelo de ALTA FRECUENCIA para la última vela cerrada.
+    Si otro proceso (p. ej. el otro bot) ya predijo esta vela con el mismo modelo,
+    se reutiliza su resultado desde la caché en disco.
     """
-    logging.info(f"📥 [Predicción AF] Descargando datos para {SYMBOL} (Intervalo: {INTERVAL})...")
-    
-    # 1. DESCARGA DE DATOS
-    df = yf.download(SYMBOL, period=PERIOD, interval=INTERVAL, auto_adjust=True, progress=False)
-    if df.empty:
-        logging.error("❌ [Predicción AF] No se pudieron descargar datos.")
-        raise ConnectionError("Fallo en la descarga de datos desde yfinance.")
-
-    # 2. CÁLCULO DE FEATURES (Lógica idéntica al entrenamiento)
-    logging.info("⚙️ [Predicción AF] Calculando features técnicas...")
-    # --- SMAs ---
-    df['sma_20'] = df['Close'].rolling(window=SMA_SHORT).mean()
-    df['sma_50'] = df['Close'].rolling(window=SMA_LONG).mean()
-    # --- RSI ---
-    delta = df['Close'].diff(1)
-    gain = delta.where(delta > 0, 0); loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.ewm(com=RSI_WINDOW - 1, min_periods=RSI_WINDOW).mean()
-    avg_loss = loss.ewm(com=RSI_WINDOW - 1, min_periods=RSI_WINDOW).mean()
-    df['rsi'] = 100 - (100 / (1 + (avg_gain / avg_loss)))
-    # --- MACD ---
-    ema_fast = df['Close'].ewm(span=MACD_FAST, adjust=False).mean()
-    ema_slow = df['Close'].ewm(span=MACD_SLOW, adjust=False).mean()
-    df['macd'] = ema_fast - ema_slow
-    df['macd_signal'] = df['macd'].ewm(span=MACD_SIGNAL, adjust=False).mean()
-    df['macd_diff'] = df['macd'] - df['macd_signal']
-    # --- Stochastic RSI ---
-    rsi_series = df['rsi']
-    min_rsi = rsi_series.rolling(window=STOCH_RSI_WINDOW).min()
-    max_rsi = rsi_series.rolling(window=STOCH_RSI_WINDOW).max()
-    df['stochrsi'] = (rsi_series - min_rsi) / (max_rsi - min_rsi)
-    # --- On-Balance Volume (OBV) ---
-    df['obv'] = (df['Volume'] * (~df['Close'].diff().le(0) * 2 - 1)).cumsum()
-    # --- Bollinger Bands Width ---
-    sma_bb = df['Close'].rolling(window=BB_WINDOW).mean()
-    std_bb = df['Close'].rolling(window=BB_WINDOW).std()
-    upper_bb = sma_bb + (std_bb * 2); lower_bb = sma_bb - (std_bb * 2)
-    df['bb_width'] = (upper_bb - lower_bb) / sma_bb
-    # --- Average True Range (ATR) ---
-    high_low = df['High'] - df['Low']
-    high_close = (df['High'] - df['Close'].shift()).abs()
-    low_close = (df['Low'] - df['Close'].shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    df['atr'] = tr.ewm(alpha=1/ATR_WINDOW, adjust=False).mean()
-    # --- Momentum ---
-    df['momentum'] = df['Close'].diff(MOMENTUM_WINDOW)
-    # --- Contexto Estrategia ---
-    df['contexto_estrategia'] = 0.0
-
-    # 3. LIMPIEZA Y PREPARACIÓN
-    df.dropna(inplace=True)
-    if df.empty:
-        raise ValueError("DataFrame vacío después de limpiar NaNs en el módulo de predicción.")
-
-    X = df[FEATURES]
-    
-    # 4. CARGA Y PREDICCIÓN
-    model = load(MODEL_PATH)
-    latest_data = X.tail(1)
-    prediction = model.predict(latest_data)[0]
+    logging.info(f"📥 [Predicción AF] Sincronizando velas nuevas para {SYMBOL} (Intervalo: {INTERVAL})...")
+    sync_candles()
+    last = candle_store.last_timestamp(SYMBOL, INTERVAL)
+    if last is None:
+        raise ConnectionError("No hay velas en el almacén local ni se pudieron descargar desde yfinance.")
+    return cached_prediction(SYMBOL, INTERVAL, last, MODEL_PATH, _predict_latest_candle)
+
+
+def _predict_latest_candle():
+    """Calcula la predicción de la última vela: devuelve (clase, fila de features)."""
+    # 1. ACTUALIZACIÓN INCREMENTAL DE FEATURES (O(1) por vela nueva)
+    state = update_feature_state(sync=False)
+
+    # 2. FILA DEL MODELO: solo las features que usa (si está podado, las conservadas), en su
+    # orden; las de temporalidades superiores solo se remuestrean si el modelo usa alguna.
+    predictor = get_predictor()
+    names = predictor.feature_names(FEATURES + timeframe_feature_names(EXTRA_TIMEFRAMES))
+    values = dict(zip(FEATURES, state.features))
+    extra = [name for name in names if name not in values]
+    if extra:
+        values.update(zip(extra, latest_timeframe_features(SYMBOL, INTERVAL, EXTRA_TIMEFRAMES, names=extra,
+                                                             period=PERIODO_DATOS)))
+    latest_row = np.array([values.get(name, np.nan) for name in names])
+    if np.isnan(latest_row).any():
+        raise ValueError("Los indicadores aún no tienen suficiente histórico para predecir.")
+
+    # 3. PREDICCIÓN: fila float32 en el orden del modelo sobre el booster nativo
+    # residente (o el modelo sklearn si aún no se exportó); se recarga solo si se reentrena.
+    prediction, probability = predictor.predict(latest_row)
     
-    logging.info(f"🤖 [Predicción AF] El modelo predice la clase para la próxima vela de 15m: {prediction}")
-    return int(prediction)
+    logging.info(f"🤖 [Predicción AF] El modelo predice la clase para la próxima vela de 15m: {prediction} (p={probability:.3f})")
+    return int(prediction), latest_row
 
 
 # Este bloque permite ejecutar el script directamente para hacer una prueba rápida.
@@ -0,0 +1,336 @@
+# resampler.py (Remuestreo Multi-Temporalidad desde una Única Serie Base)
+#
+# Construye velas de 5m, 15m, 1h, 4h... a partir de UNA serie base guardada en
+# candle_store (por defecto 1m) con agregación OHLCV vectorizada
+# (first/max/min/last/sum por cubo temporal), sin descargas extra a yfinance.
+#
+# - resample_ohlcv: remuestreo batch (np.maximum/minimum/add.reduceat).
+# - IncrementalResampler: mantiene la vela parcial y emite las velas completas
+#   a medida que llegan velas base nuevas.
+# - timeframe_feature_matrix: features de feature_engine calculadas en cada
+#   temporalidad superior y alineadas "as-of" con la serie base (solo se usan
+#   velas superiores YA cerradas, sin mirar al futuro).
+# - model_feature_matrix / model_feature_frame: las columnas que pide un modelo
+#   (FEATURES + '<feature>_<temporalidad>'), para que predict.py, backtest.py y
+#   los scripts calculen lo mismo que train_model.add_model_features.
+
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+import candle_store
+from feature_engine import FEATURE_SPEC, FEATURES, compute_feature_matrix
+
+BASE_INTERVAL = '1m'
+TIMEFRAMES = ['5m', '15m', '1h', '4h']
+# Temporalidades superiores que se añaden como features extra al modelo de
+# train_model.py / predict_live.py. Vacío = modelo solo con FEATURES (el modelo
+# guardado actualmente se entrenó así). Ejemplo: ['1h', '4h'].
+EXTRA_TIMEFRAMES = []
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def _empty_columns():
+    return {col: np.empty(0, dtype=np.int64 if col == 'ts' else np.float64) for col in candle_store.COLUMNS}
+
+
+def resample_ohlcv(columns, interval, base_interval=BASE_INTERVAL, complete_only=True):
+    """
+    Agrega velas base a una temporalidad superior.
+
+    Args:
+        columns (dict): arrays 'ts', 'open', 'high', 'low', 'close', 'volume' (ts ascendente).
+        interval (str): temporalidad destino, p. ej. '1h'.
+        base_interval (str): temporalidad de `columns`, p. ej. '1m'.
+        complete_only (bool): descarta la última vela si su periodo aún no ha terminado.
+
+    Returns:
+        dict: mismas columnas, una fila por vela de `interval` (ts = inicio del periodo).
+    """
+    step = candle_store.interval_seconds(interval)
+    base_step = candle_store.interval_seconds(base_interval)
+    if step % base_step:
+        raise ValueError(f"'{interval}' no es múltiplo de la temporalidad base '{base_interval}'.")
+    ts = np.asarray(columns['ts'], dtype=np.int64)
+    if len(ts) == 0:
+        return _empty_columns()
+
+    buckets = ts - ts % step
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+    ends = np.append(starts[1:], len(ts)) - 1
+    out = {
+        'ts': buckets[starts],
+        'open': np.asarray(columns['open'], dtype=np.float64)[starts],
+        'high': np.maximum.reduceat(np.asarray(columns['high'], dtype=np.float64), starts),
+        'low': np.minimum.reduceat(np.asarray(columns['low'], dtype=np.float64), starts),
+        'close': np.asarray(columns['close'], dtype=np.float64)[ends],
+        'volume': np.add.reduceat(np.asarray(columns['volume'], dtype=np.float64), starts),
+    }
+    if complete_only and ts[-1] + base_step < out['ts'][-1] + step:
+        out = {col: values[:-1] for col, values in out.items()}
+    return out
+
+
+class IncrementalResampler:
+    """
+    Remuestreo incremental: recibe velas base cerradas (en bloques de cualquier
+    tamaño) y devuelve solo las velas de `interval` que se completan con ellas.
+    """
+
+    def __init__(self, interval, base_interval=BASE_INTERVAL):
+        self.interval = interval
+        self.base_interval = base_interval
+        self.step = candle_store.interval_seconds(interval)
+        self.base_step = candle_store.interval_seconds(base_interval)
+        # Vela en curso (aún incompleta) como dict de escalares, o None.
+        self.partial = None
+
+    def update(self, columns):
+        """
+        Incorpora velas base nuevas.
+
+        Returns:
+            dict: velas de `interval` completadas (puede estar vacío).
+        """
+        ts = np.asarray(columns['ts'], dtype=np.int64)
+        if self.partial is not None:
+            keep = ts > self.partial['last_ts']
+            columns = {col: np.asarray(columns[col])[keep] for col in candle_store.COLUMNS}
+            ts = ts[keep]
+        if len(ts) == 0:
+            return _empty_columns()
+
+        # La vela parcial entra como primera fila de su cubo: first/max/min/last/sum siguen siendo correctos.
+        if self.partial is not None:
+            columns = {col: np.concatenate([[self.partial[col]], columns[col]]) for col in candle_store.COLUMNS}
+        bars = resample_ohlcv(columns, self.interval, self.base_interval, complete_only=False)
+
+        last_ts = int(ts[-1])
+        if last_ts + self.base_step < bars['ts'][-1] + self.step:
+            self.partial = {col: values[-1].item() for col, values in bars.items()}
+            self.partial['last_ts'] = last_ts
+            bars = {col: values[:-1] for col, values in bars.items()}
+        else:
+            self.partial = None
+        return bars
+
+    def to_dict(self):
+        return {'interval': self.interval, 'base_interval': self.base_interval, 'partial': self.partial}
+
+    @classmethod
+    def from_dict(cls, payload):
+        resampler = cls(payload['interval'], payload['base_interval'])
+        resampler.partial = payload['partial']
+        return resampler
+
+
+def load_resampled(symbol, interval, start=None, end=None, base_interval=BASE_INTERVAL, root=None):
+    """
+    Lee la serie base del almacén local y la remuestrea a `interval` (solo velas completas).
+    Es el equivalente a descargar `interval` de yfinance, pero sin red.
+    """
+    columns = candle_store.load_arrays(symbol, base_interval, start, end, root)
+    return resample_ohlcv(columns, interval, base_interval)
+
+
+def timeframe_feature_names(timeframes):
+    """Nombres de las features extra: 'rsi_1h', 'atr_4h', ..."""
+    return [f"{name}_{timeframe}" for timeframe in timeframes for name in FEATURES]
+
+
+def lookback_seconds(timeframes, spec=FEATURE_SPEC):
+    """Histórico necesario para que las features de la temporalidad más alta no sean NaN."""
+    if not timeframes:
+        return 0
+    warmup = max(value for key, value in spec.items() if isinstance(value, int)) * 3
+    return warmup * max(candle_store.interval_seconds(tf) for tf in timeframes)
+
+
+def timeframe_feature_matrix(columns, timeframes, base_interval, spec=FEATURE_SPEC, names=None):
+    """
+    Calcula FEATURES en cada temporalidad de `timeframes` y las alinea con la serie base.
+
+    A cada vela base se le asignan las features de la última vela superior que
+    ya había CERRADO al cierre de esa vela base (alineación as-of, sin fuga de futuro).
+
+    Args:
+        names (list opcional): subconjunto de timeframe_feature_names(timeframes) a
+            calcular (modelo podado); las temporalidades sin ninguna feature pedida
+            no se remuestrean.
+
+    Returns:
+        np.ndarray: matriz (n_velas_base, len(names)), columnas en el orden de
+        `names` (por defecto timeframe_feature_names(timeframes)).
+    """
+    names = timeframe_feature_names(timeframes) if names is None else list(names)
+    slot = {name: i for i, name in enumerate(names)}
+    ts = np.asarray(columns['ts'], dtype=np.int64)
+    base_step = candle_store.interval_seconds(base_interval)
+    out = np.full((len(ts), len(names)), np.nan)
+    for timeframe in timeframes:
+        wanted = [name for name in FEATURES if f"{name}_{timeframe}" in slot]
+        if not wanted:
+            continue
+        bars = resample_ohlcv(columns, timeframe, base_interval)
+        if len(bars['ts']) == 0:
+            continue
+        matrix = compute_feature_matrix(bars['high'], bars['low'], bars['close'], bars['volume'], spec, wanted)
+        bar_close = bars['ts'] + candle_store.interval_seconds(timeframe)
+        rows = np.searchsorted(bar_close, ts + base_step, side='right') - 1
+        available = rows >= 0
+        targets = [slot[f"{name}_{timeframe}"] for name in wanted]
+        out[np.ix_(np.flatnonzero(available), targets)] = matrix[rows[available]]
+    return out
+
+
+def frame_columns(df):
+    """Arrays 'ts', 'open', ... de un DataFrame de velas (columnas simples o MultiIndex de yfinance)."""
+    columns = {'ts': candle_store.epoch_seconds(df.index)}
+    for col, frame_col in candle_store.FRAME_COLUMNS.items():
+        columns[col] = np.asarray(df[frame_col], dtype=np.float64).reshape(-1)
+    return columns
+
+
+def add_timeframe_features(df, timeframes, base_interval):
+    """
+    Añade a un DataFrame de velas (índice temporal, columnas OHLCV de yfinance)
+    las features de temporalidades superiores. Devuelve (df, nombres añadidos).
+    """
+    if not timeframes:
+        return df, []
+    columns = frame_columns(df)
+    names = timeframe_feature_names(timeframes)
+    extra = pd.DataFrame(timeframe_feature_matrix(columns, timeframes, base_interval), index=df.index, columns=names)
+    logging.info(f"🕒 [Remuestreo] Features añadidas desde {', '.join(timeframes)} (base {base_interval}).")
+    return pd.concat([df, extra], axis=1), names
+
+
+def feature_timeframes(names):
+    """Temporalidades superiores que aparecen en una lista de features ('rsi_1h' -> '1h'), de menor a mayor."""
+    timeframes = set()
+    for name in names:
+        if name in FEATURES:
+            continue
+        base, _, timeframe = name.rpartition('_')
+        if base not in FEATURES or not timeframe[:-1].isdigit() or timeframe[-1:] not in 'mhd':
+            raise ValueError(f"Feature desconocida para el motor: '{name}'")
+        timeframes.add(timeframe)
+    return sorted(timeframes, key=candle_store.interval_seconds)
+
+
+def history_period(names, period):
+    """Periodo ('Nd') que cubre `period` y el calentamiento de la temporalidad más alta de `names`."""
+    seconds = max(candle_store.period_seconds(period), lookback_seconds(feature_timeframes(names)))
+    return f"{math.ceil(seconds / candle_store.DAY_SECONDS)}d"
+
+
+def model_feature_matrix(columns, names, base_interval, spec=FEATURE_SPEC):
+    """
+    Columnas `names` de un modelo en su orden: las de FEATURES con el motor
+    compartido y las '<feature>_<temporalidad>' remuestreando la serie base,
+    igual que train_model.add_model_features.
+
+    Args:
+        columns (dict): arrays 'ts', 'open', 'high', 'low', 'close', 'volume'; los
+            precios 1D (n_velas,) o 2D (n_velas, n_simbolos) para un panel de
+            candle_store.load_panel.
+        names (list): features del modelo (feature_engine.model_feature_names).
+
+    Returns:
+        np.ndarray: (n_velas, len(names)) o (n_velas, n_simbolos, len(names)).
+    """
+    names = list(names)
+    timeframes = feature_timeframes(names)
+    close = np.asarray(columns['close'], dtype=np.float64)
+    base = [i for i, name in enumerate(names) if name in FEATURES]
+    extra = [i for i, name in enumerate(names) if name not in FEATURES]
+    out = np.full(close.shape + (len(names),), np.nan)
+    out[..., base] = compute_feature_matrix(columns['high'], columns['low'], close, columns['volume'], spec,
+                                            [names[i] for i in base])
+    if not extra:
+        return out
+    extra_names = [names[i] for i in extra]
+    if close.ndim == 1:
+        out[:, extra] = timeframe_feature_matrix(columns, timeframes, base_interval, spec, extra_names)
+        return out
+    # Panel: cada símbolo se remuestrea desde su primera vela (antes hay NaN, ver load_panel).
+    ts = np.asarray(columns['ts'], dtype=np.int64)
+    valid = ~np.isnan(close)
+    for j in np.flatnonzero(valid.any(axis=0)):
+        first = int(np.argmax(valid[:, j]))
+        symbol = {'ts': ts[first:], **{col: np.asarray(columns[col], dtype=np.float64)[first:, j]
+                                       for col in PRICE_COLUMNS}}
+        out[first:, j, extra] = timeframe_feature_matrix(symbol, timeframes, base_interval, spec, extra_names)
+    return out
+
+
+def model_feature_frame(df, names, base_interval, spec=FEATURE_SPEC):
+    """
+    DataFrame plano (OHLCV + columnas `names` del modelo) con el mismo índice que
+    `df`, como feature_engine.build_feature_frame pero con las temporalidades superiores.
+    """
+    columns = frame_columns(df)
+    frame = pd.DataFrame({frame_col: columns[col] for col, frame_col in candle_store.FRAME_COLUMNS.items()},
+                         index=df.index)
+    features = pd.DataFrame(model_feature_matrix(columns, names, base_interval, spec), index=df.index,
+                            columns=list(names))
+    return pd.concat([frame, features], axis=1)
+
+
+def latest_timeframe_features(symbol, base_interval, timeframes, root=None, names=None, period=None):
+    """
+    Fila de features multi-temporalidad de la última vela base guardada (para predicción en vivo).
+    Con `names` (modelo podado) solo se calculan esas columnas, en ese orden.
+
+    Args:
+        period (str opcional): histórico sobre el que se calculan, anclado como
+            candle_archive.load_period (p. ej. el '60d' de entrenamiento). El OBV es una
+            suma acumulada desde la primera vela y las EWM arrastran su arranque, así
+            que solo con el mismo histórico la fila coincide con la de entrenamiento.
+            None = la ventana mínima de lookback_seconds (más rápida, aproximada).
+    """
+    if not timeframes:
+        return np.empty(0)
+    names = timeframe_feature_names(timeframes) if names is None else list(names)
+    if not names:
+        return np.empty(0)
+    last = candle_store.last_timestamp(symbol, base_interval, root)
+    if last is None:
+        return np.full(len(names), np.nan)
+    if period is not None:
+        start = last - candle_store.period_seconds(period) + 1
+    else:
+        start = last - lookback_seconds(timeframes)
+    columns = candle_store.load_arrays(symbol, base_interval, start=start, root=root)
+    return timeframe_feature_matrix(columns, timeframes, base_interval, names=names)[-1]
+
+
+# Este bloque permite ejecutar el script directamente para verificar el
+# remuestreo contra pandas y el modo incremental contra el batch.
+if __name__ == '__main__':
+    rng = np.random.default_rng(1)
+    n_rows = 20_000
+    ts = 1_700_000_040 + np.arange(n_rows, dtype=np.int64) * 60
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.001, n_rows)))
+    base = {'ts': ts, 'open': close * 0.9995, 'high': close * 1.001, 'low': close * 0.999,
+            'close': close, 'volume': rng.random(n_rows) * 10}
+
+    frame = pd.DataFrame({col: base[col] for col in PRICE_COLUMNS}, index=pd.to_datetime(ts, unit='s', utc=True))
+    for timeframe in TIMEFRAMES:
+        bars = resample_ohlcv(base, timeframe, complete_only=False)
+        rule = timeframe.replace('m', 'min')
+        expected = frame.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min',
+                                             'close': 'last', 'volume': 'sum'}).dropna()
+        same = all(np.allclose(bars[col], expected[col].to_numpy()) for col in PRICE_COLUMNS)
+
+        resampler = IncrementalResampler(timeframe)
+        chunks = [resampler.update({col: values[i:i + 37] for col, values in base.items()})
+                  for i in range(0, n_rows, 37)]
+        incremental = {col: np.concatenate([chunk[col] for chunk in chunks]) for col in candle_store.COLUMNS}
+        batch = resample_ohlcv(base, timeframe)
+        same_incremental = all(np.allclose(incremental[col], batch[col], rtol=1e-12) for col in candle_store.COLUMNS)
+        print(f"{timeframe:>4}: {len(bars['ts']):>6} velas | pandas: {'OK' if same else 'ERROR'} | "
+              f"incremental: {'OK' if same_incremental else 'ERROR'}")
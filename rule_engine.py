@@ -0,0 +1,243 @@
+# rule_engine.py (Motor de Reglas Declarativas - Máscaras Vectorizadas en una Pasada)
+#
+# simulate_trading.py tenía UNA estrategia fija (cruce SMA20/SMA50 con filtro de
+# RSI) y puntuaba sus señales con iterrows. Aquí las reglas son datos:
+#
+#     ('cross_above', 'sma_20', 'sma_50')        cruce al alza entre dos columnas
+#     ('cross_below', 'close', 'sma_50')         cruce a la baja
+#     ('gt', 'rsi', 70) / ('lt', ...) / ('ge', ...) / ('le', ...)   umbrales (columna o número)
+#     ('all', regla, regla, ...) / ('any', ...) / ('not', regla)    combinaciones AND / OR / NOT
+#
+# y una estrategia es {'name': ..., 'buy': regla, 'sell': regla}.
+#
+# Cientos de estrategias se compilan a máscaras booleanas sobre UNA matriz de
+# features compartida: cada condición atómica (un cruce, un umbral) se calcula
+# una sola vez y se reutiliza en todas las reglas que la usan, y las señales
+# se deduplican y puntúan como matrices (estrategias x velas), sin bucles por fila.
+#
+# Uso: python rule_engine.py [periodo]   (criba de la familia de reglas por defecto)
+
+import time
+
+import numpy as np
+import pandas as pd
+
+# Elementos (estrategias x velas) por lote: acota la memoria de las matrices de señales.
+CHUNK_ELEMENTS = 1 << 23
+COMPARISONS = {'gt': np.greater, 'lt': np.less, 'ge': np.greater_equal, 'le': np.less_equal}
+SCORE_COLUMNS = ['n_signals', 'total_return', 'mean_return', 'win_rate', 'long_return_pct']
+
+
+def rule_columns(df):
+    """Columnas disponibles para las reglas: FEATURES del motor compartido + precios y volumen."""
+    from feature_engine import FEATURES, compute_feature_matrix, ohlcv_arrays
+    high, low, close, volume = ohlcv_arrays(df)
+    matrix = compute_feature_matrix(high, low, close, volume)
+    columns = {name: matrix[:, i] for i, name in enumerate(FEATURES)}
+    columns.update({'open': df['Open'].to_numpy(dtype=np.float64), 'high': high, 'low': low,
+                    'close': close, 'volume': volume})
+    return columns
+
+
+class RuleCompiler:
+    """Evalúa reglas declarativas sobre un juego de columnas, memorizando las condiciones atómicas."""
+
+    def __init__(self, columns):
+        self.columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+        self.n_rows = len(next(iter(self.columns.values()))) if self.columns else 0
+        self._atoms = {}
+        self._previous = {}
+
+    def _operand(self, value, previous=False):
+        if isinstance(value, str):
+            if value not in self.columns:
+                raise KeyError(f"Columna desconocida en la regla: '{value}'.")
+            if not previous:
+                return self.columns[value]
+            if value not in self._previous:
+                shifted = np.empty(self.n_rows)
+                shifted[:1] = np.nan
+                shifted[1:] = self.columns[value][:-1]
+                self._previous[value] = shifted
+            return self._previous[value]
+        return float(value)
+
+    def _atom(self, rule):
+        """Cruces y umbrales: se calculan una vez y se reutilizan en todas las reglas."""
+        if rule not in self._atoms:
+            op, left, right = rule
+            if op in COMPARISONS:
+                mask = COMPARISONS[op](self._operand(left), self._operand(right))
+            elif op in ('cross_above', 'cross_below'):
+                before = np.less if op == 'cross_above' else np.greater
+                after = np.greater if op == 'cross_above' else np.less
+                mask = (before(self._operand(left, True), self._operand(right, True))
+                        & after(self._operand(left), self._operand(right)))
+            else:
+                raise ValueError(f"Operador de regla desconocido: '{op}'.")
+            self._atoms[rule] = np.broadcast_to(mask, (self.n_rows,))
+        return self._atoms[rule]
+
+    def mask(self, rule):
+        """Máscara booleana (n_velas,) de una regla. None equivale a 'nunca'."""
+        if rule is None:
+            return np.zeros(self.n_rows, dtype=bool)
+        rule = _freeze(rule)
+        op = rule[0]
+        if op == 'all':
+            return np.logical_and.reduce([self.mask(part) for part in rule[1:]])
+        if op == 'any':
+            return np.logical_or.reduce([self.mask(part) for part in rule[1:]])
+        if op == 'not':
+            return ~self.mask(rule[1])
+        return self._atom(rule)
+
+    def signals(self, strategies):
+        """Matriz int8 (estrategias x velas): 1 = compra, -1 = venta (prevalece, como en simulate_trading), 0 = nada."""
+        out = np.zeros((len(strategies), self.n_rows), dtype=np.int8)
+        for i, strategy in enumerate(strategies):
+            out[i][self.mask(strategy.get('buy'))] = 1
+            out[i][self.mask(strategy.get('sell'))] = -1
+        return out
+
+
+def _freeze(rule):
+    """Las reglas pueden venir como listas (p. ej. desde JSON): se pasan a tuplas para memorizarlas."""
+    if isinstance(rule, list):
+        return tuple(_freeze(part) for part in rule)
+    if isinstance(rule, tuple):
+        return tuple(_freeze(part) for part in rule)
+    return rule
+
+
+def dedupe_signals(signals):
+    """
+    Elimina las señales que repiten la anterior (BUY, BUY -> BUY), fila a fila de
+    la matriz: una señal se conserva si difiere de la última señal no nula previa.
+    """
+    signals = np.atleast_2d(signals)
+    n_rows = signals.shape[1]
+    present = signals != 0
+    last = np.where(present, np.arange(n_rows, dtype=np.int32), np.int32(-1))
+    np.maximum.accumulate(last, axis=1, out=last)
+    previous = np.full_like(last, -1)
+    previous[:, 1:] = last[:, :-1]
+    previous_signal = np.take_along_axis(signals, np.maximum(previous, 0), axis=1)
+    previous_signal[previous < 0] = 0
+    return np.where(present & (signals != previous_signal), signals, 0).astype(np.int8)
+
+
+def score_signals(events, close):
+    """
+    Puntuación de cada fila de señales deduplicadas, sin bucles por fila:
+      - total_return: suma de los retornos de señal a señal con su sentido (la
+        'ganancia total simulada' de simulate_trading; BUY gana si sube, SELL si baja).
+      - mean_return / win_rate: por señal con retorno conocido (no la última).
+      - long_return_pct: compuesto de estar comprado de cada BUY a la siguiente SELL
+        (o al final de los datos), como los bots que solo operan en largo.
+    """
+    events = np.atleast_2d(events)
+    close = np.asarray(close, dtype=np.float64)
+    n_strategies = events.shape[0]
+    rows, cols = np.nonzero(events)
+    direction = events[rows, cols].astype(np.float64)
+    # Siguiente señal de la misma fila (sin np.append: sin señales, los arrays quedan vacíos).
+    has_next = np.zeros(len(rows), dtype=bool)
+    has_next[:-1] = rows[1:] == rows[:-1]
+    next_cols = np.zeros_like(cols)
+    next_cols[:-1] = cols[1:]
+
+    segment = np.where(has_next, close[next_cols] / close[cols] - 1.0, 0.0) * direction
+    counts = np.bincount(rows, minlength=n_strategies)
+    scored = np.bincount(rows, weights=has_next, minlength=n_strategies)
+    total = np.bincount(rows, weights=segment, minlength=n_strategies)
+    wins = np.bincount(rows, weights=has_next & (segment > 0), minlength=n_strategies)
+
+    log_close = np.log(close)
+    exit_log = np.where(has_next, log_close[next_cols], log_close[-1]) if len(close) else np.zeros(0)
+    long_log = np.bincount(rows, weights=np.where(direction > 0, exit_log - log_close[cols], 0.0),
+                           minlength=n_strategies)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'n_signals': counts,
+            'total_return': total,
+            'mean_return': np.where(scored > 0, total / scored, np.nan),
+            'win_rate': np.where(scored > 0, wins / scored * 100, np.nan),
+            'long_return_pct': np.expm1(long_log) * 100,
+        })
+
+
+def screen_rules(strategies, columns, close=None, chunk_elements=CHUNK_ELEMENTS):
+    """
+    Evalúa y puntúa todas las estrategias sobre las mismas columnas.
+
+    Args:
+        columns (dict | RuleCompiler): columnas de features (o un compilador ya creado,
+            para reutilizar sus condiciones memorizadas).
+        close (array): precios para puntuar; por defecto columns['close'].
+
+    Returns:
+        pd.DataFrame: 'name' + SCORE_COLUMNS, una fila por estrategia, ordenado por total_return.
+    """
+    compiler = columns if isinstance(columns, RuleCompiler) else RuleCompiler(columns)
+    close = compiler.columns['close'] if close is None else close
+    per_chunk = max(1, chunk_elements // max(compiler.n_rows, 1))
+    scores = []
+    for start in range(0, len(strategies), per_chunk):
+        batch = strategies[start:start + per_chunk]
+        scores.append(score_signals(dedupe_signals(compiler.signals(batch)), close))
+    table = pd.concat(scores, ignore_index=True) if scores else pd.DataFrame(columns=SCORE_COLUMNS)
+    table.insert(0, 'name', [strategy.get('name', str(i)) for i, strategy in enumerate(strategies)])
+    return table.sort_values('total_return', ascending=False, ignore_index=True)
+
+
+def rule_family(rsi_levels=(None, 30, 40, 50, 60, 70, 80), momentum_filters=(None, 0)):
+    """
+    Familia de candidatas por defecto: cruces de (close, sma_20, sma_50) y de
+    MACD / señal, cada uno con filtros de RSI y de momentum para la compra.
+    La venta es el cruce contrario (como en simulate_trading.py).
+    """
+    crosses = [('close', 'sma_20'), ('close', 'sma_50'), ('sma_20', 'sma_50'), ('macd', 'macd_signal')]
+    strategies = []
+    for fast, slow in crosses:
+        for rsi_level in rsi_levels:
+            for momentum in momentum_filters:
+                buy = [('cross_above', fast, slow)]
+                if rsi_level is not None:
+                    buy.append(('lt', 'rsi', rsi_level))
+                if momentum is not None:
+                    buy.append(('gt', 'momentum', momentum))
+                for sell_rsi in (None, 30, 50):
+                    sell = ('cross_below', fast, slow)
+                    if sell_rsi is not None:
+                        sell = ('all', sell, ('gt', 'rsi', sell_rsi))
+                    name = (f"{fast}>{slow}" + (f" rsi<{rsi_level}" if rsi_level is not None else "")
+                            + (f" mom>{momentum}" if momentum is not None else "")
+                            + " | venta" + (f" rsi>{sell_rsi}" if sell_rsi is not None else ""))
+                    strategies.append({'name': name, 'buy': ('all', *buy), 'sell': sell})
+    return strategies
+
+
+# Este bloque permite ejecutar el script directamente para cribar la familia de
+# reglas sobre el archivo local de velas y medir el tiempo de la criba.
+if __name__ == '__main__':
+    import sys
+    from candle_archive import load_period
+
+    period = sys.argv[1] if len(sys.argv) > 1 else '60d'
+    data = load_period('BTC-USD', '15m', period)
+    if data.empty:
+        print("❌ Error: No se pudieron obtener los datos.")
+        sys.exit(1)
+    strategies = rule_family()
+
+    start = time.perf_counter()
+    columns = rule_columns(data)
+    features_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    table = screen_rules(strategies, columns)
+    elapsed = time.perf_counter() - start
+    print(f"--- Criba de {len(strategies)} reglas sobre {len(data):,} velas de 15m ---")
+    print(f"Features: {features_elapsed * 1e3:.0f} ms | reglas: {elapsed * 1e3:.0f} ms "
+          f"({len(strategies) * len(data) / elapsed / 1e6:.0f} M celdas/s)")
+    print(table.head(15).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
@@ -0,0 +1,153 @@
+# scripts/benchmark_feature_engine.py
+# Compara el rendimiento (velas por segundo) del motor de features vectorizado
+# (feature_engine.py) contra el código de pandas que antes estaba copiado en
+# train_model.py, predict.py, predict_live.py y backtest.py.
+#
+# Uso: python scripts/benchmark_feature_engine.py [n_velas ...]
+# Por defecto: 10k, 1M y 10M velas sintéticas de 15m.
+#
+# Modo panel: python scripts/benchmark_feature_engine.py panel [n_simbolos ...]
+# Compara un bucle por símbolo contra una sola pasada sobre el panel 2D y
+# verifica que las filas del panel (con un símbolo que empieza tarde) son las
+# mismas que las de cada símbolo calculado solo.
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# --- Añadir la raíz del proyecto al path ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from feature_engine import FEATURES, ohlcv_arrays, compute_feature_matrix
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+DEFAULT_PANEL_SIZES = [1, 10, 50, 200]
+# 7 días de velas de 15m: lo que usa una predicción en vivo.
+PANEL_ROWS = 7 * 96
+REPEATS = 3
+# Velas sin datos al inicio del último símbolo del panel (símbolo que empieza tarde).
+LATE_ROWS = 100
+
+
+def make_synthetic_candles(n_rows, seed=42):
+    """Genera un paseo aleatorio OHLCV con el formato de yfinance (índice temporal de 15m)."""
+    rng = np.random.default_rng(seed)
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n_rows)))
+    spread = close * rng.random(n_rows) * 0.002
+    return pd.DataFrame({
+        'Open': close,
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 1_000_000_000, n_rows),
+    }, index=pd.date_range('2020-01-01', periods=n_rows, freq='15min'))
+
+
+def pandas_features(data):
+    """Implementación de referencia: el cálculo con pandas que usaban los scripts originales."""
+    data['sma_20'] = data['Close'].rolling(window=20).mean()
+    data['sma_50'] = data['Close'].rolling(window=50).mean()
+    delta = data['Close'].diff(1)
+    gain = delta.where(delta > 0, 0); loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.ewm(com=14 - 1, min_periods=14).mean()
+    avg_loss = loss.ewm(com=14 - 1, min_periods=14).mean()
+    data['rsi'] = 100 - (100 / (1 + (avg_gain / avg_loss)))
+    ema_fast = data['Close'].ewm(span=12, adjust=False).mean()
+    ema_slow = data['Close'].ewm(span=26, adjust=False).mean()
+    data['macd'] = ema_fast - ema_slow
+    data['macd_signal'] = data['macd'].ewm(span=9, adjust=False).mean()
+    data['macd_diff'] = data['macd'] - data['macd_signal']
+    rsi_series = data['rsi']
+    min_rsi = rsi_series.rolling(window=14).min(); max_rsi = rsi_series.rolling(window=14).max()
+    data['stochrsi'] = (rsi_series - min_rsi) / (max_rsi - min_rsi)
+    data['obv'] = (data['Volume'] * (~data['Close'].diff().le(0) * 2 - 1)).cumsum()
+    sma_bb = data['Close'].rolling(window=20).mean()
+    std_bb = data['Close'].rolling(window=20).std()
+    upper_bb = sma_bb + (std_bb * 2); lower_bb = sma_bb - (std_bb * 2)
+    data['bb_width'] = (upper_bb - lower_bb) / sma_bb
+    high_low = data['High'] - data['Low']
+    high_close = (data['High'] - data['Close'].shift()).abs()
+    low_close = (data['Low'] - data['Close'].shift()).abs()
+    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+    data['atr'] = tr.ewm(alpha=1/14, adjust=False).mean()
+    data['momentum'] = data['Close'].diff(14)
+    data["contexto_estrategia"] = 0
+    return data
+
+
+def _best_time(func, repeats):
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark(n_rows):
+    candles = make_synthetic_candles(n_rows)
+    repeats = REPEATS if n_rows <= 1_000_000 else 1
+
+    pandas_time, reference = _best_time(lambda: pandas_features(candles.copy()), repeats)
+    high, low, close, volume = ohlcv_arrays(candles)
+    numpy_time, matrix = _best_time(lambda: compute_feature_matrix(high, low, close, volume), repeats)
+
+    expected = reference[FEATURES].to_numpy(dtype=np.float64)
+    del reference
+    same_nan = np.array_equal(np.isnan(expected), np.isnan(matrix))
+    valid = ~np.isnan(expected)
+    max_rel_error = float(np.max(np.abs(expected[valid] - matrix[valid]) / np.maximum(np.abs(expected[valid]), 1e-12)))
+
+    print(f"{n_rows:>12,} | {n_rows / pandas_time:>16,.0f} | {n_rows / numpy_time:>16,.0f} | "
+          f"{pandas_time / numpy_time:>7.1f}x | {'OK' if same_nan else 'NaN!'} {max_rel_error:.1e}")
+
+
+def benchmark_panel(n_symbols, n_rows=PANEL_ROWS):
+    rng = np.random.default_rng(n_symbols)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.002, (n_rows, n_symbols)), axis=0))
+    spread = close * rng.random((n_rows, n_symbols)) * 0.002
+    high, low = close + spread, close - spread
+    volume = rng.integers(1_000_000, 1_000_000_000, (n_rows, n_symbols)).astype(np.float64)
+    if n_symbols > 1:
+        # El último símbolo empieza tarde, como en candle_store.load_panel (NaN antes de su primera vela).
+        for array in (high, low, close, volume):
+            array[:LATE_ROWS, -1] = np.nan
+    starts = [LATE_ROWS if n_symbols > 1 and j == n_symbols - 1 else 0 for j in range(n_symbols)]
+    columns = [tuple(np.ascontiguousarray(a[starts[j]:, j]) for a in (high, low, close, volume))
+               for j in range(n_symbols)]
+
+    loop_time, per_symbol = _best_time(lambda: [compute_feature_matrix(*c) for c in columns], REPEATS)
+    panel_time, panel = _best_time(lambda: compute_feature_matrix(high, low, close, volume), REPEATS)
+
+    # Filas de cada símbolo calculado solo (desde su primera vela) en la rejilla del panel.
+    expected = np.full(panel.shape, np.nan)
+    for j, matrix in enumerate(per_symbol):
+        expected[starts[j]:, j] = matrix
+    valid = ~np.isnan(expected)
+    same_nan = np.array_equal(valid, ~np.isnan(panel))
+    max_rel_error = float(np.max(np.abs(expected[valid] - panel[valid]) / np.maximum(np.abs(expected[valid]), 1e-12)))
+    print(f"{n_symbols:>10} | {loop_time / n_symbols * 1e3:>14.3f} | {panel_time / n_symbols * 1e3:>14.3f} | "
+          f"{loop_time / panel_time:>7.1f}x | {'OK' if same_nan else 'NaN!'} {max_rel_error:.1e}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['panel']:
+        print(f"--- Benchmark del Modo Panel ({PANEL_ROWS} velas por símbolo, ms por símbolo) ---")
+        print(f"{'símbolos':>10} | {'bucle':>14} | {'panel':>14} | {'mejora':>8} | dif. relativa máx.")
+        print("-" * 70)
+        for size in [int(arg) for arg in sys.argv[2:]] or DEFAULT_PANEL_SIZES:
+            benchmark_panel(size)
+        sys.exit(0)
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print("--- Benchmark del Motor de Features (velas/segundo) ---")
+    print(f"{'velas':>12} | {'pandas (original)':>16} | {'feature_engine':>16} | {'mejora':>8} | dif. relativa máx. vs pandas")
+    print("-" * 85)
+    for size in sizes:
+        benchmark(size)
+    print("Nota: en series muy largas la desviación estándar móvil de pandas acumula deriva numérica;")
+    print("la diferencia en bb_width frente a pandas proviene de esa deriva, no del motor vectorizado.")
@@ -0,0 +1,311 @@
+# scripts/market_replay.py (Replay Determinista de Mercado para los Bots)
+#
+# Ejecuta los ciclos REALES de decisión de paper_trading_bot.run_bot y
+# scripts/real_time_bot.run_real_bot_cycle (puntuación por confluencia, SL/TP,
+# archivos de estado) contra velas grabadas o sintéticas, sin red:
+#   - Binance      -> ReplayBinanceClient (precio = cierre de la vela actual)
+#   - yfinance     -> ReplayYFinance (solo devuelve velas anteriores al reloj)
+#   - Telegram     -> ReplayNotifier (guarda los mensajes en memoria)
+#   - Sentimiento  -> señales deterministas a partir de una semilla
+# Sirve para medir el throughput de ciclos de punta a punta y detectar
+# regresiones de latencia offline.
+#
+# Uso: python scripts/market_replay.py [paper|real] [n_ciclos] [live]
+#   'live' ejecuta predict_live.get_prediction completo en cada ciclo.
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# --- Añadir la raíz del proyecto al path ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+import candle_store
+import feature_cache
+import predict_live
+from candle_archive import CandleArchive
+from feature_engine import FEATURES, model_feature_names
+from model_registry import get_model
+from resampler import model_feature_matrix
+
+# --- Configuración del Replay ---
+SYMBOL = 'BTC-USD'
+INTERVAL = '15m'
+DEFAULT_CYCLES = 5000
+SEED = 42
+# Presupuesto de latencia por ciclo (p99). Si se supera, el script sale con código 1.
+LATENCY_BUDGET_MS = 5.0
+
+
+# --- Sustitutos locales de los servicios externos ---
+class ReplayClock:
+    """Reloj del replay: el 'ahora' es el cierre de la vela que se está reproduciendo."""
+
+    def __init__(self, candles, step):
+        self.candles = candles
+        self.step = step
+        self.index = 0
+
+    @property
+    def now(self):
+        return int(self.candles['ts'][self.index]) + self.step
+
+    @property
+    def price(self):
+        return float(self.candles['close'][self.index])
+
+
+class ReplayBinanceClient:
+    """Imita los métodos de binance.client.Client que usan los bots."""
+
+    def __init__(self, clock, quote_balance=1000.0):
+        self.clock = clock
+        self.balances = {'USDT': Decimal(str(quote_balance)), 'BTC': Decimal('0')}
+        self.orders = []
+
+    def get_symbol_ticker(self, symbol):
+        return {'symbol': symbol, 'price': f"{self.clock.price:.2f}"}
+
+    def get_asset_balance(self, asset):
+        return {'asset': asset, 'free': str(self.balances.get(asset, Decimal('0')))}
+
+    def _fill(self, side, symbol, quantity):
+        price = Decimal(f"{self.clock.price:.2f}")
+        quantity = Decimal(str(quantity))
+        sign = 1 if side == 'BUY' else -1
+        self.balances['BTC'] += sign * quantity
+        self.balances['USDT'] -= sign * quantity * price
+        order = {'symbol': symbol, 'side': side, 'executedQty': str(quantity),
+                 'fills': [{'price': str(price), 'qty': str(quantity)}], 'ts': self.clock.now}
+        self.orders.append(order)
+        return order
+
+    def order_market_buy(self, symbol, quantity):
+        return self._fill('BUY', symbol, quantity)
+
+    def order_market_sell(self, symbol, quantity):
+        return self._fill('SELL', symbol, quantity)
+
+
+class ReplayYFinance:
+    """Imita yf.download: devuelve solo velas que ya existían según el reloj del replay."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.calls = 0
+
+    def download(self, symbol, period=None, interval=None, start=None, **kwargs):
+        self.calls += 1
+        ts = self.clock.candles['ts']
+        stop = int(np.searchsorted(ts, self.clock.now, side='left'))
+        if start is not None:
+            begin = int(np.searchsorted(ts, int(pd.Timestamp(start).timestamp()), side='left'))
+        else:
+            begin = int(np.searchsorted(ts, self.clock.now - candle_store.period_seconds(period), side='left'))
+        index = pd.to_datetime(ts[begin:stop], unit='s', utc=True)
+        return pd.DataFrame({frame_col: self.clock.candles[col][begin:stop]
+                             for col, frame_col in candle_store.FRAME_COLUMNS.items()}, index=index)
+
+
+class ReplayNotifier:
+    """Sustituye a send_telegram_message: acumula los mensajes en lugar de enviarlos."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_telegram_message(self, message):
+        self.messages.append(message)
+        return True
+
+
+# --- Datos del replay ---
+def synthetic_candles(n_rows, step, seed=SEED):
+    """Paseo aleatorio OHLCV determinista."""
+    rng = np.random.default_rng(seed)
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.003, n_rows)))
+    spread = close * rng.random(n_rows) * 0.003
+    start = 1_700_000_000 - 1_700_000_000 % step
+    return {
+        'ts': start + np.arange(n_rows, dtype=np.int64) * step,
+        'open': np.concatenate([[close[0]], close[:-1]]),
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.integers(1_000_000, 1_000_000_000, n_rows).astype(np.float64),
+    }
+
+
+def load_replay_candles(n_rows, step):
+    """Usa velas grabadas del archivo local si hay suficientes; si no, velas sintéticas."""
+    archive = CandleArchive(SYMBOL, INTERVAL)
+    if len(archive) >= n_rows:
+        view = archive.window()
+        return {col: np.asarray(values[-n_rows:]) for col, values in view.items()}, 'archivo local'
+    return synthetic_candles(n_rows, step), 'sintéticas'
+
+
+def precompute_predictions(candles):
+    """
+    Predicciones del modelo para todas las velas en una sola llamada (mismo motor
+    de features que en vivo). Sin modelo entrenado se usan predicciones pseudoaleatorias.
+    """
+    model = get_model(predict_live.MODEL_PATH) if os.path.exists(predict_live.MODEL_PATH) else None
+    # Solo las features que usa el modelo (las conservadas si está podado, con sus temporalidades superiores).
+    names = model_feature_names(model) if model is not None else FEATURES
+    features = model_feature_matrix(candles, names, INTERVAL)
+    predictions = np.full(len(features), -1, dtype=np.int64)
+    valid = ~np.isnan(features).any(axis=1)
+    if model is not None:
+        predictions[valid] = model.predict(features[valid])
+    else:
+        logging.warning("⚠️ [Replay] No hay modelo entrenado; se usan predicciones pseudoaleatorias.")
+        predictions[valid] = np.random.default_rng(SEED).integers(0, 2, int(valid.sum()))
+    return predictions, int(np.argmax(valid))
+
+
+def sentiment_series(n_rows, seed=SEED):
+    """Señales de sentimiento deterministas (-1, 0, 1) por vela."""
+    rng = np.random.default_rng(seed + 1)
+    return {name: rng.integers(-1, 2, n_rows) for name in ('twitter', 'fear_and_greed', 'news')}
+
+
+# --- Motor del Replay ---
+# Atributos del módulo del bot que el replay sustituye (se restauran al terminar).
+BOT_STAND_INS = ('get_prediction', 'get_all_sentiment_signals', 'get_binance_client', 'send_telegram_message')
+
+
+def _save_attributes(targets):
+    """Valores actuales de los atributos (objeto, nombre) que el replay va a sustituir."""
+    return [(owner, name, getattr(owner, name)) for owner, name in targets]
+
+
+def _restore_attributes(saved):
+    for owner, name, value in saved:
+        setattr(owner, name, value)
+
+
+def _install_stand_ins(bot, clock, client, notifier, predictions, sentiment, workdir, live_predictions):
+    """Sustituye las dependencias externas del módulo del bot por los sustitutos del replay."""
+    if live_predictions:
+        fake_yf = ReplayYFinance(clock)
+        candle_store.yf = fake_yf
+        candle_store.utc_now = lambda: clock.now
+        candle_store.CANDLE_DIR = os.path.join(workdir, 'candles')
+        feature_cache.CACHE_DIR = os.path.join(workdir, 'cache')
+        predict_live.STATE_PATH = os.path.join(workdir, 'feature_state.json')
+        bot.get_prediction = predict_live.get_prediction
+    else:
+        bot.get_prediction = lambda: int(predictions[clock.index])
+    bot.get_all_sentiment_signals = lambda: {name: int(values[clock.index]) for name, values in sentiment.items()}
+    bot.get_binance_client = lambda testnet=True: client
+    bot.send_telegram_message = notifier.send_telegram_message
+
+
+async def _replay_loop(cycle, clock, first, last):
+    latencies = np.empty(last - first)
+    for n, i in enumerate(range(first, last)):
+        clock.index = i
+        start = time.perf_counter()
+        await cycle()
+        latencies[n] = time.perf_counter() - start
+    return latencies
+
+
+def run_replay(bot_name='paper', n_cycles=DEFAULT_CYCLES, live_predictions=False):
+    """
+    Reproduce `n_cycles` velas a través del ciclo real del bot elegido.
+
+    Args:
+        bot_name (str): 'paper' (paper_trading_bot.run_bot) o 'real' (run_real_bot_cycle).
+        n_cycles (int): número de ciclos (uno por vela).
+        live_predictions (bool): si es True, cada ciclo ejecuta predict_live.get_prediction
+            completo (almacén de velas + estado incremental + modelo) en lugar de usar
+            predicciones precalculadas.
+
+    Returns:
+        dict: métricas de throughput, latencias y resultado de la simulación.
+    """
+    step = candle_store.interval_seconds(INTERVAL)
+    warmup = 200 if live_predictions else 0
+    candles, source = load_replay_candles(n_cycles + warmup + 60, step)
+    predictions, first_valid = precompute_predictions(candles)
+    sentiment = sentiment_series(len(candles['ts']))
+    clock = ReplayClock(candles, step)
+    client = ReplayBinanceClient(clock)
+    notifier = ReplayNotifier()
+    first = max(first_valid, warmup)
+    last = min(first + n_cycles, len(candles['ts']))
+
+    if bot_name == 'paper':
+        import paper_trading_bot as bot
+        bot_files = ('PORTFOLIO_FILE', 'MAX_TRADES')
+    else:
+        from scripts import real_time_bot as bot
+        bot_files = ('TRADE_STATE_FILE',)
+    # Todo lo que se sustituye (almacén, caché, estado y dependencias del bot) se guarda
+    # aquí y se restaura en el finally: el módulo del bot no puede quedar apuntando a los
+    # sustitutos ni al directorio temporal ya borrado.
+    saved_cwd = os.getcwd()
+    saved = _save_attributes([(candle_store, 'yf'), (candle_store, 'utc_now'), (candle_store, 'CANDLE_DIR'),
+                              (predict_live, 'STATE_PATH'), (feature_cache, 'CACHE_DIR')]
+                             + [(bot, name) for name in BOT_STAND_INS + bot_files])
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory(prefix='replay_') as workdir:
+        os.chdir(workdir)
+        try:
+            if bot_name == 'paper':
+                bot.PORTFOLIO_FILE = os.path.join(workdir, 'portfolio_state.json')
+                bot.MAX_TRADES = 10 ** 9
+                bot.initialize_portfolio()
+                cycle = bot.run_bot
+            else:
+                bot.TRADE_STATE_FILE = os.path.join(workdir, 'trade_state.json')
+                cycle = bot.run_real_bot_cycle
+            _install_stand_ins(bot, clock, client, notifier, predictions, sentiment, workdir, live_predictions)
+
+            started = time.perf_counter()
+            latencies = asyncio.run(_replay_loop(cycle, clock, first, last))
+            elapsed = time.perf_counter() - started
+            final_state = bot.get_portfolio_state() if bot_name == 'paper' else bot.get_trade_state()
+        finally:
+            os.chdir(saved_cwd)
+            _restore_attributes(saved)
+            logging.disable(logging.NOTSET)
+
+    return {
+        'bot': bot_name,
+        'source': source,
+        'cycles': len(latencies),
+        'cycles_per_second': len(latencies) / elapsed if elapsed else float('inf'),
+        'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+        'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+        'max_ms': float(latencies.max() * 1e3),
+        'orders': len(client.orders),
+        'notifications': len(notifier.messages),
+        'final_state': final_state,
+    }
+
+
+if __name__ == '__main__':
+    bot_name = sys.argv[1] if len(sys.argv) > 1 else 'paper'
+    n_cycles = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CYCLES
+    live_predictions = len(sys.argv) > 3 and sys.argv[3] == 'live'
+    print(f"--- Replay de mercado: bot '{bot_name}', {n_cycles} ciclos{' (predicción en vivo)' if live_predictions else ''} ---")
+    report = run_replay(bot_name, n_cycles, live_predictions)
+    print(f"Velas: {report['source']} | Ciclos: {report['cycles']} | "
+          f"Throughput: {report['cycles_per_second']:,.0f} ciclos/s")
+    print(f"Latencia por ciclo: p50={report['p50_ms']:.3f} ms, p99={report['p99_ms']:.3f} ms, máx={report['max_ms']:.3f} ms")
+    print(f"Órdenes: {report['orders']} | Notificaciones: {report['notifications']}")
+    print(f"Estado final: {report['final_state']}")
+    if report['p99_ms'] > LATENCY_BUDGET_MS:
+        print(f"❌ Regresión de latencia: p99 {report['p99_ms']:.3f} ms > presupuesto {LATENCY_BUDGET_MS} ms")
+        sys.exit(1)
+    print("✅ Latencia dentro del presupuesto.")
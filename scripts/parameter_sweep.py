@@ -0,0 +1,191 @@
+# scripts/parameter_sweep.py (Barrido Paralelo de Parámetros de Riesgo y Confluencia)
+#
+# Evalúa miles de combinaciones de STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT,
+# umbrales de compra/venta (±3.0) y pesos de la confluencia (2/1.5/1/0.5) con
+# el backtest de reglas de riesgo (backtest_engine.run_risk_backtest).
+#
+# - Los arrays (OHLC, predicciones del modelo y sentimiento) se copian UNA vez
+#   a memoria compartida (multiprocessing.shared_memory); los procesos del pool
+#   solo reciben su nombre y crean vistas NumPy sin copiar ni serializar datos.
+# - Cada tarea evalúa un lote de combinaciones; los resultados se van
+#   escribiendo en un CSV a medida que llegan y se mantiene un ranking.
+#
+# Sentimiento histórico: si existe data/sentiment_history.csv (columnas ts,
+# twitter, fear_and_greed, news) se alinea con las velas; si no, se usa 0
+# (neutral), como hace get_all_sentiment_signals cuando falla una fuente.
+#
+# Uso: python scripts/parameter_sweep.py [n_procesos]
+
+import csv
+import heapq
+import itertools
+import os
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+import pandas as pd
+
+# --- Añadir la raíz del proyecto al path ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from backtest_engine import INITIAL_CAPITAL, align_sentiment, confluence_signals, max_drawdown_pct, run_risk_backtest
+
+# --- Configuración del Barrido ---
+TICKER = 'BTC-USD'
+INTERVAL = '15m'
+PERIOD = '60d'
+FEE_RATE = 0.001
+SENTIMENT_FILE = os.path.join(PROJECT_ROOT, 'data', 'sentiment_history.csv')
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'data', 'sweeps')
+PARAM_GRID = {
+    'stop_loss_pct': [0.75, 1.0, 1.5, 2.0, 3.0],
+    'take_profit_pct': [1.5, 2.0, 3.0, 4.5, 6.0],
+    'buy_threshold': [2.0, 3.0, 3.5],
+    'sell_threshold': [2.0, 3.0],
+    'w_tech': [1.5, 2.0, 3.0],
+    'w_twitter': [1.0, 1.5],
+    'w_fear_and_greed': [0.5, 1.0],
+    'w_news': [0.5, 1.0],
+}
+# Combinaciones por tarea: lotes grandes amortizan la comunicación entre procesos.
+BATCH_SIZE = 32
+TOP_N = 20
+ROWS = ['open', 'high', 'low', 'close', 'prediction', 'twitter', 'fear_and_greed', 'news']
+RESULT_FIELDS = list(PARAM_GRID) + ['final_balance', 'return_pct', 'n_trades', 'win_rate', 'max_drawdown_pct']
+
+
+# --- Datos ---
+def load_sweep_arrays():
+    """Velas + predicciones del modelo (una sola llamada a predict) + sentimiento, como matriz (8, n)."""
+    from candle_archive import load_period
+    from candle_store import epoch_seconds
+    from feature_engine import model_feature_names
+    from model_registry import get_model
+    from resampler import model_feature_frame
+
+    model = get_model()
+    names = model_feature_names(model)
+    data = model_feature_frame(load_period(TICKER, INTERVAL, PERIOD), names, INTERVAL).dropna()
+    if data.empty:
+        raise ValueError("No hay velas suficientes para el barrido.")
+    predictions = model.predict(data[names].to_numpy())
+    sentiment, recorded = align_sentiment(epoch_seconds(data.index), SENTIMENT_FILE)
+    if not recorded:
+        print("ℹ️ Sin histórico de sentimiento: se usa 0 (neutral) en todas las velas.")
+    columns = [data['Open'], data['High'], data['Low'], data['Close'], predictions,
+               sentiment['twitter'], sentiment['fear_and_greed'], sentiment['news']]
+    return np.vstack([np.asarray(col, dtype=np.float64) for col in columns])
+
+
+# --- Procesos del pool ---
+_shared = {}
+
+
+def _attach(name, shape):
+    """Inicializador de cada proceso: vista NumPy sobre el bloque de memoria compartida."""
+    block = shared_memory.SharedMemory(name=name)
+    _shared['block'] = block  # Se mantiene la referencia mientras viva el proceso.
+    _shared['arrays'] = dict(zip(ROWS, np.ndarray(shape, dtype=np.float64, buffer=block.buf)))
+
+
+def evaluate(params, arrays):
+    """Backtest de una combinación de parámetros."""
+    weights = {'tech': params['w_tech'], 'twitter': params['w_twitter'],
+               'fear_and_greed': params['w_fear_and_greed'], 'news': params['w_news']}
+    sentiment = {name: arrays[name] for name in ('twitter', 'fear_and_greed', 'news')}
+    signals = confluence_signals(arrays['prediction'], sentiment, weights,
+                                 params['buy_threshold'], params['sell_threshold'])
+    result = run_risk_backtest(arrays['high'], arrays['low'], arrays['close'], signals,
+                               params['stop_loss_pct'], params['take_profit_pct'],
+                               INITIAL_CAPITAL, FEE_RATE, open_=arrays['open'])
+    trades = result['trades']
+    return {
+        **params,
+        'final_balance': round(result['final_balance'], 4),
+        'return_pct': round(result['return_pct'], 4),
+        'n_trades': len(trades),
+        'win_rate': round(float((trades['pnl'] > 0).mean() * 100), 2) if len(trades) else 0.0,
+        'max_drawdown_pct': round(max_drawdown_pct(result['equity']), 4),
+    }
+
+
+def _evaluate_batch(batch):
+    return [evaluate(params, _shared['arrays']) for params in batch]
+
+
+def parameter_grid(grid=PARAM_GRID):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def run_sweep(arrays, grid=PARAM_GRID, processes=None, output_path=None):
+    """
+    Evalúa todas las combinaciones de `grid` en paralelo.
+
+    Args:
+        arrays (np.ndarray): matriz (len(ROWS), n_velas) float64.
+        processes (int): procesos del pool (por defecto, todos los núcleos).
+        output_path (str): CSV donde se escriben los resultados a medida que llegan.
+
+    Returns:
+        list: las TOP_N mejores combinaciones por rentabilidad.
+    """
+    combos = parameter_grid(grid)
+    batches = [combos[i:i + BATCH_SIZE] for i in range(0, len(combos), BATCH_SIZE)]
+    processes = processes or os.cpu_count() or 1
+
+    block = shared_memory.SharedMemory(create=True, size=arrays.nbytes)
+    try:
+        np.ndarray(arrays.shape, dtype=np.float64, buffer=block.buf)[:] = arrays
+        top = []
+        done = 0
+        last_report = 0.0
+        start = time.perf_counter()
+        with open(output_path or os.devnull, 'w', newline='') as f, \
+                Pool(processes, initializer=_attach, initargs=(block.name, arrays.shape)) as pool:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for results in pool.imap_unordered(_evaluate_batch, batches):
+                writer.writerows(results)
+                f.flush()
+                for result in results:
+                    # Montículo de tamaño TOP_N: ranking en streaming sin ordenar todo.
+                    item = (result['return_pct'], done, result)
+                    if len(top) < TOP_N:
+                        heapq.heappush(top, item)
+                    else:
+                        heapq.heappushpop(top, item)
+                    done += 1
+                elapsed = time.perf_counter() - start
+                if elapsed - last_report >= 1.0 or done == len(combos):
+                    last_report = elapsed
+                    print(f"\r⏳ {done}/{len(combos)} combinaciones ({done / elapsed:,.0f}/s) | "
+                          f"mejor: {max(top)[0]:.2f}%", end='', flush=True)
+        print()
+    finally:
+        block.close()
+        block.unlink()
+    return [item[2] for item in sorted(top, reverse=True)]
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    print("--- Barrido de Parámetros de Riesgo y Confluencia ---")
+    arrays = load_sweep_arrays()
+    n_combos = len(parameter_grid())
+    print(f"{arrays.shape[1]} velas | {n_combos} combinaciones | {processes or os.cpu_count()} proceso(s)")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_path = os.path.join(OUTPUT_DIR, f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    start = time.perf_counter()
+    ranking = run_sweep(arrays, processes=processes, output_path=output_path)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n✅ Barrido completado en {elapsed:.1f} s ({n_combos / elapsed:,.0f} combinaciones/s). "
+          f"Resultados en '{output_path}'.")
+    print(f"\n--- TOP {len(ranking)} por rentabilidad ---")
+    print(pd.DataFrame(ranking, columns=RESULT_FIELDS).to_string(index=False))
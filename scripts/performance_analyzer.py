@@ -13,21 +13,16 @@ TRADES_LOG_FILE = os.path.join(LOGS_DIR, 'paper_trades.log')
 OUTPUT_DIR = 'output'
 PERFORMANCE_CHART_FILE = os.path.join(OUTPUT_DIR, 'performance_curve.png')
 INITIAL_CAPITAL = 1000.0
+# Valor fijo que usa el bot de papel en cada compra.
+POSITION_USD = 20.0
 
-def analyze_performance():
-    """
-    Lee el log de paper trading, calcula métricas de rendimiento clave,
-    y genera un gráfico de la curva de equity.
+def parse_trades_log(path=TRADES_LOG_FILE):
     """
-    logging.info("--- Iniciando Análisis de Rendimiento del Bot ---")
-
-    if not os.path.exists(TRADES_LOG_FILE):
-        print(f"❌ Error: No se encontró el archivo de log en '{TRADES_LOG_FILE}'.")
-        return
+    Reconstruye las operaciones y el historial del portafolio a partir del log de paper trading.
 
-    # --- 1. Leer y Parsear el Log para construir el historial del portafolio ---
-    print(f"📄 Leyendo log de operaciones desde: {TRADES_LOG_FILE}")
-    
+    Returns:
+        tuple: (lista de operaciones BUY/SELL, historial [{'date', 'value'}, ...]).
+    """
     buy_pattern = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}).* COMPRA .* a \$([\d\.]+)")
     sell_pattern = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}).* VENTA \((.*?)\).* a \$([\d\.]+)\. P&L de la operación: \$(.*)")
     
@@ -37,7 +32,7 @@ def analyze_performance():
     current_cash = INITIAL_CAPITAL
     last_buy_value = 0
 
-    with open(TRADES_LOG_FILE, 'r') as f:
+    with open(path, 'r') as f:
         for line in f:
             buy_match = buy_pattern.search(line)
             sell_match = sell_pattern.search(line)
@@ -46,7 +41,7 @@ def analyze_performance():
                 date = pd.to_datetime(buy_match.group(1))
                 price = float(buy_match.group(2))
                 # Asumimos que cada compra usa un valor fijo, ej. 20 USD
-                last_buy_value = 20.0 
+                last_buy_value = POSITION_USD
                 current_cash -= last_buy_value
                 trades.append({'type': 'BUY', 'price': price, 'date': date})
                 
@@ -63,6 +58,23 @@ def analyze_performance():
                     pnl_percent = (pnl_usd / last_buy_value) * 100
                     trades.append({'type': 'SELL', 'price': float(sell_match.group(3)), 'date': date, 'pnl_percent': pnl_percent})
                     portfolio_history.append({'date': date, 'value': current_cash})
+    return trades, portfolio_history
+
+def analyze_performance():
+    """
+    Lee el log de paper trading, calcula métricas de rendimiento clave,
+    y genera un gráfico de la curva de equity.
+    """
+    logging.info("--- Iniciando Análisis de Rendimiento del Bot ---")
+
+    if not os.path.exists(TRADES_LOG_FILE):
+        print(f"❌ Error: No se encontró el archivo de log en '{TRADES_LOG_FILE}'.")
+        return
+
+    # --- 1. Leer y Parsear el Log para construir el historial del portafolio ---
+    print(f"📄 Leyendo log de operaciones desde: {TRADES_LOG_FILE}")
+    
+    trades, portfolio_history = parse_trades_log(TRADES_LOG_FILE)
 
     if len([t for t in trades if t['type'] == 'SELL']) == 0:
         print("ℹ️ No hay operaciones de VENTA completas para un análisis de rendimiento.")
@@ -0,0 +1,248 @@
+# scripts/robustness_analyzer.py (Análisis de Robustez Monte Carlo / Bootstrap de las Operaciones)
+#
+# performance_analyzer.py da UN win rate y UN profit factor, los de la secuencia
+# de operaciones que ocurrió. Aquí se remuestrea la serie de retornos por
+# operación decenas de miles de veces para ver qué parte del resultado es suerte:
+#   - 'bootstrap': bootstrap por bloques (bloques consecutivos de BLOCK_SIZE
+#     operaciones, circular) -> conserva rachas y autocorrelación local.
+#   - 'shuffle': reordenación aleatoria de las mismas operaciones (por bloques de
+#     BLOCK_SIZE; 1 = permutación pura). El capital final y el profit factor no
+#     cambian con el orden; solo el drawdown.
+# y se dan intervalos de confianza del capital final, el drawdown máximo y el
+# profit factor.
+#
+# Todo el remuestreo es NumPy por lotes. Cada bloque posible se resume una vez
+# (crecimiento, pico, valle, drawdown interno, ganancias y pérdidas) y cada
+# remuestreo es una fila de índices de bloque: las curvas se componen sobre una
+# matriz (remuestreos x bloques), BLOCK_SIZE veces más pequeña que la de
+# operaciones, en trozos de a lo sumo CHUNK_ELEMENTS elementos (memoria acotada).
+#
+# Uso: python scripts/robustness_analyzer.py [log|backtest|demo] [n_remuestreos]
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- Añadir la raíz del proyecto al path ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_engine import INITIAL_CAPITAL
+
+# --- Configuración del Análisis ---
+N_RESAMPLES = 100_000
+BLOCK_SIZE = 10
+# Elementos (remuestreos x bloques) por trozo: 4M -> ~32 MB por matriz float64.
+CHUNK_ELEMENTS = 1 << 22
+PERCENTILES = [5, 50, 95]
+SEED = 42
+METRICS = ['final_equity', 'max_drawdown_pct', 'profit_factor']
+
+
+def block_summaries(log_growth, gains, losses, starts, length):
+    """
+    Resumen de los bloques de `length` operaciones que empiezan en `starts`
+    (circulares): crecimiento total, máximo y mínimo de la curva dentro del
+    bloque, drawdown interno y suma de ganancias/pérdidas. Con estos cinco
+    números se compone cualquier secuencia de bloques sin volver a recorrer
+    cada operación.
+    """
+    n_trades = len(log_growth)
+    window = (np.asarray(starts)[:, None] + np.arange(length)) % n_trades
+    curve = np.cumsum(log_growth[window], axis=1)
+    running_peak = np.maximum(np.maximum.accumulate(curve, axis=1), 0.0)
+    return {
+        'total': curve[:, -1],
+        'peak': running_peak[:, -1],
+        'trough': np.minimum(curve.min(axis=1), 0.0),
+        'drawdown': (curve - running_peak).min(axis=1),
+        'gain': gains[window].sum(axis=1),
+        'loss': losses[window].sum(axis=1),
+    }
+
+
+def _concat_summaries(*tables):
+    return {key: np.concatenate([table[key] for table in tables]) for key in tables[0]}
+
+
+def compose_blocks(table, ids, path_only=False):
+    """
+    Métricas de cada fila de `ids` (secuencia de bloques de `table`).
+
+    Con L = nivel (log) al empezar el bloque y P = pico previo, el peor punto
+    dentro del bloque es min(L + trough - P, drawdown interno), y el pico pasa a
+    ser max(P, L + peak). Todo son cumsum / maximum.accumulate sobre la matriz
+    de bloques, block_size veces más pequeña que la de operaciones.
+    """
+    totals = table['total'][ids]
+    level = np.cumsum(totals, axis=1)
+    final = level[:, -1].copy()
+    level -= totals  # Nivel al inicio de cada bloque.
+    peak = np.maximum.accumulate(level + table['peak'][ids], axis=1)
+    prior_peak = np.zeros_like(peak)
+    prior_peak[:, 1:] = peak[:, :-1]  # Pico alcanzado antes del bloque (el capital inicial cuenta).
+    worst = np.minimum(level + table['trough'][ids] - prior_peak, table['drawdown'][ids]).min(axis=1)
+    metrics = {'max_drawdown_pct': np.expm1(worst) * 100}
+    if not path_only:
+        metrics['final_log_growth'] = final
+        total_gain = table['gain'][ids].sum(axis=1)
+        total_loss = -table['loss'][ids].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics['profit_factor'] = np.where(total_loss > 0, total_gain / total_loss, np.inf)
+    return metrics
+
+
+def _prepare(trade_returns, exposure):
+    returns = np.asarray(trade_returns, dtype=np.float64)
+    if returns.ndim != 1 or len(returns) == 0:
+        raise ValueError("Se necesita al menos una operación cerrada.")
+    # Cada operación arriesga `exposure` del capital: el capital se multiplica por (1 + exposure * r).
+    log_growth = np.log1p(exposure * returns)
+    return returns, log_growth, np.maximum(returns, 0.0), np.minimum(returns, 0.0)
+
+
+def observed_metrics(trade_returns, exposure=1.0, initial_capital=INITIAL_CAPITAL):
+    """Las mismas métricas sobre la secuencia real de operaciones (un único bloque)."""
+    returns, log_growth, gains, losses = _prepare(trade_returns, exposure)
+    table = block_summaries(log_growth, gains, losses, [0], len(returns))
+    metrics = compose_blocks(table, np.zeros((1, 1), dtype=np.intp))
+    return {
+        'final_equity': float(initial_capital * np.exp(metrics['final_log_growth'][0])),
+        'max_drawdown_pct': float(metrics['max_drawdown_pct'][0]),
+        'profit_factor': float(metrics['profit_factor'][0]),
+    }
+
+
+def monte_carlo(trade_returns, n_resamples=N_RESAMPLES, method='bootstrap', block_size=BLOCK_SIZE,
+                exposure=1.0, initial_capital=INITIAL_CAPITAL, chunk_elements=CHUNK_ELEMENTS, seed=SEED):
+    """
+    Remuestrea los retornos por operación y devuelve las métricas de cada remuestreo.
+
+    - 'bootstrap': n // block_size bloques con inicio aleatorio (circulares) y, si
+      sobra, un bloque final más corto, hasta sumar tantas operaciones como la serie.
+    - 'shuffle': la serie se parte en bloques consecutivos y se reordenan los
+      bloques al azar (block_size=1 es una permutación de operaciones pura).
+
+    Args:
+        trade_returns (array): retorno de cada operación en fracción (0.01 = +1%).
+        exposure (float): fracción del capital que usa cada operación (1.0 = todo, como backtest_engine).
+
+    Returns:
+        dict: arrays de longitud n_resamples para cada nombre de METRICS.
+    """
+    if method not in ('bootstrap', 'shuffle'):
+        raise ValueError(f"Método de remuestreo desconocido: '{method}' (usa 'bootstrap' o 'shuffle').")
+    returns, log_growth, gains, losses = _prepare(trade_returns, exposure)
+    n_trades = len(returns)
+    block_size = max(1, min(block_size, n_trades))
+    n_full, remainder = divmod(n_trades, block_size)
+    if method == 'bootstrap':
+        # Tabla con todos los inicios posibles: [0, n) bloques completos, [n, 2n) el bloque final corto.
+        tables = [block_summaries(log_growth, gains, losses, np.arange(n_trades), block_size)]
+        if remainder:
+            tables.append(block_summaries(log_growth, gains, losses, np.arange(n_trades), remainder))
+    else:
+        tables = [block_summaries(log_growth, gains, losses, np.arange(n_full) * block_size, block_size)]
+        if remainder:
+            tables.append(block_summaries(log_growth, gains, losses, [n_full * block_size], remainder))
+    table = _concat_summaries(*tables)
+    n_blocks = n_full + (remainder > 0)
+
+    rng = np.random.default_rng(seed)
+    out = {name: np.empty(n_resamples) for name in METRICS}
+    if method == 'shuffle':
+        # Invariantes al orden: basta con la secuencia observada.
+        observed = observed_metrics(returns, exposure, initial_capital)
+        out['final_equity'][:] = observed['final_equity']
+        out['profit_factor'][:] = observed['profit_factor']
+
+    rows = max(1, chunk_elements // n_blocks)
+    for start in range(0, n_resamples, rows):
+        stop = min(start + rows, n_resamples)
+        if method == 'bootstrap':
+            ids = rng.integers(0, n_trades, size=(stop - start, n_blocks))
+            if remainder:
+                ids[:, -1] += n_trades
+        else:
+            ids = rng.permuted(np.tile(np.arange(n_blocks), (stop - start, 1)), axis=1)
+        metrics = compose_blocks(table, ids, path_only=method == 'shuffle')
+        out['max_drawdown_pct'][start:stop] = metrics['max_drawdown_pct']
+        if method == 'bootstrap':
+            out['final_equity'][start:stop] = initial_capital * np.exp(metrics['final_log_growth'])
+            out['profit_factor'][start:stop] = metrics['profit_factor']
+    return out
+
+
+def summarize(samples, observed, initial_capital=INITIAL_CAPITAL, percentiles=PERCENTILES):
+    """Tabla con el valor observado y los percentiles de cada métrica."""
+    rows = []
+    for name in METRICS:
+        row = {'metric': name, 'observado': observed[name]}
+        row.update({f"p{p}": value for p, value in zip(percentiles, np.percentile(samples[name], percentiles))})
+        rows.append(row)
+    table = pd.DataFrame(rows).set_index('metric')
+    table.attrs['prob_loss'] = float((samples['final_equity'] < initial_capital).mean())
+    return table
+
+
+# --- Fuentes de operaciones ---
+def returns_from_log():
+    """Retornos de las ventas del log de paper trading y la fracción del capital que usa cada compra."""
+    from performance_analyzer import INITIAL_CAPITAL as LOG_CAPITAL, POSITION_USD, TRADES_LOG_FILE, parse_trades_log
+    path = os.path.join(PROJECT_ROOT, TRADES_LOG_FILE)
+    if not os.path.exists(path):
+        print(f"❌ Error: No se encontró el archivo de log en '{path}'.")
+        return np.empty(0), 1.0
+    trades, _ = parse_trades_log(path)
+    returns = [t['pnl_percent'] / 100 for t in trades if t['type'] == 'SELL']
+    return np.asarray(returns), POSITION_USD / LOG_CAPITAL
+
+
+def returns_from_backtest():
+    """Retornos por operación del backtest con SL/TP del modelo actual (todo el capital por operación)."""
+    from backtest import INTERVALO_VELAS, PERIODO_DATOS, STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT, TICKER, FEE_RATE
+    from backtest_engine import run_risk_backtest
+    from candle_archive import load_period
+    from feature_engine import model_feature_names
+    from model_registry import get_model
+    from resampler import model_feature_frame
+
+    model = get_model()
+    names = model_feature_names(model)
+    data = model_feature_frame(load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS), names, INTERVALO_VELAS).dropna()
+    predictions = model.predict(data[names].to_numpy())
+    result = run_risk_backtest(data['High'].to_numpy(), data['Low'].to_numpy(), data['Close'].to_numpy(),
+                               predictions, STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT, fee_rate=FEE_RATE,
+                               open_=data['Open'].to_numpy())
+    return result['trades']['return_pct'].to_numpy() / 100, 1.0
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'log'
+    n_resamples = int(sys.argv[2]) if len(sys.argv) > 2 else N_RESAMPLES
+
+    if source == 'demo':
+        # Serie sintética del tamaño objetivo (10k operaciones) para medir el rendimiento.
+        returns = np.random.default_rng(0).normal(0.0005, 0.01, 10_000)
+        exposure = 1.0
+    elif source == 'backtest':
+        returns, exposure = returns_from_backtest()
+    else:
+        returns, exposure = returns_from_log()
+    if len(returns) == 0:
+        print("ℹ️ No hay operaciones cerradas para analizar.")
+        sys.exit(0)
+
+    print(f"--- Análisis de Robustez ({source}): {len(returns):,} operaciones x {n_resamples:,} remuestreos ---")
+    observed = observed_metrics(returns, exposure)
+    for method in ('bootstrap', 'shuffle'):
+        start = time.perf_counter()
+        samples = monte_carlo(returns, n_resamples, method, exposure=exposure)
+        elapsed = time.perf_counter() - start
+        table = summarize(samples, observed)
+        print(f"\n[{method}] {elapsed:.2f} s | probabilidad de pérdida: {table.attrs['prob_loss'] * 100:.1f}%")
+        print(table.to_string(float_format=lambda v: f"{v:,.2f}"))
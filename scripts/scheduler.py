@@ -4,24 +4,25 @@
 # realiza una predicción y ejecuta/registra operaciones.
 
 import os
+import sys
 import time
-import pandas as pd
-import yfinance as yf
-import ta
-import joblib
 from datetime import datetime
 
+# --- Añadir la raíz del proyecto al path ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from feature_engine import model_feature_names
+from resampler import history_period, model_feature_frame
+from candle_store import get_candles
+from model_registry import get_model
+
 # --- Configuración de Rutas y Constantes ---
 MODELS_DIR = 'models'
 LOGS_DIR = 'logs'
 DATA_DIR = 'data'
 MODEL_PATH = os.path.join(MODELS_DIR, 'model.joblib')
 LOG_FILE_PATH = os.path.join(LOGS_DIR, 'trades.log')
-DATA_FILE_PATH = os.path.join(DATA_DIR, 'btc_data.csv')
-FEATURES = [
-    'sma_20', 'sma_50', 'rsi', 'macd', 'macd_signal', 'macd_diff',
-    'stochrsi', 'obv', 'bb_width', 'atr', 'momentum'
-]
 
 # --- Estado del Bot (simulado en memoria) ---
 # En un sistema real, esto estaría en una base de datos o un archivo de estado.
@@ -44,49 +45,31 @@ def load_prediction_model():
         print("Por favor, ejecuta 'train_model.py' primero.")
         return None
     try:
-        model = joblib.load(MODEL_PATH)
+        model = get_model(MODEL_PATH)
         print("✅ Modelo de IA cargado exitosamente.")
         return model
     except Exception as e:
         print(f"❌ Error al cargar el modelo: {e}")
         return None
 
-def fetch_and_prepare_data():
-    """Descarga datos recientes y calcula todos los indicadores necesarios."""
-    print("Descargando datos recientes (48h, intervalo 15min)...")
+def fetch_and_prepare_data(model):
+    """Sincroniza el almacén de velas y calcula los indicadores que usa el modelo."""
+    print("Sincronizando velas recientes (5d, intervalo 15min)...")
     try:
-        # Se necesita un período mayor para calcular indicadores como SMA50
-        data = yf.download('BTC-USD', period='5d', interval='15m', auto_adjust=True, progress=False)
+        # Se necesita un período mayor para calcular indicadores como SMA50 (y más aún si el
+        # modelo usa temporalidades superiores). Solo se descargan las velas nuevas; el resto
+        # se lee del almacén local.
+        names = model_feature_names(model)
+        data = get_candles('BTC-USD', '15m', history_period(names, '5d'))
         if data.empty:
             print("⚠️ No se pudieron descargar datos.")
             return None
 
-        # Saneamiento de entradas para la librería 'ta'
-        close = pd.Series(data['Close'].values.flatten(), index=data.index)
-        high = pd.Series(data['High'].values.flatten(), index=data.index)
-        low = pd.Series(data['Low'].values.flatten(), index=data.index)
-        volume = pd.Series(data['Volume'].values.flatten(), index=data.index)
-
-        # Cálculo de todos los indicadores usados en el entrenamiento
-        data['sma_20'] = ta.trend.SMAIndicator(close=close, window=20).sma_indicator()
-        data['sma_50'] = ta.trend.SMAIndicator(close=close, window=50).sma_indicator()
-        data['rsi'] = ta.momentum.RSIIndicator(close=close, window=14).rsi()
-        macd = ta.trend.MACD(close=close)
-        data['macd'] = macd.macd()
-        data['macd_signal'] = macd.macd_signal()
-        data['macd_diff'] = macd.macd_diff()
-        data['stochrsi'] = ta.momentum.StochRSIIndicator(close=close, window=14).stochrsi()
-        data['obv'] = ta.volume.OnBalanceVolumeIndicator(close=close, volume=volume).on_balance_volume()
-        data['bb_width'] = ta.volatility.BollingerBands(close=close, window=20).bollinger_wband()
-        data['atr'] = ta.volatility.AverageTrueRange(high=high, low=low, close=close, window=14).average_true_range()
-        data['momentum'] = close - close.shift(14)
+        # Cálculo de los indicadores del modelo con el mismo motor que usa el entrenamiento
+        data = model_feature_frame(data, names, '15m')
         
         data.dropna(inplace=True)
         print("Indicadores calculados y datos limpios.")
-        
-        # Guardar los datos procesados en CSV
-        data.to_csv(DATA_FILE_PATH)
-        print(f"Datos guardados en '{DATA_FILE_PATH}'.")
 
         return data
     except Exception as e:
@@ -99,7 +82,7 @@ def execute_trade_logic(model, data):
         print("No hay datos para procesar, saltando ciclo de trading.")
         return
 
-    latest_features = data[FEATURES].tail(1)
+    latest_features = data[model_feature_names(model)].tail(1).to_numpy()
     
     # Predecir: 1 = Sube (BUY), 0 = Baja (SELL)
     prediction = model.predict(latest_features)[0]
@@ -153,7 +136,7 @@ if __name__ == "__main__":
             print(f"Iniciando nuevo ciclo de bot - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             print(f"Estado actual: Capital=${bot_state['capital']:,.2f}, Posición Abierta={bot_state['position_open']}, BTC={bot_state['btc_amount']:.6f}")
             
-            processed_data = fetch_and_prepare_data()
+            processed_data = fetch_and_prepare_data(model)
             if processed_data is not None and not processed_data.empty:
                 execute_trade_logic(model, processed_data)
             
@@ -1,16 +1,25 @@
 # simulate_trading.py
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from ta.trend import SMAIndicator
 from ta.momentum import RSIIndicator
 import logging
+from rule_engine import RuleCompiler, dedupe_signals, score_signals
 
 # 🎯 Parámetros personalizables
 RSI_BUY_THRESHOLD = 70
 RSI_SELL_THRESHOLD = 30
 MIN_VOLUME_QUANTILE = 0.2
 
+# 📐 Estrategia declarativa (ver rule_engine.py): cruce SMA20/SMA50 filtrado por RSI
+STRATEGY = {
+    'name': 'SMA20/SMA50 + RSI14',
+    'buy': ('all', ('cross_above', 'SMA20', 'SMA50'), ('lt', 'RSI14', RSI_BUY_THRESHOLD)),
+    'sell': ('all', ('cross_below', 'SMA20', 'SMA50'), ('gt', 'RSI14', RSI_SELL_THRESHOLD)),
+}
+
 # ✅ Configurar logging profesional
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -51,14 +60,15 @@ df["RSI14"] = RSIIndicator(close=df[safe_close_col], window=14).rsi()
 
 # Eliminar filas con valores nulos en indicadores
 df.dropna(subset=[safe_close_col, "SMA20", "SMA50", "RSI14"], inplace=True)
+if df.empty:
+    raise ValueError("❌ No quedan velas con indicadores (hacen falta más de 50): amplía el rango de fechas.")
 
-# Crear columnas previas para detectar cruces
-df["Prev_SMA20"] = df["SMA20"].shift(1)
-df["Prev_SMA50"] = df["SMA50"].shift(1)
+# Compilar las reglas sobre las columnas de indicadores (los cruces comparan con la vela previa)
+compiler = RuleCompiler({name: df[name] for name in [safe_close_col, "SMA20", "SMA50", "RSI14"]})
 
 # --- Fragmento añadido para ver cruces y RSI ---
-cross_up = (df["Prev_SMA20"] < df["Prev_SMA50"]) & (df["SMA20"] > df["SMA50"])
-cross_down = (df["Prev_SMA20"] > df["Prev_SMA50"]) & (df["SMA20"] < df["SMA50"])
+cross_up = compiler.mask(("cross_above", "SMA20", "SMA50"))
+cross_down = compiler.mask(("cross_below", "SMA20", "SMA50"))
 
 print("Cruces al alza con RSI actual:")
 print(df.loc[cross_up, ["RSI14", safe_close_col]].head(10))
@@ -67,43 +77,18 @@ print("Cruces a la baja con RSI actual:")
 print(df.loc[cross_down, ["RSI14", safe_close_col]].head(10))
 # --- Fin fragmento añadido ---
 
-# Inicializar columna de señales
-df["Signal"] = ""
-
-# Señal de compra
-df.loc[
-    (df["Prev_SMA20"] < df["Prev_SMA50"]) &
-    (df["SMA20"] > df["SMA50"]) &
-    (df["RSI14"] < RSI_BUY_THRESHOLD),
-    "Signal"
-] = "BUY"
-
-# Señal de venta
-df.loc[
-    (df["Prev_SMA20"] > df["Prev_SMA50"]) &
-    (df["SMA20"] < df["SMA50"]) &
-    (df["RSI14"] > RSI_SELL_THRESHOLD),
-    "Signal"
-] = "SELL"
+# Señales de compra/venta sin señales consecutivas duplicadas (1 = BUY, -1 = SELL)
+events = dedupe_signals(compiler.signals([STRATEGY]))[0]
 
 # Extraer señales limpias
-signals = df[df["Signal"] != ""].copy()
-
-# Eliminar señales consecutivas duplicadas para evitar ruido
-signals["Signal_shift"] = signals["Signal"].shift()
-signals = signals[signals["Signal"] != signals["Signal_shift"]]
-signals.drop(columns=["Signal_shift", "Prev_SMA20", "Prev_SMA50"], inplace=True)
+signals = df[events != 0].copy()
+signals["Signal"] = np.where(events[events != 0] == 1, "BUY", "SELL")
 
-# Añadir columna de retorno simulado 1 día después (correcto cálculo)
+# Añadir columna de retorno simulado hasta la siguiente señal (correcto cálculo)
 signals["Return"] = signals[safe_close_col].shift(-1) / signals[safe_close_col] - 1
 
-# Calcular ganancia total simulada considerando sentido de la señal
-ganancia_total = 0.0
-for _, row in signals.iterrows():
-    if row["Signal"] == "BUY":
-        ganancia_total += row["Return"]
-    elif row["Signal"] == "SELL":
-        ganancia_total -= row["Return"]  # Ganancia si precio baja
+# Calcular ganancia total simulada considerando sentido de la señal (ganancia si el precio baja tras un SELL)
+ganancia_total = float(score_signals(events, df[safe_close_col].to_numpy())['total_return'].iloc[0])
 
 logging.info(f"📈 Ganancia total simulada: {ganancia_total:.4f} ({ganancia_total*100:.2f}%)")
 logging.info(f"📊 Promedio retorno por señal: {signals['Return'].mean():.4f} ({signals['Return'].mean()*100:.2f}%)")
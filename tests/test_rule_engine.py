@@ -0,0 +1,50 @@
+# tests/test_rule_engine.py
+#
+# rule_engine con entradas más cortas que la ventana más larga de las reglas:
+# tras quitar el calentamiento no queda ninguna vela, y la criba y la
+# puntuación devuelven filas sin señales en lugar de fallar.
+#
+# Uso: python -m pytest tests
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from rule_engine import (SCORE_COLUMNS, RuleCompiler, dedupe_signals, rule_columns, rule_family, score_signals,
+                         screen_rules)
+
+STRATEGY = {'name': 'sma_20>sma_50', 'buy': ('cross_above', 'sma_20', 'sma_50'),
+            'sell': ('cross_below', 'sma_20', 'sma_50')}
+
+
+def _short_frame(n_rows=30):
+    close = 100.0 + np.arange(n_rows, dtype=np.float64)
+    return pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                         'Volume': np.full(n_rows, 1000.0)})
+
+
+def test_score_signals_without_rows():
+    compiler = RuleCompiler({'sma_20': np.zeros(0), 'sma_50': np.zeros(0), 'close': np.zeros(0)})
+    events = dedupe_signals(compiler.signals([STRATEGY, STRATEGY]))
+    assert events.shape == (2, 0)
+
+    scores = score_signals(events, np.zeros(0))
+    assert list(scores.columns) == SCORE_COLUMNS
+    assert scores['n_signals'].tolist() == [0, 0]
+    assert scores['total_return'].tolist() == [0.0, 0.0]
+    assert scores['mean_return'].isna().all()
+
+
+def test_screen_rules_after_dropna_on_short_input():
+    # 30 velas < ventana de sma_50: dropna deja la matriz vacía.
+    columns = pd.DataFrame(rule_columns(_short_frame())).dropna()
+    assert columns.empty
+    strategies = rule_family()
+    table = screen_rules(strategies, {name: columns[name].to_numpy() for name in columns})
+    assert len(table) == len(strategies)
+    assert (table['n_signals'] == 0).all()
@@ -0,0 +1,97 @@
+# tests/test_timeframe_models.py
+#
+# predict.py y backtest.py con un modelo entrenado con EXTRA_TIMEFRAMES=['1h']
+# (completo y podado a unas pocas columnas '*_1h'): las entradas calculan las
+# mismas columnas que train_model.add_model_features, sin red ni archivos del proyecto.
+#
+# Uso: python -m pytest tests
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+import backtest
+import backtest_store
+import candle_archive
+import candle_store
+import feature_cache
+import predict
+import train_model
+from feature_engine import FEATURES
+from resampler import timeframe_feature_names
+
+STEP = candle_store.interval_seconds('15m')
+N_ROWS = 40 * 96  # 40 días de velas de 15m.
+
+
+def _synthetic_candles(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100000.0 * np.exp(np.cumsum(rng.normal(0, 0.003, n_rows)))
+    spread = close * rng.random(n_rows) * 0.003
+    return {
+        'ts': 1_700_000_100 - 1_700_000_100 % STEP + np.arange(n_rows, dtype=np.int64) * STEP,
+        'open': np.concatenate([[close[0]], close[:-1]]),
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.integers(1_000, 1_000_000, n_rows).astype(np.float64),
+    }
+
+
+@pytest.fixture
+def offline_store(tmp_path, monkeypatch):
+    """Almacenes en tmp_path, sin descargas de yfinance y con el reloj en la última vela."""
+    candles = _synthetic_candles(N_ROWS)
+    monkeypatch.setattr(candle_store, 'CANDLE_DIR', str(tmp_path / 'candles'))
+    monkeypatch.setattr(candle_archive, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    monkeypatch.setattr(feature_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(backtest_store, 'STORE_DIR', str(tmp_path / 'backtests'))
+    monkeypatch.setattr(candle_store, 'sync', lambda *args, **kwargs: 0)
+    monkeypatch.setattr(candle_store, 'sync_many', lambda *args, **kwargs: 0)
+    monkeypatch.setattr(predict, 'sync_many', lambda *args, **kwargs: 0)
+    now = lambda: int(candles['ts'][-1]) + STEP
+    monkeypatch.setattr(candle_store, 'utc_now', now)
+    monkeypatch.setattr(predict, 'utc_now', now)
+    candle_store.append_candles(predict.SYMBOL, predict.INTERVAL, candles)
+    return tmp_path
+
+
+def _train(tmp_path, monkeypatch, keep=None):
+    """Entrena con el pipeline de train_model (EXTRA_TIMEFRAMES=['1h']) y guarda models/model.joblib."""
+    from joblib import dump
+    from xgboost import XGBClassifier
+
+    monkeypatch.setattr(train_model, 'EXTRA_TIMEFRAMES', ['1h'])
+    data, features = train_model.prepare_training_data(candle_archive.load_period(predict.SYMBOL, predict.INTERVAL,
+                                                                                  '60d'))
+    features = keep or features
+    model = XGBClassifier(n_estimators=5, max_depth=2).fit(data[features].to_numpy(), data['target'].to_numpy())
+    model.get_booster().feature_names = list(features)
+    path = tmp_path / 'models' / 'model.joblib'
+    path.parent.mkdir()
+    dump(model, path)
+    return model, str(path)
+
+
+@pytest.mark.parametrize('keep', [None, ['rsi', 'obv_1h', 'atr_1h']], ids=['completo', 'podado'])
+def test_predict_and_backtest_with_timeframe_model(offline_store, monkeypatch, capsys, keep):
+    model, path = _train(offline_store, monkeypatch, keep)
+    names = keep or FEATURES + timeframe_feature_names(['1h'])
+    assert [name.strip() for name in model.get_booster().feature_names] == names
+
+    monkeypatch.setattr(predict, 'MODEL_PATH', path)
+    predict.main_predict()
+    output = capsys.readouterr().out
+    assert 'Resultado:' in output, output
+
+    assert set(predict.get_panel_predictions([predict.SYMBOL], model=model)) == {predict.SYMBOL}
+
+    monkeypatch.chdir(offline_store)
+    backtest.run_backtest()
+    output = capsys.readouterr().out
+    assert 'RESULTADOS DEL BACKTEST' in output, output
@@ -1,94 +1,177 @@
 # train_model.py (Versión de Alta Frecuencia - 15m)
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import json
+import time
 from datetime import datetime
-from sklearn.model_selection import GridSearchCV, TimeSeriesSplit
-from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score
-import joblib
-import os
 import matplotlib.pyplot as plt
+from feature_engine import FEATURES
+from candle_archive import load_period
+from resampler import EXTRA_TIMEFRAMES, model_feature_frame, timeframe_feature_names
+from hyperparameter_search import HalvingSearch, QuantileGridSearch, TIME_BUDGET_SECONDS
+from backtest_store import data_fingerprint
+from model_store import append_training_log, save_version
+from labeling import LABEL_TAKE_PROFIT, MAX_HOLDING_BARS, next_n_labels, triple_barrier
+from feature_selection import prune_features
 
 # --- PARÁMETROS DEL MODELO DE ALTA FRECUENCIA ---
 # Símbolo a descargar
 TICKER = 'BTC-USD'
-# Período de datos. '60d' (60 días) es el máximo permitido por yfinance para intervalos de 15m.
+# Período de datos. yfinance solo da 60 días de velas de 15m, pero el archivo local
+# (candle_archive.py) acumula el histórico, así que este valor puede crecer con el tiempo.
 PERIODO_DATOS = '60d'
 # Intervalo de velas: 15 minutos para operaciones intradiarias.
 INTERVALO_VELAS = '15m'
+# Validación cruzada temporal y rejilla de hiperparámetros.
+# Reducimos un poco la complejidad para un entrenamiento más rápido
+N_SPLITS = 5
+PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [3, 5],
+    'learning_rate': [0.05, 0.1],
+    'subsample': [0.8, 0.9]
+}
+# Modo de búsqueda: 'grid' (rejilla completa de PARAM_GRID) o 'halving'
+# (successive halving + early stopping sobre hyperparameter_search.SEARCH_SPACE,
+# acotado por un presupuesto de tiempo en segundos).
+SEARCH_MODE = 'grid'
+# Variable objetivo: 'next' (sube la próxima vela) o 'triple_barrier' (la compra toca
+# el Take-Profit antes que el Stop-Loss o el límite de tiempo; ver labeling.py).
+TARGET = 'next'
+# Poda de features por importancia de permutación tras la búsqueda (feature_selection.py):
+# el modelo final usa solo las features que aportan y en vivo solo se calculan esas.
+PRUNE_FEATURES = True
 
-def train_ia_model():
+
+def add_model_features(data):
+    """Features del modelo (motor compartido + temporalidades superiores). Devuelve (data, lista de features)."""
+    # Features de temporalidades superiores remuestreadas desde las mismas velas (sin descargas extra),
+    # con el mismo helper que usan predict.py, backtest.py y los scripts (resampler.model_feature_frame).
+    model_features = FEATURES + timeframe_feature_names(EXTRA_TIMEFRAMES)
+    return model_feature_frame(data, model_features, INTERVALO_VELAS), model_features
+
+
+def add_target(data, target=TARGET):
+    """
+    Añade la variable objetivo y quita las filas con NaN (calentamiento de
+    indicadores y velas finales sin objetivo conocido).
+
+    Args:
+        target (str): 'next' (sube la próxima vela) o 'triple_barrier' (labeling.py).
+    """
+    data['target'] = target_labels(data['High'], data['Low'], data['Close'], target)
+    data.dropna(inplace=True)
+    data['target'] = data['target'].astype(int)
+    return data
+
+
+def target_labels(high, low, close, target=TARGET):
+    """
+    Variable objetivo por vela (1.0 / 0.0, NaN si aún no se conoce) sobre arrays
+    de precios; la comparten add_target y dataset_builder.py.
+    """
+    if target == 'triple_barrier':
+        # 1 si una compra al cierre de la vela toca el Take-Profit antes que el Stop-Loss o el límite de tiempo.
+        label = triple_barrier(high, low, close)['label']
+        return np.where(np.isnan(label), np.nan, label == LABEL_TAKE_PROFIT)
+    # La variable objetivo predice si la *próxima vela de 15 minutos* subirá (1) o bajará / quedará igual (0).
+    # La última vela no tiene siguiente: su objetivo no se conoce (NaN).
+    return next_n_labels(close, (1,))[1]
+
+
+def label_gap(target=TARGET):
+    """
+    Velas que mira adelante la variable objetivo más allá de la siguiente: la
+    validación temporal deja ese hueco entre entrenamiento y prueba para que las
+    últimas etiquetas de entrenamiento no vean las velas de prueba.
+    """
+    return MAX_HOLDING_BARS if target == 'triple_barrier' else 0
+
+
+def prepare_training_data(data, target=TARGET):
+    """
+    Features (motor compartido + temporalidades superiores) y variable objetivo
+    sobre un DataFrame OHLCV. Devuelve (data limpio con 'target', lista de features).
+
+    Args:
+        target (str): 'next' (sube la próxima vela) o 'triple_barrier' (labeling.py).
+    """
+    data, model_features = add_model_features(data)
+    return add_target(data, target), model_features
+
+
+def fit_model(X, y, param_grid=PARAM_GRID, n_splits=N_SPLITS, n_jobs=-1, verbose=1, gap=0):
+    """
+    Rejilla de hiperparámetros con TimeSeriesSplit sobre XGBoost (accuracy), con los
+    datos cuantizados una sola vez y compartidos por todas las configuraciones y folds
+    (hyperparameter_search.QuantileGridSearch). Devuelve la búsqueda ajustada.
+
+    Args:
+        n_jobs (int): -1 = reparto calibrado de los núcleos entre ajustes en paralelo e hilos
+            de XGBoost por ajuste (core_scheduler); k = ajustes de uno en uno con k hilos
+            (1 en los folds paralelos de walk_forward.py, que ya ocupan un núcleo cada uno).
+        gap (int): velas entre entrenamiento y validación de cada fold (label_gap).
+    """
+    return QuantileGridSearch(param_grid, n_splits, nthread=None if n_jobs == -1 else n_jobs,
+                              verbose=verbose, gap=gap).fit(X, y)
+
+
+def training_meta(data, model_features, model, best_params, validation_accuracy, candidates=None):
+    """
+    Metadatos de un entrenamiento completo: última vela entrenada, features del
+    modelo (y las candidatas antes de la poda), parámetros y referencia de validación.
+    """
+    return {
+        'mode': 'full',
+        'trained_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'last_ts': data.index[-1].isoformat(),
+        'rows': len(data),
+        'features': list(model_features),
+        'candidates': list(candidates or model_features),
+        'params': best_params,
+        'validation_accuracy': round(float(validation_accuracy), 4),
+        'base_rounds': model.get_booster().num_boosted_rounds(),
+        'total_rounds': model.get_booster().num_boosted_rounds(),
+        'updates': 0,
+        # Aciertos fuera de muestra acumulados desde el último entrenamiento completo.
+        'oos_rows': 0,
+        'oos_correct': 0,
+    }
+
+
+def train_ia_model(search=SEARCH_MODE, time_budget=TIME_BUDGET_SECONDS, prune=PRUNE_FEATURES):
     """
     Entrena un modelo de IA de alta frecuencia para predecir movimientos de precios
     en velas de 15 minutos.
+
+    Args:
+        search (str): 'grid' o 'halving'.
+        time_budget (float): segundos máximos de búsqueda en modo 'halving'.
+        prune (bool): quitar las features sin importancia de permutación (feature_selection.py).
     """
+    start = time.perf_counter()
     print(f"--- Fase 1: Entrenamiento del Modelo de Alta Frecuencia ({INTERVALO_VELAS}) ---")
     
-    # --- PASO 1: Descarga de Datos de Alta Frecuencia ---
-    print(f"Paso 1: Descargando datos históricos para {TICKER} (Período: {PERIODO_DATOS}, Intervalo: {INTERVALO_VELAS})...")
+    # --- PASO 1: Carga de Datos de Alta Frecuencia (archivo local memmap + sincronización delta) ---
+    print(f"Paso 1: Cargando datos históricos para {TICKER} (Período: {PERIODO_DATOS}, Intervalo: {INTERVALO_VELAS})...")
     try:
-        data = yf.download(TICKER, period=PERIODO_DATOS, interval=INTERVALO_VELAS, auto_adjust=True, progress=False)
+        data = load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS)
         if data.empty:
-            raise ValueError("No se pudieron descargar datos. Verifica el ticker o el período.")
-        print(f"✅ Datos descargados correctamente. {len(data)} velas de {INTERVALO_VELAS} obtenidas.")
+            raise ValueError("No se pudieron obtener datos. Verifica el ticker o el período.")
+        print(f"✅ Datos cargados correctamente. {len(data)} velas de {INTERVALO_VELAS} obtenidas.")
     except Exception as e:
         print(f"❌ Error al descargar datos: {e}")
         return
 
-    # --- PASO 2: Cálculo de Indicadores Técnicos con Pandas (Versión Robusta) ---
+    # --- PASO 2: Cálculo de Indicadores Técnicos (Motor de Features Compartido) ---
     print("Paso 2: Calculando indicadores técnicos...")
-    
-    # Los parámetros de los indicadores se mantienen, pero ahora se aplican a velas de 15m.
-    # --- SMAs ---
-    data['sma_20'] = data['Close'].rolling(window=20).mean()
-    data['sma_50'] = data['Close'].rolling(window=50).mean()
-    # --- RSI ---
-    delta = data['Close'].diff(1)
-    gain = delta.where(delta > 0, 0); loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.ewm(com=14 - 1, min_periods=14).mean()
-    avg_loss = loss.ewm(com=14 - 1, min_periods=14).mean()
-    data['rsi'] = 100 - (100 / (1 + (avg_gain / avg_loss)))
-    # --- MACD ---
-    ema_fast = data['Close'].ewm(span=12, adjust=False).mean()
-    ema_slow = data['Close'].ewm(span=26, adjust=False).mean()
-    data['macd'] = ema_fast - ema_slow
-    data['macd_signal'] = data['macd'].ewm(span=9, adjust=False).mean()
-    data['macd_diff'] = data['macd'] - data['macd_signal']
-    # --- Stochastic RSI ---
-    rsi_series = data['rsi']
-    min_rsi = rsi_series.rolling(window=14).min(); max_rsi = rsi_series.rolling(window=14).max()
-    data['stochrsi'] = (rsi_series - min_rsi) / (max_rsi - min_rsi)
-    # --- On-Balance Volume (OBV) ---
-    data['obv'] = (data['Volume'] * (~data['Close'].diff().le(0) * 2 - 1)).cumsum()
-    # --- Bollinger Bands Width ---
-    sma_bb = data['Close'].rolling(window=20).mean()
-    std_bb = data['Close'].rolling(window=20).std()
-    upper_bb = sma_bb + (std_bb * 2); lower_bb = sma_bb - (std_bb * 2)
-    data['bb_width'] = (upper_bb - lower_bb) / sma_bb
-    # --- Average True Range (ATR) ---
-    high_low = data['High'] - data['Low']
-    high_close = (data['High'] - data['Close'].shift()).abs()
-    low_close = (data['Low'] - data['Close'].shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    data['atr'] = tr.ewm(alpha=1/14, adjust=False).mean()
-    # --- Momentum ---
-    data['momentum'] = data['Close'].diff(14)
-    # --- Contexto --- (Se mantiene como placeholder, ya que es menos relevante en alta frecuencia)
-    data["contexto_estrategia"] = 0
-
-    print("✅ Indicadores técnicos calculados.")
+    data, model_features = add_model_features(data)
+    print(f"✅ Indicadores técnicos calculados ({len(model_features)} features).")
 
     # --- PASO 3: Limpieza y Creación de la Variable Objetivo ---
     print("Paso 3: Limpiando NaNs y creando la variable objetivo (target)...")
-    
-    # La variable objetivo ahora predice si la *próxima vela de 15 minutos* subirá o bajará.
-    price_diff = data['Close'].shift(-1) - data['Close']
-    data['target'] = np.where(price_diff > 0, 1, 0) # Simplificado a 1 si sube, 0 si baja o es igual
-    
-    data.dropna(inplace=True)
+    data = add_target(data)
     if data.empty:
         print("❌ Error: El DataFrame quedó vacío tras limpiar NaNs.")
         return
@@ -97,42 +180,40 @@ def train_ia_model():
     print(data['target'].value_counts(normalize=True))
 
     # --- PASO 4: Entrenamiento del Modelo ---
-    features = [
-        'sma_20', 'sma_50', 'rsi', 'macd', 'macd_signal', 'macd_diff',
-        'stochrsi', 'obv', 'bb_width', 'atr', 'momentum', 'contexto_estrategia'
-    ]
-    X = data[features]
+    X = data[model_features]
     y = data['target']
+    gap = label_gap()
 
-    print("Paso 4: Configurando y ejecutando la búsqueda de hiperparámetros (GridSearchCV)...")
-    tscv = TimeSeriesSplit(n_splits=5)
-    
-    # Reducimos un poco la complejidad para un entrenamiento más rápido
-    param_grid = {
-        'n_estimators': [100, 200],
-        'max_depth': [3, 5],
-        'learning_rate': [0.05, 0.1],
-        'subsample': [0.8, 0.9]
-    }
-
-    grid_search = GridSearchCV(
-        estimator=XGBClassifier(objective='binary:logistic', eval_metric='logloss', use_label_encoder=False, random_state=42),
-        param_grid=param_grid, cv=tscv, n_jobs=-1, verbose=1, scoring='accuracy'
-    )
-    grid_search.fit(X, y)
+    if search == 'halving':
+        print(f"Paso 4: Búsqueda de hiperparámetros por successive halving (presupuesto {time_budget:.0f} s)...")
+        grid_search = HalvingSearch(time_budget=time_budget, gap=gap).fit(X, y)
+    else:
+        print("Paso 4: Configurando y ejecutando la búsqueda de hiperparámetros (rejilla sobre datos cuantizados)...")
+        grid_search = fit_model(X, y, gap=gap)
     model = grid_search.best_estimator_
 
-    print("\n✅ Resultados de GridSearchCV:")
+    print(f"\n✅ Resultados de la búsqueda ({search}):")
     print(f"🔍 Mejores parámetros encontrados: {grid_search.best_params_}")
     print(f"🎯 Mejor puntuación de validación cruzada (accuracy): {grid_search.best_score_:.4f}")
 
+    # --- PASO 4b: Poda de Features (importancia de permutación) ---
+    candidate_features = model_features
+    validation_accuracy = grid_search.best_score_
+    pruning = None
+    if prune:
+        print("Paso 4b: Midiendo la importancia de permutación de cada feature...")
+        pruned_model, pruning = prune_features(X.to_numpy(), y.to_numpy(), model_features, grid_search.best_params_,
+                                               n_splits=N_SPLITS, gap=gap)
+        if pruned_model is not None:
+            model, model_features = pruned_model, pruning['features']
+            X = data[model_features]
+            validation_accuracy = pruning['cv_pruned']
+        print(f"✅ El modelo usa {len(model_features)} de {len(candidate_features)} features.")
+    # La lista de features viaja dentro del modelo: la inferencia calcula solo esas columnas.
+    model.get_booster().feature_names = list(model_features)
+
     # --- PASO 5: Evaluación y Guardado ---
     print("Paso 5: Evaluando y guardando el nuevo modelo de alta frecuencia...")
-    os.makedirs("models", exist_ok=True)
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(project_root, "models", "model.joblib")
-    joblib.dump(model, model_path)
-
     y_pred = model.predict(X)
     final_accuracy = accuracy_score(y, y_pred)
     print(f"✅ Precisión final sobre todo el dataset de entrenamiento: {final_accuracy:.4f}")
@@ -140,14 +221,44 @@ def train_ia_model():
     log_entry = {
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'model_type': f'High-Frequency ({INTERVALO_VELAS})',
+        'search': search,
         'best_cv_accuracy': round(grid_search.best_score_, 4),
         'final_accuracy_on_full_data': round(final_accuracy, 4),
-        'best_params': grid_search.best_params_
+        'best_params': grid_search.best_params_,
+        'n_features': len(model_features),
+        'dropped_features': pruning['dropped'] if pruning else [],
+        # Tiempo de la búsqueda y memoria residente antes/después/pico (MB).
+        **getattr(grid_search, 'timings_', {}),
     }
-    with open('training_log.json', 'a') as f:
-        f.write(json.dumps(log_entry) + "\n")
+    # Versión inmutable del modelo (UBJSON + manifiesto) marcada como CURRENT: se publica de forma
+    # atómica en models/model.joblib, models/model.ubj y models/model_meta.json (punto de partida de
+    # incremental_update.py); los bots con el modelo residente lo recargan en su próximo ciclo.
+    version = save_version(model, {
+        'mode': 'full',
+        'search': search,
+        'params': grid_search.best_params_,
+        # Validación del modelo guardado (la del modelo reducido si se podó).
+        'cv_score': round(float(validation_accuracy), 4),
+        'final_accuracy': round(final_accuracy, 4),
+        'features': list(model_features),
+        'feature_pruning': pruning,
+        'rows': len(data),
+        'first_ts': data.index[0].isoformat(),
+        'last_ts': data.index[-1].isoformat(),
+        'data_fingerprint': data_fingerprint(data),
+        'timings': {'total_seconds': round(time.perf_counter() - start, 3), **getattr(grid_search, 'timings_', {})},
+        'meta': training_meta(data, model_features, model, grid_search.best_params_, validation_accuracy,
+                              candidate_features),
+    })
+    log_entry['model_version'] = version['version']
+    append_training_log(log_entry)
 
-    print("\n✅ ¡Entrenamiento del modelo de alta frecuencia completado! El archivo 'models/model.joblib' ha sido actualizado.")
+    print(f"\n✅ ¡Entrenamiento del modelo de alta frecuencia completado! El archivo 'models/model.joblib' ha sido actualizado "
+          f"(versión {version['version']}).")
+    return log_entry
 
 if __name__ == '__main__':
-    train_ia_model()
\ No newline at end of file
+    # Uso: python train_model.py [grid|halving] [presupuesto_s]
+    import sys
+    train_ia_model(sys.argv[1] if len(sys.argv) > 1 else SEARCH_MODE,
+                   float(sys.argv[2]) if len(sys.argv) > 2 else TIME_BUDGET_SECONDS)
\ No newline at end of file
@@ -0,0 +1,157 @@
+# walk_forward.py (Validación Walk-Forward: Reentrenar y Probar Fuera de Muestra)
+#
+# backtest.py evalúa el modelo sobre los mismos datos con los que se entrenó.
+# Aquí se reentrena repetidamente sobre una ventana móvil (el mismo pipeline de
+# train_model.py: prepare_training_data + fit_model), se predice la ventana
+# siguiente que el modelo no ha visto y se unen todas las predicciones fuera de
+# muestra en una sola curva de capital.
+#
+# - Las features y el objetivo se calculan UNA vez para todo el periodo y cada
+#   fold solo toma cortes de esas matrices.
+# - Si el objetivo mira varias velas adelante (triple barrera), las últimas
+#   train_model.label_gap velas de cada ventana de entrenamiento se purgan: sus
+#   etiquetas dependen de las velas de prueba.
+# - Los folds son independientes y se entrenan en paralelo (un proceso por
+#   núcleo; dentro de cada fold XGBoost usa un solo hilo).
+#
+# Uso: python walk_forward.py [n_procesos]
+
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import INITIAL_CAPITAL, max_drawdown_pct, run_risk_backtest, run_vectorized_backtest
+from candle_archive import load_period
+from train_model import PARAM_GRID, fit_model, label_gap, prepare_training_data
+
+# --- Configuración del Walk-Forward ---
+TICKER = 'BTC-USD'
+PERIODO_DATOS = '60d'
+INTERVALO_VELAS = '15m'
+# Ventana de entrenamiento y de prueba en velas (15m: 2880 = 30 días, 288 = 3 días).
+TRAIN_BARS = 2880
+TEST_BARS = 288
+FEE_RATE = 0.0
+SLIPPAGE = 0.0
+STOP_LOSS_PERCENT = 1.5
+TAKE_PROFIT_PERCENT = 3.0
+
+
+def fold_bounds(n_rows, train_bars=TRAIN_BARS, test_bars=TEST_BARS, purge=0):
+    """
+    Ventanas móviles (train_start, train_stop, test_start, test_stop): se entrena en
+    [train_start, train_stop) y se prueba en [test_start, test_stop). Cada fold
+    avanza `test_bars`, así que las ventanas de prueba son contiguas y no se solapan.
+    Las últimas `purge` velas de la ventana de entrenamiento (train_stop = test_start - purge)
+    se descartan porque su objetivo mira dentro de la ventana de prueba.
+    """
+    bounds = []
+    test_start = train_bars
+    while test_start < n_rows:
+        test_stop = min(test_start + test_bars, n_rows)
+        bounds.append((test_start - train_bars, test_start - purge, test_start, test_stop))
+        test_start = test_stop
+    return bounds
+
+
+# --- Procesos del pool ---
+_fold_data = {}
+
+
+def _init_worker(X, y, param_grid, gap):
+    """Inicializador: cada proceso recibe las matrices completas una sola vez (no por fold)."""
+    _fold_data.update(X=X, y=y, param_grid=param_grid, gap=gap)
+
+
+def _train_fold(bounds):
+    """Entrena sobre la ventana de entrenamiento y predice la de prueba."""
+    train_start, train_stop, test_start, test_stop = bounds
+    X, y = _fold_data['X'], _fold_data['y']
+    start = time.perf_counter()
+    grid_search = fit_model(X[train_start:train_stop], y[train_start:train_stop],
+                            _fold_data['param_grid'], n_jobs=1, verbose=0, gap=_fold_data['gap'])
+    predictions = grid_search.best_estimator_.predict(X[test_start:test_stop])
+    return {
+        'bounds': bounds,
+        'predictions': predictions,
+        'best_params': grid_search.best_params_,
+        'cv_accuracy': grid_search.best_score_,
+        'oos_accuracy': float((predictions == y[test_start:test_stop]).mean()),
+        'fit_seconds': time.perf_counter() - start,
+    }
+
+
+def run_walk_forward(data, train_bars=TRAIN_BARS, test_bars=TEST_BARS, param_grid=PARAM_GRID, processes=None):
+    """
+    Walk-forward completo sobre un DataFrame OHLCV.
+
+    Returns:
+        dict: 'folds' (DataFrame por fold), 'predictions' (Series fuera de muestra),
+        'oos_accuracy' (precisión global fuera de muestra),
+        'backtest' y 'risk' (resultados de backtest_engine sobre el tramo fuera de muestra).
+    """
+    data, model_features = prepare_training_data(data)
+    X = data[model_features].to_numpy()
+    y = data['target'].to_numpy()
+    gap = label_gap()
+    bounds = fold_bounds(len(data), train_bars, test_bars, purge=gap)
+    if not bounds:
+        raise ValueError(f"Se necesitan más de {train_bars} velas con features para el walk-forward "
+                         f"(hay {len(data)}).")
+
+    processes = min(processes or os.cpu_count() or 1, len(bounds))
+    with Pool(processes, initializer=_init_worker, initargs=(X, y, param_grid, gap)) as pool:
+        results = sorted(pool.imap_unordered(_train_fold, bounds), key=lambda r: r['bounds'])
+
+    first, last = bounds[0][2], bounds[-1][3]
+    oos = data.iloc[first:last]
+    predictions = np.concatenate([r['predictions'] for r in results])
+    folds = pd.DataFrame([{
+        'train_start': data.index[r['bounds'][0]], 'test_start': data.index[r['bounds'][2]],
+        'test_end': data.index[r['bounds'][3] - 1], 'cv_accuracy': round(r['cv_accuracy'], 4),
+        'oos_accuracy': round(r['oos_accuracy'], 4), 'fit_seconds': round(r['fit_seconds'], 2),
+        'best_params': r['best_params'],
+    } for r in results])
+
+    # Una sola cuenta sobre todo el tramo fuera de muestra: la posición abierta pasa de un fold al siguiente.
+    backtest = run_vectorized_backtest(oos['Close'].to_numpy(), predictions, INITIAL_CAPITAL,
+                                       FEE_RATE, SLIPPAGE, index=oos.index)
+    risk = run_risk_backtest(oos['High'].to_numpy(), oos['Low'].to_numpy(), oos['Close'].to_numpy(), predictions,
+                             STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT, INITIAL_CAPITAL, FEE_RATE, SLIPPAGE,
+                             open_=oos['Open'].to_numpy(), index=oos.index)
+    return {'folds': folds, 'predictions': pd.Series(predictions, index=oos.index),
+            'oos_accuracy': float((predictions == y[first:last]).mean()),
+            'backtest': backtest, 'risk': risk}
+
+
+def _print_result(name, result):
+    trades = result['trades']
+    win_rate = f" (acierto {(trades['pnl'] > 0).mean() * 100:.1f}%)" if len(trades) else ""
+    print(f"{name:<22} capital final ${result['final_balance']:.2f} | rentabilidad {result['return_pct']:.2f}% | "
+          f"máx. drawdown {max_drawdown_pct(result['equity']):.2f}% | {len(trades)} operaciones{win_rate}")
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"--- Walk-Forward {TICKER} {INTERVALO_VELAS}: entrenar {TRAIN_BARS} velas, probar {TEST_BARS} ---")
+    data = load_period(TICKER, INTERVALO_VELAS, PERIODO_DATOS)
+    if data.empty:
+        print("❌ Error: No se pudieron obtener los datos.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    wf = run_walk_forward(data, processes=processes)
+    elapsed = time.perf_counter() - start
+
+    folds = wf['folds']
+    print(folds.drop(columns='best_params').to_string(index=False))
+    print(f"\n✅ {len(folds)} folds en {elapsed:.1f} s (suma de entrenamientos: {folds['fit_seconds'].sum():.1f} s, "
+          f"{processes or os.cpu_count()} proceso(s)).")
+    print(f"🎯 Precisión fuera de muestra: {wf['oos_accuracy']:.4f}")
+    print("\n--- RESULTADOS FUERA DE MUESTRA (curva de capital unida) ---")
+    _print_result("Señales del modelo:", wf['backtest'])
+    _print_result(f"Con SL {STOP_LOSS_PERCENT}%/TP {TAKE_PROFIT_PERCENT}%:", wf['risk'])